@@ -0,0 +1,235 @@
+"""
+Set-based management of user/dataset access.
+
+Grants and revocations are executed as a handful of statements against the
+user_dataset_access association table regardless of how many users and
+datasets are involved: INSERT ... ON CONFLICT DO NOTHING for grants (so
+existing rows and concurrent grants are harmless) and DELETE with IN / tuple
+IN filters for revocations. "Available" lists are anti-join queries with
+LIMIT/OFFSET instead of Python-side set differences.
+"""
+
+import csv
+import io
+
+from sqlalchemy import and_, delete, exists, func, insert, select, true, tuple_
+
+from live import publish
+from models import db, Dataset, ReviewAssignment, User, user_dataset_access
+
+# Rows per multi-row INSERT / tuple IN statement
+CHUNK_SIZE = 500
+
+ACCESS_ACTIONS = ('grant', 'revoke')
+
+
+class AccessImportError(ValueError):
+    """Raised when an access CSV cannot be parsed"""
+
+
+def _insert_ignoring_duplicates():
+    """INSERT into user_dataset_access that skips rows that already exist"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(user_dataset_access).prefix_with('IGNORE', dialect='mysql')
+    return dialect_insert(user_dataset_access).on_conflict_do_nothing()
+
+
+def _existing_ids(model, ids):
+    if not ids:
+        return set()
+    return set(db.session.execute(select(model.id).where(model.id.in_(ids))).scalars())
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def grant_access(user_ids, dataset_ids):
+    """Grant every listed user access to every listed dataset; returns the number of new grants"""
+    user_ids, dataset_ids = sorted(set(user_ids)), sorted(set(dataset_ids))
+    if not user_ids or not dataset_ids:
+        return 0
+
+    # One INSERT ... SELECT over the cross product also drops unknown ids
+    statement = _insert_ignoring_duplicates().from_select(
+        ['user_id', 'dataset_id'],
+        select(User.id, Dataset.id).select_from(User).join(Dataset, true()).
+        where(User.id.in_(user_ids), Dataset.id.in_(dataset_ids))
+    )
+    granted = db.session.execute(statement).rowcount
+    if granted:
+        publish('access', user_ids=user_ids, dataset_ids=dataset_ids)
+    db.session.commit()
+    return granted
+
+
+def revoke_access(user_ids, dataset_ids):
+    """Revoke every listed user's access to every listed dataset; returns the number removed"""
+    user_ids, dataset_ids = sorted(set(user_ids)), sorted(set(dataset_ids))
+    if not user_ids or not dataset_ids:
+        return 0
+
+    revoked = db.session.execute(delete(user_dataset_access).where(
+        user_dataset_access.c.user_id.in_(user_ids),
+        user_dataset_access.c.dataset_id.in_(dataset_ids)
+    )).rowcount
+    # Open scheduler leases are meaningless without access
+    db.session.execute(delete(ReviewAssignment).where(
+        ReviewAssignment.user_id.in_(user_ids),
+        ReviewAssignment.dataset_id.in_(dataset_ids),
+        ReviewAssignment.completed_at.is_(None)
+    ))
+    if revoked:
+        publish('access', user_ids=user_ids, dataset_ids=dataset_ids)
+    db.session.commit()
+    return revoked
+
+
+def _publish_pairs(pairs):
+    """Tell live pages that access changed for these (user_id, dataset_id) pairs"""
+    publish('access', user_ids=sorted({user_id for user_id, _ in pairs}),
+            dataset_ids=sorted({dataset_id for _, dataset_id in pairs}))
+
+
+def grant_pairs(pairs):
+    """Grant an explicit list of (user_id, dataset_id) pairs; returns (granted, skipped unknown pairs)"""
+    pairs = sorted(set(pairs))
+    users = _existing_ids(User, list({user_id for user_id, _ in pairs}))
+    datasets = _existing_ids(Dataset, list({dataset_id for _, dataset_id in pairs}))
+    valid = [pair for pair in pairs if pair[0] in users and pair[1] in datasets]
+
+    granted = 0
+    for chunk in _chunks(valid):
+        statement = _insert_ignoring_duplicates().values(
+            [{'user_id': user_id, 'dataset_id': dataset_id} for user_id, dataset_id in chunk]
+        )
+        granted += db.session.execute(statement).rowcount
+    if granted:
+        _publish_pairs(valid)
+    db.session.commit()
+    return granted, len(pairs) - len(valid)
+
+
+def revoke_pairs(pairs):
+    """Revoke an explicit list of (user_id, dataset_id) pairs; returns the number removed"""
+    pairs = sorted(set(pairs))
+    revoked = 0
+    for chunk in _chunks(pairs):
+        revoked += db.session.execute(delete(user_dataset_access).where(
+            tuple_(user_dataset_access.c.user_id, user_dataset_access.c.dataset_id).in_(chunk)
+        )).rowcount
+        db.session.execute(delete(ReviewAssignment).where(
+            tuple_(ReviewAssignment.user_id, ReviewAssignment.dataset_id).in_(chunk),
+            ReviewAssignment.completed_at.is_(None)
+        ))
+    if revoked:
+        _publish_pairs(pairs)
+    db.session.commit()
+    return revoked
+
+
+def parse_access_csv(text):
+    """Parse an access CSV into {'grant': [(user_id, dataset_id)], 'revoke': [...]} plus row errors
+
+    Columns: user (username or id), dataset (name or id) and an optional
+    action column with grant (default) or revoke. Names are resolved with one
+    query per table.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    fields = {name.strip().lower(): name for name in (reader.fieldnames or [])}
+    user_field = fields.get('user') or fields.get('username') or fields.get('user_id')
+    dataset_field = fields.get('dataset') or fields.get('dataset_name') or fields.get('dataset_id')
+    if not user_field or not dataset_field:
+        raise AccessImportError('CSV must have "user" (or "username") and "dataset" columns')
+    action_field = fields.get('action')
+
+    rows = []
+    errors = []
+    for line_number, row in enumerate(reader, start=2):
+        user = (row.get(user_field) or '').strip()
+        dataset = (row.get(dataset_field) or '').strip()
+        action = (row.get(action_field) or 'grant').strip().lower() if action_field else 'grant'
+        if not user or not dataset:
+            errors.append({'line': line_number, 'message': 'Missing user or dataset'})
+        elif action not in ACCESS_ACTIONS:
+            errors.append({'line': line_number, 'message': f'Unknown action "{action}"'})
+        else:
+            rows.append((line_number, user, dataset, action))
+
+    usernames = {user for _, user, _, _ in rows}
+    dataset_names = {dataset for _, _, dataset, _ in rows}
+    user_lookup = _lookup(User, User.username, usernames)
+    dataset_lookup = _lookup(Dataset, Dataset.name, dataset_names)
+
+    actions = {action: [] for action in ACCESS_ACTIONS}
+    for line_number, user, dataset, action in rows:
+        user_id = user_lookup.get(user)
+        dataset_id = dataset_lookup.get(dataset)
+        if user_id is None:
+            errors.append({'line': line_number, 'message': f'Unknown user "{user}"'})
+        elif dataset_id is None:
+            errors.append({'line': line_number, 'message': f'Unknown dataset "{dataset}"'})
+        else:
+            actions[action].append((user_id, dataset_id))
+    return actions, errors
+
+
+def _lookup(model, name_column, values):
+    """Map names (or numeric ids) to ids with one query"""
+    if not values:
+        return {}
+    ids = {int(value) for value in values if value.isdigit()}
+    rows = db.session.execute(select(model.id, name_column).where(
+        name_column.in_(values) | model.id.in_(ids)
+    ))
+    lookup = {}
+    for row_id, name in rows:
+        lookup[name] = row_id
+        # Names win over ids when a name happens to be numeric
+        lookup.setdefault(str(row_id), row_id)
+    return lookup
+
+
+def available_datasets(user_id, limit=None, offset=0, search=None):
+    """Datasets the user cannot access yet, by name, as (rows, total)"""
+    query = select(Dataset.id, Dataset.name, Dataset.description).where(~exists().where(
+        user_dataset_access.c.dataset_id == Dataset.id,
+        user_dataset_access.c.user_id == user_id
+    ))
+    if search:
+        query = query.where(Dataset.name.ilike(f'%{search}%'))
+    return _page(query.order_by(Dataset.name, Dataset.id), limit, offset)
+
+
+def available_users(dataset_id, limit=None, offset=0, search=None):
+    """Users without access to the dataset yet, by username, as (rows, total)"""
+    query = select(User.id, User.username, User.access_level).where(~exists().where(
+        user_dataset_access.c.user_id == User.id,
+        user_dataset_access.c.dataset_id == dataset_id
+    ))
+    if search:
+        query = query.where(User.username.ilike(f'%{search}%'))
+    return _page(query.order_by(User.username, User.id), limit, offset)
+
+
+def _page(query, limit, offset):
+    total = db.session.execute(select(func.count()).select_from(query.order_by(None).subquery())).scalar()
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+    return db.session.execute(query).all(), total
+
+
+def dataset_user_ids(dataset_id, user_ids):
+    """Which of the given users already have access to the dataset"""
+    if not user_ids:
+        return set()
+    return set(db.session.execute(select(user_dataset_access.c.user_id).where(and_(
+        user_dataset_access.c.dataset_id == dataset_id,
+        user_dataset_access.c.user_id.in_(user_ids)
+    ))).scalars())
@@ -0,0 +1,232 @@
+"""
+Admission control for expensive endpoints.
+
+Endpoints belong to a class (ROUTE_CLASSES): 'bulk' for whole-dataset
+downloads, uploads and exports, 'interactive' for the small writes reviewers
+make while reviewing; other endpoints are not limited. Each class has
+
+- concurrency: requests of the class in flight at once across all workers on
+  the host. Slots are lock files under ADMISSION_DIR held with flock for the
+  life of the request, which for streamed responses means until the last
+  chunk is sent. A worker that dies releases its slots with it.
+- burst / per_minute: a token bucket per user (per address when anonymous),
+  kept in a small file per user and class so every worker draws from the
+  same bucket.
+
+A request that finds its class saturated or its bucket empty is answered at
+once with 429 and Retry-After rather than tying up a worker. Interactive
+writes take priority: they never wait for a slot, and a bulk request waits up
+to PRIORITY_WAIT seconds for interactive writes in flight to finish before
+its heavy queries start and again between the chunks of its body (views
+wrap their chunk iterators in defer_to_interactive).
+
+The bulk limit only keeps workers free for reviewers when the server runs
+more workers or threads than the bulk concurrency (e.g. gunicorn -w 4).
+"""
+
+import math
+import os
+import re
+import time
+
+from flask import g, jsonify, request
+from flask_login import current_user
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No cross-process locking on this platform
+
+BULK = 'bulk'
+INTERACTIVE = 'interactive'
+
+ROUTE_CLASSES = {
+    'api_download_dataset': BULK,
+    'api_upload_dataset': BULK,
+    'api_upload_revision': BULK,
+    'api_finalize_upload': BULK,
+    'export_data': BULK,
+    'submit_feedback': INTERACTIVE,
+    'api_submit_feedback': INTERACTIVE,
+    'api_save_gold_standard': INTERACTIVE,
+    'api_claim_next_qa': INTERACTIVE,
+    'api_release_qa': INTERACTIVE,
+}
+
+# Overridden per class and key by the ADMISSION_LIMITS setting
+DEFAULT_LIMITS = {
+    BULK: {'concurrency': 2, 'burst': 30, 'per_minute': 30},
+    INTERACTIVE: {'concurrency': 0, 'burst': 120, 'per_minute': 600},
+}
+
+# Seconds a client is asked to wait when every slot of its class is taken
+BUSY_RETRY_AFTER = 5
+
+# Longest a bulk request defers to interactive writes in flight
+PRIORITY_WAIT = 0.25
+
+_KEY_UNSAFE = re.compile(r'[^0-9A-Za-z.-]')
+
+
+def admission_root(app):
+    """Directory holding the shared slot and bucket files"""
+    root = app.config.get('ADMISSION_DIR') or os.path.join(app.instance_path, 'admission')
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def admission_limits(app):
+    """Limits per class with ADMISSION_LIMITS and ADMISSION_BULK_CONCURRENCY applied"""
+    overrides = app.config.get('ADMISSION_LIMITS') or {}
+    limits = {klass: dict(limit, **overrides.get(klass, {})) for klass, limit in DEFAULT_LIMITS.items()}
+    if app.config.get('ADMISSION_BULK_CONCURRENCY') is not None and 'concurrency' not in overrides.get(BULK, {}):
+        limits[BULK]['concurrency'] = app.config['ADMISSION_BULK_CONCURRENCY']
+    return limits
+
+
+def acquire_slot(root, klass, concurrency):
+    """Hold one of the class's slots, or return None when all are taken
+
+    The returned file keeps the slot until it is closed.
+    """
+    for index in range(concurrency):
+        slot = open(os.path.join(root, f'{klass}-{index}.slot'), 'a')
+        try:
+            fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return slot
+        except OSError:
+            slot.close()
+    return None
+
+
+def take_token(root, klass, key, burst, per_minute):
+    """Take a token from a shared bucket; 0 on success, else seconds until one is available"""
+    rate = per_minute / 60
+    fd = os.open(os.path.join(root, f'bucket-{klass}-{_KEY_UNSAFE.sub("_", key)}'), os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+') as bucket:
+        fcntl.flock(bucket, fcntl.LOCK_EX)
+        now = time.time()
+        try:
+            tokens, updated = (float(value) for value in bucket.read().split())
+        except ValueError:
+            tokens, updated = burst, now
+        tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+        if tokens < 1:
+            # Nothing written: the refill is recomputed from the same point next time
+            return (1 - tokens) / rate
+        bucket.seek(0)
+        bucket.truncate()
+        bucket.write(f'{tokens - 1} {now}')
+        return 0
+
+
+def hold_interactive(root):
+    """Mark an interactive write in flight until the returned file is closed"""
+    marker = open(os.path.join(root, 'interactive.lock'), 'a')
+    fcntl.flock(marker, fcntl.LOCK_SH)
+    return marker
+
+
+def _wait_idle(marker, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(marker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(marker, fcntl.LOCK_UN)
+            return True
+        except OSError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+
+def wait_for_interactive(root, timeout=PRIORITY_WAIT):
+    """Wait up to `timeout` seconds for no interactive write to be in flight"""
+    with open(os.path.join(root, 'interactive.lock'), 'a') as marker:
+        return _wait_idle(marker, timeout)
+
+
+def _deferring(chunks, root):
+    with open(os.path.join(root, 'interactive.lock'), 'a') as marker:
+        for chunk in chunks:
+            yield chunk
+            _wait_idle(marker, PRIORITY_WAIT)
+
+
+def defer_to_interactive(chunks):
+    """Chunks of a bulk response, pausing between them while interactive writes are in flight"""
+    root = g.get('admission_root')
+    return chunks if root is None else _deferring(chunks, root)
+
+
+def _client_key():
+    if current_user.is_authenticated:
+        return f'user-{current_user.id}'
+    return f'addr-{request.remote_addr or "unknown"}'
+
+
+def _too_many(message, retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    response = jsonify({'success': False, 'message': f'{message} Please try again in {seconds} s.'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+
+def _release(files):
+    for held in files:
+        held.close()
+
+
+def init_admission(app):
+    """Limit concurrent and per-user requests to the classed endpoints"""
+    if not app.config.get('ADMISSION_ENABLED', True) or fcntl is None:
+        return
+    root = admission_root(app)
+    limits = admission_limits(app)
+
+    @app.before_request
+    def admit_request():
+        klass = ROUTE_CLASSES.get(request.endpoint)
+        if klass is None:
+            return None
+        limit = limits[klass]
+        held = []
+        if limit.get('concurrency'):
+            slot = acquire_slot(root, klass, limit['concurrency'])
+            if slot is None:
+                return _too_many('The server is busy with other downloads and uploads.', BUSY_RETRY_AFTER)
+            held.append(slot)
+        if limit.get('per_minute'):
+            retry_after = take_token(root, klass, _client_key(), limit['burst'], limit['per_minute'])
+            if retry_after:
+                _release(held)
+                return _too_many('You are sending these requests too quickly.', retry_after)
+        if klass == INTERACTIVE:
+            held.append(hold_interactive(root))
+        else:
+            wait_for_interactive(root)
+            g.admission_root = root
+        g.admission_held = held
+        return None
+
+    @app.after_request
+    def release_streamed(response):
+        held = g.pop('admission_held', None)
+        if not held:
+            return response
+        # Streamed and file bodies are sent after the view returns
+        if response.direct_passthrough:
+            # The server gets a passed-through body as is, without the response's close callbacks
+            response.response = ClosingIterator(response.response, lambda: _release(held))
+        elif response.is_streamed:
+            response.call_on_close(lambda: _release(held))
+        else:
+            _release(held)
+        return response
+
+    @app.teardown_request
+    def release_abandoned(exc):
+        # after_request does not run when the view raised
+        _release(g.pop('admission_held', None) or ())
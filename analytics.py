@@ -0,0 +1,424 @@
+"""
+Inter-annotator agreement and score-distribution analytics for reviewer feedback.
+
+Scores for a dataset are fetched with a single query and arranged into
+items-by-raters NumPy arrays so that every statistic is computed without
+per-row Python loops.
+
+Score distributions keep the fetched columns in memory per dataset revision;
+later requests fetch only the feedback rows updated since the previous fetch
+and merge them in by feedback id, so a dataset with millions of ratings is
+re-read only when its revision changes or feedback was deleted
+(`python benchmarks/bench_score_stats.py`).
+"""
+
+import itertools
+import math
+import threading
+import time
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import Integer, cast, func, select
+
+from changefeed import settled_horizon
+from models import db, Dataset, Feedback, QuestionAnswerPair, User
+
+SCORE_DIMENSIONS = ['accuracy', 'completeness', 'clarity', 'clinical_relevance']
+SCORE_COLUMNS = [getattr(Feedback, f'{dimension}_score') for dimension in SCORE_DIMENSIONS]
+
+# Feedback scores are on a 1-5 scale
+SCORE_VALUES = np.arange(1, 6)
+
+# Agreement results keyed by dataset id -> (revision, result)
+_agreement_cache = {}
+_cache_lock = threading.Lock()
+
+# Score columns keyed by dataset id -> _ScoreColumns, least recently used first
+_score_cache = OrderedDict()
+SCORE_CACHE_DATASETS = 16
+
+# Deleted feedback changes neither the newest id nor the newest update, so a
+# cached dataset's row count is rechecked this often
+SCORE_COUNT_CHECK_SECONDS = 30
+
+# Two-sided 95% Student t critical values for 1-30 degrees of freedom; the
+# normal value is close enough beyond that
+_T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def dataset_revision(dataset_id):
+    """Return a token that changes whenever feedback for the dataset changes"""
+    count, latest = db.session.query(
+        func.count(Feedback.id),
+        func.max(Feedback.submitted_at)
+    ).join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).\
+        filter(QuestionAnswerPair.dataset_id == dataset_id).one()
+    return (count, latest.isoformat() if latest else None)
+
+
+def fetch_score_matrix(dataset_id):
+    """Fetch all reviewer scores for a dataset as items x raters x dimensions"""
+    rows = db.session.query(
+        Feedback.qa_pair_id,
+        Feedback.user_id,
+        *SCORE_COLUMNS
+    ).join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).\
+        filter(QuestionAnswerPair.dataset_id == dataset_id).\
+        filter(Feedback.user_id.isnot(None)).\
+        order_by(Feedback.id).all()
+
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.empty((0, 0, len(SCORE_DIMENSIONS)))
+
+    raw = np.array([[np.nan if value is None else value for value in row] for row in rows], dtype=float)
+    item_ids, item_index = np.unique(raw[:, 0].astype(np.int64), return_inverse=True)
+    rater_ids, rater_index = np.unique(raw[:, 1].astype(np.int64), return_inverse=True)
+
+    # Later feedback rows overwrite earlier ones for the same item/rater
+    scores = np.full((len(item_ids), len(rater_ids), len(SCORE_DIMENSIONS)), np.nan)
+    scores[item_index, rater_index] = raw[:, 2:]
+    return item_ids, rater_ids, scores
+
+
+def _value_counts(ratings):
+    """Count how often each score value occurs per item (items x values)"""
+    return (ratings[:, :, None] == SCORE_VALUES[None, None, :]).sum(axis=1)
+
+
+def krippendorff_alpha_ordinal(ratings):
+    """Krippendorff's alpha with the ordinal metric for an items x raters array"""
+    counts = _value_counts(ratings)
+    pairable = counts.sum(axis=1)
+    counts = counts[pairable >= 2]
+    pairable = pairable[pairable >= 2]
+    if counts.size == 0:
+        return None
+
+    # Coincidence matrix built from every pairable item at once
+    weighted = counts / (pairable - 1)[:, None]
+    coincidences = weighted.T @ counts - np.diag(weighted.sum(axis=0))
+    marginals = coincidences.sum(axis=0)
+    total = marginals.sum()
+    if total <= 1:
+        return None
+
+    # Ordinal distance: squared mass between the two ranks
+    cumulative = np.cumsum(marginals)
+    upper = np.maximum.outer(np.arange(len(marginals)), np.arange(len(marginals)))
+    lower = np.minimum.outer(np.arange(len(marginals)), np.arange(len(marginals)))
+    between = cumulative[upper] - cumulative[lower] + marginals[lower]
+    distance = (between - (marginals[:, None] + marginals[None, :]) / 2) ** 2
+
+    expected = (np.outer(marginals, marginals) * distance).sum()
+    if expected == 0:
+        return 1.0
+    observed = (coincidences * distance).sum()
+    return float(1 - (total - 1) * observed / expected)
+
+
+def pairwise_cohen_kappa(ratings):
+    """Cohen's kappa for every pair of raters (raters x raters, NaN if undefined)"""
+    one_hot = (ratings[:, :, None] == SCORE_VALUES[None, None, :]).astype(float)
+    # Confusion matrices for all rater pairs: raters x raters x values x values
+    confusion = np.einsum('irv,isw->rsvw', one_hot, one_hot)
+    totals = confusion.sum(axis=(2, 3))
+    observed = np.trace(confusion, axis1=2, axis2=3)
+    expected = np.einsum('rsv,rsv->rs', confusion.sum(axis=3), confusion.sum(axis=2))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_observed = observed / totals
+        p_expected = expected / totals ** 2
+        kappa = (p_observed - p_expected) / (1 - p_expected)
+    # Perfect agreement on a single category has no chance correction
+    kappa[(totals > 0) & (p_expected == 1)] = 1.0
+    kappa[totals < 2] = np.nan
+    return kappa, totals
+
+
+def item_disagreement(scores):
+    """Per-item spread of ratings, averaged over the score dimensions"""
+    rated = (~np.isnan(scores)).sum(axis=1)
+    with warnings.catch_warnings():
+        # All-NaN slices are expected for items with a single rating
+        warnings.simplefilter('ignore', RuntimeWarning)
+        spread = np.nanstd(scores, axis=1)
+        ranges = np.nanmax(scores, axis=1) - np.nanmin(scores, axis=1)
+        spread[rated < 2] = np.nan
+        ranges[rated < 2] = np.nan
+        overall = np.nanmean(spread, axis=1)
+    return spread, ranges, overall
+
+
+def _rounded(value, digits=3):
+    if value is None or np.isnan(value):
+        return None
+    return round(float(value), digits)
+
+
+def compute_agreement(dataset_id, top_items=20):
+    """Compute agreement statistics for a dataset"""
+    item_ids, rater_ids, scores = fetch_score_matrix(dataset_id)
+
+    usernames = dict(db.session.query(User.id, User.username).
+                     filter(User.id.in_(rater_ids.tolist())).all()) if len(rater_ids) else {}
+
+    dimensions = {}
+    pairs = []
+    for d, dimension in enumerate(SCORE_DIMENSIONS):
+        ratings = scores[:, :, d] if scores.size else np.empty((0, 0))
+        alpha = krippendorff_alpha_ordinal(ratings) if ratings.size else None
+        dimensions[dimension] = {
+            'krippendorff_alpha': _rounded(alpha),
+            'rated_items': int((~np.isnan(ratings)).any(axis=1).sum()) if ratings.size else 0,
+            'multiply_rated_items': int(((~np.isnan(ratings)).sum(axis=1) >= 2).sum()) if ratings.size else 0
+        }
+
+        if ratings.size:
+            kappa, totals = pairwise_cohen_kappa(ratings)
+            for a, b in itertools.combinations(range(len(rater_ids)), 2):
+                if totals[a, b] < 2:
+                    continue
+                pairs.append({
+                    'dimension': dimension,
+                    'rater_a': int(rater_ids[a]),
+                    'rater_b': int(rater_ids[b]),
+                    'username_a': usernames.get(int(rater_ids[a])),
+                    'username_b': usernames.get(int(rater_ids[b])),
+                    'shared_items': int(totals[a, b]),
+                    'cohen_kappa': _rounded(kappa[a, b])
+                })
+
+    items = []
+    if scores.size:
+        spread, ranges, overall = item_disagreement(scores)
+        ranked = np.argsort(np.where(np.isnan(overall), -np.inf, overall))[::-1]
+        for i in ranked[:top_items]:
+            if np.isnan(overall[i]):
+                break
+            items.append({
+                'qa_id': int(item_ids[i]),
+                'raters': int((~np.isnan(scores[i])).any(axis=1).sum()),
+                'disagreement': _rounded(overall[i]),
+                'std': {dimension: _rounded(spread[i, d]) for d, dimension in enumerate(SCORE_DIMENSIONS)},
+                'range': {dimension: _rounded(ranges[i, d]) for d, dimension in enumerate(SCORE_DIMENSIONS)}
+            })
+
+    return {
+        'dataset_id': dataset_id,
+        'items': len(item_ids),
+        'raters': [{'id': int(rater_id), 'username': usernames.get(int(rater_id))} for rater_id in rater_ids],
+        'dimensions': dimensions,
+        'pairwise_kappa': pairs,
+        'most_disagreed_items': items
+    }
+
+
+def get_agreement(dataset_id):
+    """Return agreement statistics, recomputing only when the dataset revision changes"""
+    revision = dataset_revision(dataset_id)
+    with _cache_lock:
+        cached = _agreement_cache.get(dataset_id)
+    if cached and cached[0] == revision:
+        return cached[1]
+
+    result = compute_agreement(dataset_id)
+    result['revision'] = list(revision)
+    with _cache_lock:
+        _agreement_cache[dataset_id] = (revision, result)
+    return result
+
+
+class _ScoreColumns:
+    """Scores of one dataset revision as columns sorted by feedback id, with the stats computed from them"""
+
+    def __init__(self, revision, token, ids, items, users, scores):
+        self.revision = revision
+        self.token = token  # (newest feedback id, newest feedback update) across all datasets when fetched
+        self.horizon = None  # Every feedback change stamped up to this had committed before the read
+        self.counted_at = time.monotonic()
+        self.ids = ids
+        self.items = items
+        self.users = users  # 0 for anonymous feedback
+        self.scores = scores  # 0 where a score is missing or off the 1-5 scale
+        self.result = None
+
+
+def _feedback_token():
+    """Changes whenever feedback is added or updated; two index lookups"""
+    # Separate subqueries: SQLite only answers a lone max() from the index
+    return db.session.query(select(func.max(Feedback.id)).scalar_subquery(),
+                            select(func.max(Feedback.updated_at)).scalar_subquery()).one()
+
+
+def _dataset_feedback_count(dataset_id):
+    return db.session.query(func.count(Feedback.id)).\
+        join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).\
+        filter(QuestionAnswerPair.dataset_id == dataset_id).scalar()
+
+
+def fetch_score_columns(dataset_id, since=None):
+    """Fetch (feedback ids, pair ids, user ids, scores) for a dataset as integer NumPy columns sorted by feedback id
+
+    Anonymous feedback has user id 0 and missing scores are 0, so every value
+    is an integer and the rows stream straight into one array. With `since`,
+    only feedback updated at or after that time is fetched.
+    """
+    scores = [func.coalesce(cast(column, Integer), 0) for column in SCORE_COLUMNS]
+    query = select(Feedback.id, Feedback.qa_pair_id, func.coalesce(Feedback.user_id, 0), *scores).\
+        join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).\
+        where(QuestionAnswerPair.dataset_id == dataset_id).order_by(Feedback.id)
+    if since is not None:
+        query = query.where(Feedback.updated_at >= since)
+
+    width = 3 + len(SCORE_COLUMNS)
+    table = np.fromiter(itertools.chain.from_iterable(db.session.execute(query)), dtype=np.int64).reshape(-1, width)
+    scores = table[:, 3:].astype(np.int8, copy=True) if len(table) else np.zeros((0, len(SCORE_COLUMNS)), np.int8)
+    scores[(table[:, 3:] < 1) | (table[:, 3:] > 5)] = 0
+    return table[:, 0].copy(), table[:, 1].copy(), table[:, 2].copy(), scores
+
+
+def _merge_score_columns(cached, ids, items, users, scores):
+    """Columns with changed rows replaced and new rows added; returns (columns, number added)"""
+    position = np.searchsorted(cached.ids, ids)
+    found = np.zeros(len(ids), dtype=bool)
+    if len(cached.ids):
+        found = (position < len(cached.ids)) & (cached.ids[np.minimum(position, len(cached.ids) - 1)] == ids)
+
+    merged_items, merged_users, merged_scores = cached.items.copy(), cached.users.copy(), cached.scores.copy()
+    merged_items[position[found]] = items[found]
+    merged_users[position[found]] = users[found]
+    merged_scores[position[found]] = scores[found]
+
+    new = ~found
+    columns = (
+        np.concatenate([cached.ids, ids[new]]),
+        np.concatenate([merged_items, items[new]]),
+        np.concatenate([merged_users, users[new]]),
+        np.concatenate([merged_scores, scores[new]])
+    )
+    # New feedback usually has the highest ids, which keeps the columns sorted
+    if new.any() and len(cached.ids) and ids[new].min() < cached.ids[-1]:
+        order = np.argsort(columns[0], kind='stable')
+        columns = tuple(column[order] for column in columns)
+    return columns, int(new.sum())
+
+
+def _t95(degrees_of_freedom):
+    return _T95[degrees_of_freedom - 1] if degrees_of_freedom <= len(_T95) else 1.96
+
+
+def compute_score_stats(items, users, scores):
+    """Histogram, mean with a 95% confidence interval and per-reviewer bias for each score dimension
+
+    A reviewer's bias is the mean difference between their score and the mean
+    score other ratings gave the same item, over the items rated more than
+    once. Ids are used directly as bincount indexes, so no sorting is needed.
+    """
+    item_index = items - items.min() if len(items) else items
+    item_count = int(item_index.max()) + 1 if len(items) else 0
+    user_count = int(users.max()) + 1 if len(users) else 1
+    rated_by = np.bincount(users, minlength=user_count)
+    rater_ids = np.flatnonzero(rated_by[1:]) + 1  # Index 0 is anonymous feedback
+
+    dimensions = {}
+    raters = {int(rater_id): {'ratings': int(rated_by[rater_id]), 'dimensions': {}} for rater_id in rater_ids}
+    for d, dimension in enumerate(SCORE_DIMENSIONS):
+        values = scores[:, d]
+        valid = values > 0
+
+        histogram = np.bincount(values, minlength=6)
+        count = int(len(values) - histogram[0])
+        total = float((histogram * np.arange(6)).sum())
+        squares = float((histogram * np.arange(6) ** 2).sum())
+        mean = total / count if count else None
+        std = math.sqrt(max(squares - total * total / count, 0.0) / (count - 1)) if count > 1 else None
+        half_width = _t95(count - 1) * std / math.sqrt(count) if count > 1 else None
+        dimensions[dimension] = {
+            'count': count,
+            'missing': int(histogram[0]),
+            'histogram': {str(value): int(histogram[value]) for value in SCORE_VALUES},
+            'mean': _rounded(mean),
+            'std': _rounded(std),
+            'ci95': [_rounded(mean - half_width), _rounded(mean + half_width)] if half_width is not None else None
+        }
+
+        if not len(rater_ids):
+            continue
+        item_sums = np.bincount(item_index, weights=values, minlength=item_count)
+        item_ratings = np.bincount(item_index, weights=valid, minlength=item_count)
+        own_sums = np.bincount(users, weights=values, minlength=user_count)
+        own_counts = np.bincount(users, weights=valid, minlength=user_count)
+
+        # Leave-one-out item means: what every other rating gave the same item
+        others = item_ratings[item_index] - 1
+        comparable = valid & (others > 0)
+        others_mean = np.divide(item_sums[item_index] - values, others, out=np.zeros(len(values)), where=comparable)
+        deviation = np.where(comparable, values - others_mean, 0.0)
+        bias_sums = np.bincount(users, weights=deviation, minlength=user_count)
+        compared = np.bincount(users, weights=comparable, minlength=user_count)
+
+        for rater_id in rater_ids:
+            raters[int(rater_id)]['dimensions'][dimension] = {
+                'count': int(own_counts[rater_id]),
+                'mean': _rounded(own_sums[rater_id] / own_counts[rater_id]) if own_counts[rater_id] else None,
+                'bias': _rounded(bias_sums[rater_id] / compared[rater_id]) if compared[rater_id] else None,
+                'compared': int(compared[rater_id])
+            }
+
+    usernames = dict(db.session.query(User.id, User.username).
+                     filter(User.id.in_(list(raters))).all()) if raters else {}
+    reviewers = [dict(stats, id=rater_id, username=usernames.get(rater_id)) for rater_id, stats in raters.items()]
+    reviewers.sort(key=lambda reviewer: -reviewer['ratings'])
+    return {
+        'ratings': len(items),
+        'items': int(np.count_nonzero(np.bincount(item_index))) if len(items) else 0,
+        'dimensions': dimensions,
+        'reviewers': reviewers
+    }
+
+
+def get_score_stats(dataset_id):
+    """Score distributions for a dataset, merging in only the feedback changed since the last request"""
+    started = time.perf_counter()
+    revision = db.session.query(Dataset.revision).filter(Dataset.id == dataset_id).scalar()
+    token = _feedback_token()
+    with _cache_lock:
+        cached = _score_cache.get(dataset_id)
+        if cached is not None:
+            _score_cache.move_to_end(dataset_id)
+    if cached is not None and cached.revision != revision:
+        cached = None
+
+    if cached is not None and time.monotonic() - cached.counted_at > SCORE_COUNT_CHECK_SECONDS:
+        if _dataset_feedback_count(dataset_id) != len(cached.ids):
+            cached = None  # Feedback was deleted
+        else:
+            cached.counted_at = time.monotonic()
+
+    if cached is not None and cached.token == token:
+        return dict(cached.result, cache='hit', compute_ms=round((time.perf_counter() - started) * 1000, 3))
+
+    horizon = settled_horizon(db.engine)
+    if cached is not None:
+        # Look back to the previous horizon for transactions that committed late
+        columns, _ = _merge_score_columns(cached, *fetch_score_columns(dataset_id, cached.horizon))
+        mode = 'incremental'
+    else:
+        columns, mode = fetch_score_columns(dataset_id), 'full'
+
+    entry = _ScoreColumns(revision, token, *columns)
+    entry.horizon = horizon
+    if mode == 'incremental':
+        entry.counted_at = cached.counted_at
+    entry.result = dict(compute_score_stats(entry.items, entry.users, entry.scores),
+                        dataset_id=dataset_id, revision=revision)
+    with _cache_lock:
+        _score_cache[dataset_id] = entry
+        _score_cache.move_to_end(dataset_id)
+        while len(_score_cache) > SCORE_CACHE_DATASETS:
+            _score_cache.popitem(last=False)
+    return dict(entry.result, cache=mode, compute_ms=round((time.perf_counter() - started) * 1000, 3))
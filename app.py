@@ -1,25 +1,9 @@
 from flask import Flask
 from flask_login import LoginManager
-from models import db, User
+from models import db, User, upgrade_schema
 import os
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///medical_qa_feedback.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize db with app
-db.init_app(app)
-
-with app.app_context():
-    db.create_all()
-    print("Database tables created if they didn't exist!")
-
-# Removed Flask-Migrate initialization
-
-# Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
@@ -27,14 +11,88 @@ login_manager.login_message = 'Please log in to access this page.'
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-# Import and register routes
-from routes import register_routes
-register_routes(app)
+
+def default_config():
+    """Configuration from the environment"""
+    config = {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production'),
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('DATABASE_URL', 'sqlite:///medical_qa_feedback.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Clients stay on the primary for this long after their own writes
+        'REPLICA_STICKY_SECONDS': float(os.environ.get('REPLICA_STICKY_SECONDS', 10)),
+        # Responses smaller than this are sent uncompressed
+        'COMPRESS_MIN_SIZE': int(os.environ.get('COMPRESS_MIN_SIZE', 1024)),
+        # Live page streams also poll for events from other workers this often (0 disables)
+        'LIVE_POLL_SECONDS': float(os.environ.get('LIVE_POLL_SECONDS', 5)),
+        # Change feed, incremental snapshots and score caches trail writes by this much (see changefeed.py)
+        'CHANGEFEED_SETTLE_SECONDS': float(os.environ.get('CHANGEFEED_SETTLE_SECONDS', 5)),
+        # Open live streams per process; keep it below the worker's thread count
+        'LIVE_MAX_STREAMS': int(os.environ.get('LIVE_MAX_STREAMS', 32)),
+        # Archived datasets are kept here (default: instance/archives)
+        'ARCHIVE_DIR': os.environ.get('ARCHIVE_DIR'),
+        # Admission control for bulk and interactive endpoints (see admission.py)
+        'ADMISSION_ENABLED': os.environ.get('ADMISSION_ENABLED', '1') != '0',
+        'ADMISSION_DIR': os.environ.get('ADMISSION_DIR'),
+        'ADMISSION_BULK_CONCURRENCY': int(os.environ.get('ADMISSION_BULK_CONCURRENCY', 2)),
+    }
+    # Optional read replica for read-only endpoints
+    if os.environ.get('DATABASE_REPLICA_URL'):
+        config['SQLALCHEMY_BINDS'] = {'replica': os.environ['DATABASE_REPLICA_URL']}
+    return config
+
+
+def create_app(config=None):
+    """Build an app from the environment, with `config` overriding it
+
+    Creating an app does not touch the database; create or upgrade the schema
+    with `flask --app app init-db`.
+    """
+    app = Flask(__name__)
+    app.config.update(default_config())
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    login_manager.init_app(app)
+
+    from routes import register_routes
+    register_routes(app)
+
+    from replica import init_replica
+    init_replica(app)
+
+    # Committed changes are pushed to the admin and datasets pages (/api/events)
+    from live import init_live
+    init_live(app)
+
+    # Admins can profile a request with ?_profile=1
+    from profiler import init_profiler
+    init_profiler(app)
+
+    # Large downloads and uploads cannot crowd out reviewers (429 + Retry-After)
+    from admission import init_admission
+    init_admission(app)
+
+    # Fingerprinted, long-cached static assets under /assets
+    from assets import init_assets
+    init_assets(app)
+
+    # Compress responses for clients that send Accept-Encoding
+    from compression import init_compression
+    init_compression(app)
+
+    # Register CLI commands (flask --app app <command>)
+    from commands import register_commands
+    register_commands(app)
+
+    return app
+
+
+# For gunicorn (app:app) and `flask --app app`
+app = create_app()
 
 if __name__ == '__main__':
-    # Removed db.create_all() as migrations will handle database creation and updates
-    # with app.app_context():
-    #    db.create_all()
-    #    print("Database tables created successfully!")
-    
-    app.run(debug=True)
\ No newline at end of file
+    # The development server creates missing tables itself
+    with app.app_context():
+        upgrade_schema()
+    app.run(debug=True)
@@ -0,0 +1,228 @@
+"""
+Fingerprinted, precompressed static assets without a build step.
+
+On first use every file under static/ is hashed and given a content-addressed
+name (css/style.css -> css/style.3f9c2a1b7d4e.css). Templates link assets
+with url_for('asset', filename='css/style.css'); a url_defaults hook swaps
+in the fingerprinted name, so a changed file gets a new URL and everything
+can be cached as immutable. Relative url(...) references inside CSS (the
+Font Awesome webfonts) are rewritten to fingerprinted names as well.
+
+Compressible assets are compressed once, at the highest levels, the first
+time an encoding is requested, and served from memory with the matching
+Content-Encoding.
+
+Third-party assets (Bootstrap, Font Awesome) are vendored under
+static/vendor by `flask --app app vendor-assets`; until that has been run,
+vendor_asset() falls back to the CDN URLs so nothing breaks.
+"""
+
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+import zlib
+
+from flask import abort, request, url_for
+
+from compression import COMPRESSIBLE_MIMETYPES, available_encodings, codec_module, negotiate_encoding
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+FINGERPRINT_LENGTH = 12
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+?)\1\s*\)')
+
+BOOTSTRAP_CDN = 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist'
+FONT_AWESOME_CDN = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0'
+
+# Template name -> (vendored path under static/, CDN URL)
+VENDOR_ASSETS = {
+    'bootstrap.css': ('vendor/bootstrap/css/bootstrap.min.css', f'{BOOTSTRAP_CDN}/css/bootstrap.min.css'),
+    'bootstrap.js': ('vendor/bootstrap/js/bootstrap.bundle.min.js', f'{BOOTSTRAP_CDN}/js/bootstrap.bundle.min.js'),
+    'fontawesome.css': ('vendor/fontawesome/css/all.min.css', f'{FONT_AWESOME_CDN}/css/all.min.css'),
+}
+
+# Files the vendored stylesheets reference, downloaded alongside them
+VENDOR_FILES = {
+    path: url for path, url in VENDOR_ASSETS.values()
+}
+VENDOR_FILES.update({
+    f'vendor/fontawesome/webfonts/{font}.{extension}': f'{FONT_AWESOME_CDN}/webfonts/{font}.{extension}'
+    for font in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility')
+    for extension in ('woff2', 'ttf')
+})
+
+
+def _fingerprinted_name(path, data):
+    stem, extension = posixpath.splitext(path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]}{extension}'
+
+
+class Asset:
+    def __init__(self, path, data, mimetype):
+        self.path = path
+        self.data = data
+        self.mimetype = mimetype
+        self.url_name = _fingerprinted_name(path, data)
+        self.etag = hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+        self.compressible = mimetype in COMPRESSIBLE_MIMETYPES
+        self._compressed = {}
+        self._lock = threading.Lock()
+
+    def body(self, encoding):
+        """Body in the given content coding, compressed once at the highest level"""
+        if encoding is None:
+            return self.data
+        with self._lock:
+            if encoding not in self._compressed:
+                self._compressed[encoding] = _compress_max(self.data, encoding)
+            return self._compressed[encoding]
+
+
+def _compress_max(data, encoding):
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    if encoding == 'zstd':
+        return codec_module('zstd').ZstdCompressor(level=19).compress(data)
+    if encoding == 'br':
+        return codec_module('br').compress(data, quality=11)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+class AssetManifest:
+    """Fingerprinted names and contents of every file under the static folder"""
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+        self.by_url_name = {}
+        self._mtimes = None
+        self.build()
+
+    def _scan(self):
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                full_path = os.path.join(directory, name)
+                path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                files[path] = os.path.getmtime(full_path)
+        return files
+
+    def build(self):
+        mtimes = self._scan()
+        assets = {}
+        # Stylesheets last, so the files they reference already have fingerprinted names
+        for path in sorted(mtimes, key=lambda path: (path.endswith('.css'), path)):
+            with open(os.path.join(self.root, path), 'rb') as f:
+                data = f.read()
+            mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            if path.endswith('.css'):
+                data = self._rewrite_css(path, data, assets)
+            assets[path] = Asset(path, data, mimetype)
+        self.assets = assets
+        self.by_url_name = {asset.url_name: asset for asset in assets.values()}
+        self._mtimes = mtimes
+
+    def _rewrite_css(self, path, data, assets):
+        directory = posixpath.dirname(path)
+
+        def replace(match):
+            reference = match.group(2)
+            if reference.startswith(('data:', 'http:', 'https:', '/', '#')):
+                return match.group(0)
+            target, _, fragment = reference.partition('#')
+            # Cache-busting query strings are dropped; the fingerprint replaces them
+            target = target.split('?', 1)[0]
+            asset = assets.get(posixpath.normpath(posixpath.join(directory, target)))
+            if asset is None:
+                return match.group(0)
+            rewritten = posixpath.relpath(asset.url_name, directory) + (f'#{fragment}' if fragment else '')
+            return f'url({match.group(1)}{rewritten}{match.group(1)})'
+
+        return _CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+    def refresh_if_changed(self):
+        if self._scan() != self._mtimes:
+            self.build()
+
+    def lookup(self, url_name):
+        """(asset, fingerprinted) for a requested name, or (None, False)"""
+        asset = self.by_url_name.get(url_name)
+        if asset is not None:
+            return asset, True
+        return self.assets.get(url_name), False
+
+
+def init_assets(app):
+    """Register the /assets route, url_for('asset', ...) fingerprinting and vendor_asset()"""
+    lock = threading.Lock()
+
+    def current_manifest():
+        # Built on first use so creating the app stays cheap
+        manifest = app.extensions.get('assets')
+        if manifest is None:
+            with lock:
+                manifest = app.extensions.get('assets')
+                if manifest is None:
+                    manifest = app.extensions['assets'] = AssetManifest(app.static_folder)
+        elif app.debug:
+            # The debug server picks up edited files without a restart
+            manifest.refresh_if_changed()
+        return manifest
+
+    @app.url_defaults
+    def fingerprint_asset_urls(endpoint, values):
+        if endpoint == 'asset' and 'filename' in values:
+            asset = current_manifest().assets.get(values['filename'])
+            if asset is not None:
+                values['filename'] = asset.url_name
+
+    @app.route('/assets/<path:filename>', endpoint='asset')
+    def serve_asset(filename):
+        """Serve a static asset, immutable when requested by its fingerprinted name"""
+        asset, fingerprinted = current_manifest().lookup(filename)
+        if asset is None:
+            abort(404)
+
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'), available_encodings()) \
+            if asset.compressible else None
+        response = app.response_class(asset.body(encoding), mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f'{asset.etag}-{encoding}' if encoding else asset.etag)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL
+        return response.make_conditional(request)
+
+    @app.context_processor
+    def vendor_asset_helper():
+        def vendor_asset(name):
+            path, cdn_url = VENDOR_ASSETS[name]
+            if path in current_manifest().assets:
+                return url_for('asset', filename=path)
+            return cdn_url
+        return {'vendor_asset': vendor_asset}
+
+
+def download_vendor_assets(static_folder, force=False):
+    """Download VENDOR_FILES into the static folder; returns the paths written"""
+    import urllib.request
+
+    written = []
+    for path, url in sorted(VENDOR_FILES.items()):
+        target = os.path.join(static_folder, *path.split('/'))
+        if os.path.exists(target) and not force:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        with open(target + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(target + '.tmp', target)
+        written.append(path)
+    return written
@@ -0,0 +1,548 @@
+"""
+Online snapshots of the feedback database, with verified restore.
+
+Full snapshots of SQLite use the online backup API a few pages per step,
+pausing between steps so writers get the database in between instead of
+waiting for the whole copy. A backup restarts when another connection
+writes to the source; after MAX_BACKUP_RESTARTS restarts the copy is
+finished in one step. PostgreSQL is dumped with `pg_dump --format=custom`,
+which reads a consistent snapshot without blocking writers.
+
+Incremental snapshots hold the Feedback rows inserted or updated since the
+previous snapshot as gzipped NDJSON, positioned by (updated_at, id) like the
+change feed, up to the same settled horizon (see changefeed.py). A row may appear in two snapshots;
+restoring applies rows by id, so that is harmless. Deletions are only
+captured by the next full snapshot. Incrementals cannot bring back a
+dataset rehydrated from cold storage either (its pairs are not in the full
+snapshot), so an incremental snapshot requested after a rehydration is
+taken as a full one.
+
+Each snapshot is a data file plus a JSON manifest written last (a snapshot
+without one is incomplete and ignored). Files are written under a `.tmp`
+name and renamed when complete; `.tmp` files found while no snapshot is
+running were left by a process that died mid-copy and are deleted. The manifest records the checksum,
+row counts, the parent snapshot and the feedback position the next
+incremental snapshot starts from.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, bindparam, create_engine, func, inspect, or_, select, update
+from sqlalchemy.engine import make_url
+
+from changefeed import settled_horizon
+from models import db, Dataset, Feedback, QuestionAnswerPair
+
+# SQLite pages copied per backup step and the pause after each step
+DEFAULT_BACKUP_PAGES = 1024
+DEFAULT_BACKUP_PAUSE = 0.005
+MAX_BACKUP_RESTARTS = 5
+
+BATCH_SIZE = 1000
+READ_BLOCK_SIZE = 1024 * 1024
+
+FULL = 'full'
+FEEDBACK = 'feedback'
+
+_local_lock = threading.Lock()
+
+
+class BackupError(Exception):
+    """Raised when a snapshot cannot be taken, verified or restored"""
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_root(app):
+    """Directory holding snapshots"""
+    root = app.config.get('BACKUP_DIR') or os.path.join(app.instance_path, 'backups')
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+class SnapshotLock:
+    """Allows one snapshot at a time per backup directory, across worker processes"""
+
+    def __init__(self, root):
+        self.path = os.path.join(root, 'snapshot.lock')
+        self._file = None
+
+    def acquire(self):
+        if not _local_lock.acquire(blocking=False):
+            raise BackupError('A snapshot is already running')
+        self._file = open(self.path, 'w')
+        try:
+            import fcntl
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:
+            pass  # No cross-process locking on this platform
+        except OSError:
+            self._file.close()
+            _local_lock.release()
+            raise BackupError('A snapshot is already running')
+        return self
+
+    def release(self):
+        self._file.close()
+        _local_lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _encode_position(position):
+    return [position[0].isoformat(), position[1]] if position else None
+
+
+def _decode_position(value):
+    return (datetime.fromisoformat(value[0]), value[1]) if value else None
+
+
+def _remove_partial_files(root):
+    """Delete the .tmp files of interrupted snapshots; the caller must hold the SnapshotLock"""
+    removed = []
+    for name in sorted(os.listdir(root)):
+        if name.endswith('.tmp'):
+            os.remove(os.path.join(root, name))
+            removed.append(name)
+    return removed
+
+
+def remove_partial_files(root):
+    """Delete files left by interrupted snapshots unless a snapshot is running; returns their names"""
+    try:
+        with SnapshotLock(root):
+            return _remove_partial_files(root)
+    except BackupError:
+        return []  # A snapshot is running and its .tmp files are still being written
+
+
+def list_snapshots(root):
+    """Manifests of complete snapshots, oldest first"""
+    remove_partial_files(root)
+    manifests = []
+    for name in sorted(os.listdir(root)):
+        if name.endswith('.json'):
+            with open(os.path.join(root, name)) as f:
+                manifests.append(json.load(f))
+    return manifests
+
+
+def load_manifest(root, snapshot_id):
+    for manifest in list_snapshots(root):
+        if manifest['id'] == snapshot_id:
+            return manifest
+    raise BackupError(f'Unknown snapshot "{snapshot_id}"')
+
+
+def snapshot_chain(root, snapshot_id):
+    """The full snapshot a snapshot builds on followed by its incrementals, in restore order"""
+    chain = [load_manifest(root, snapshot_id)]
+    while chain[0]['kind'] != FULL:
+        chain.insert(0, load_manifest(root, chain[0]['parent']))
+    return chain
+
+
+def _write_manifest(root, manifest):
+    path = os.path.join(root, f'{manifest["id"]}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return manifest
+
+
+def _new_id(kind):
+    return f'{datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")}-{kind}'
+
+
+def _table_counts(connection):
+    existing = set(inspect(connection).get_table_names())
+    return {
+        table.name: connection.execute(select(func.count()).select_from(table)).scalar()
+        for table in db.metadata.sorted_tables if table.name in existing
+    }
+
+
+def _last_feedback_position(connection, horizon):
+    """(updated_at, id) of the newest settled feedback row, or None"""
+    table = Feedback.__table__
+    row = connection.execute(
+        select(table.c.updated_at, table.c.id).where(table.c.updated_at <= horizon).
+        order_by(table.c.updated_at.desc(), table.c.id.desc()).limit(1)
+    ).first()
+    return (row[0], row[1]) if row else None
+
+
+def _after(table, position):
+    updated_at, last_id = position
+    return or_(table.c.updated_at > updated_at, and_(table.c.updated_at == updated_at, table.c.id > last_id))
+
+
+def _sqlite_backup(source_path, target_path, pages, pause):
+    """Copy a SQLite database with the online backup API; returns the number of restarts"""
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            # Another connection wrote to the source and the copy started over
+            restarts += 1
+            if restarts > MAX_BACKUP_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        time.sleep(pause)
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        except _TooManyRestarts:
+            source.backup(target, pages=-1)
+    finally:
+        source.close()
+        target.close()
+    return restarts
+
+
+def _libpq_args(url):
+    """pg_dump/pg_restore connection string and environment (the password stays out of argv)"""
+    url = make_url(url) if isinstance(url, str) else url
+    env = dict(os.environ)
+    if url.password:
+        env['PGPASSWORD'] = url.password
+    return url.set(drivername='postgresql', password=None).render_as_string(hide_password=False), env
+
+
+def _run_pg_tool(args, env):
+    tool = args[0]
+    if shutil.which(tool) is None:
+        raise BackupError(f'{tool} is not installed')
+    result = subprocess.run(args, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise BackupError(f'{tool} failed: {result.stderr.strip()[-500:]}')
+    return result.stdout
+
+
+def snapshot_full(root, engine, pages=DEFAULT_BACKUP_PAGES, pause=DEFAULT_BACKUP_PAUSE, reason=None):
+    """Take a full point-in-time copy of the database; returns its manifest"""
+    snapshot_id = _new_id(FULL)
+    started = time.perf_counter()
+    horizon = settled_horizon(engine)
+    manifest = {'id': snapshot_id, 'kind': FULL, 'parent': None, 'dialect': engine.dialect.name,
+                'created_at': datetime.utcnow().isoformat()}
+    if reason:
+        manifest['reason'] = reason
+
+    if engine.dialect.name == 'sqlite':
+        path = os.path.join(root, f'{snapshot_id}.sqlite3')
+        manifest['restarts'] = _sqlite_backup(engine.url.database, path + '.tmp', pages, pause)
+        os.replace(path + '.tmp', path)
+        # Counts and position come from the copy itself, so they describe exactly what it holds
+        copy = create_engine(f'sqlite:///{path}')
+        try:
+            with copy.connect() as connection:
+                manifest['counts'] = _table_counts(connection)
+                position = _last_feedback_position(connection, horizon)
+        finally:
+            copy.dispose()
+    elif engine.dialect.name == 'postgresql':
+        path = os.path.join(root, f'{snapshot_id}.dump')
+        # Rows settled before the dump starts are certainly in it
+        with engine.connect() as connection:
+            position = _last_feedback_position(connection, horizon)
+        dsn, env = _libpq_args(engine.url)
+        _run_pg_tool(['pg_dump', '--format=custom', '--no-owner', f'--file={path}.tmp', dsn], env)
+        os.replace(path + '.tmp', path)
+        with engine.connect() as connection:
+            manifest['counts'] = _table_counts(connection)
+        manifest['counts_approximate'] = True
+    else:
+        raise BackupError(f'Snapshots are not supported for {engine.dialect.name}')
+
+    manifest.update({
+        'file': os.path.basename(path),
+        'size': os.path.getsize(path),
+        'sha256': _sha256(path),
+        'feedback_position': _encode_position(position),
+        'seconds': round(time.perf_counter() - started, 3)
+    })
+    return _write_manifest(root, manifest)
+
+
+def _feedback_line(row, columns):
+    record = {}
+    for column, value in zip(columns, row):
+        record[column] = _isoformat(value) if isinstance(value, datetime) else value
+    return json.dumps(record) + '\n'
+
+
+def snapshot_feedback(root, engine):
+    """Save feedback inserted or updated since the previous snapshot; returns its manifest"""
+    previous = list_snapshots(root)
+    if not previous:
+        raise BackupError('Take a full snapshot before incremental ones')
+    parent = previous[-1]
+    position = _decode_position(parent['feedback_position'])
+
+    snapshot_id = _new_id(FEEDBACK)
+    started = time.perf_counter()
+    horizon = settled_horizon(engine)
+    table = Feedback.__table__
+    columns = [column.name for column in table.columns]
+    query = select(*table.columns).where(table.c.updated_at <= horizon)
+    if position is not None:
+        query = query.where(_after(table, position))
+    query = query.order_by(table.c.updated_at, table.c.id)
+
+    path = os.path.join(root, f'{snapshot_id}.ndjson.gz')
+    rows = 0
+    with engine.connect() as connection, gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+        result = connection.execution_options(yield_per=BATCH_SIZE).execute(query)
+        for partition in result.partitions(BATCH_SIZE):
+            f.write(''.join(_feedback_line(row, columns) for row in partition))
+            rows += len(partition)
+            last = partition[-1]
+            position = (last.updated_at, last.id)
+    os.replace(path + '.tmp', path)
+
+    return _write_manifest(root, {
+        'id': snapshot_id,
+        'kind': FEEDBACK,
+        'parent': parent['id'],
+        'dialect': engine.dialect.name,
+        'created_at': datetime.utcnow().isoformat(),
+        'file': os.path.basename(path),
+        'size': os.path.getsize(path),
+        'sha256': _sha256(path),
+        'columns': columns,
+        'rows': rows,
+        'feedback_position': _encode_position(position),
+        'seconds': round(time.perf_counter() - started, 3)
+    })
+
+
+def _rehydrated_since(engine, since):
+    """Whether a dataset was rehydrated from cold storage after `since`"""
+    with engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(Dataset.__table__).where(Dataset.__table__.c.rehydrated_at > since)
+        ).scalar() > 0
+
+
+def create_snapshot(root, engine, incremental=False, locked=False, **options):
+    """Take a full or incremental snapshot, one at a time per backup directory
+
+    An incremental snapshot is taken as a full one when a dataset was
+    rehydrated since the full snapshot it would build on started. Pass
+    locked=True when the caller already holds the SnapshotLock.
+    """
+    if not locked:
+        with SnapshotLock(root):
+            return create_snapshot(root, engine, incremental, locked=True, **options)
+    _remove_partial_files(root)
+    if incremental:
+        previous = list_snapshots(root)
+        full = snapshot_chain(root, previous[-1]['id'])[0] if previous else None
+        if full is None or not _rehydrated_since(engine, datetime.fromisoformat(full['created_at'])):
+            return snapshot_feedback(root, engine)
+        return snapshot_full(root, engine, reason='a dataset was rehydrated since the last full snapshot')
+    return snapshot_full(root, engine, **options)
+
+
+def _check_file(root, manifest):
+    path = os.path.join(root, manifest['file'])
+    if not os.path.exists(path):
+        raise BackupError(f'{manifest["file"]} is missing')
+    if _sha256(path) != manifest['sha256']:
+        raise BackupError(f'{manifest["file"]} does not match its checksum')
+    return path
+
+
+def _iter_feedback_records(path, columns):
+    datetime_columns = {column.name for column in Feedback.__table__.columns
+                        if column.type.python_type is datetime and column.name in columns}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            for column in datetime_columns:
+                if record.get(column):
+                    record[column] = datetime.fromisoformat(record[column])
+            yield record
+
+
+def _apply_feedback(connection, records):
+    """Update rows that exist by id and insert the others; returns (applied, skipped)"""
+    table = Feedback.__table__
+    target_columns = {column.name for column in table.columns}
+    applied = skipped = 0
+    batch = []
+
+    def flush(batch):
+        nonlocal applied, skipped
+        ids = [record['id'] for record in batch]
+        existing = {row[0] for row in connection.execute(select(table.c.id).where(table.c.id.in_(ids)))}
+        pair_ids = {record['qa_pair_id'] for record in batch}
+        pairs = {row[0] for row in connection.execute(
+            select(QuestionAnswerPair.__table__.c.id).where(QuestionAnswerPair.__table__.c.id.in_(pair_ids))
+        )}
+        updates, inserts = [], []
+        for record in batch:
+            if record['qa_pair_id'] not in pairs:
+                # The pair was created after the full snapshot; only feedback is incremental
+                skipped += 1
+                continue
+            values = {column: value for column, value in record.items() if column in target_columns}
+            if record['id'] in existing:
+                updates.append({f'b_{key}': value for key, value in values.items()})
+            else:
+                inserts.append(values)
+        if updates:
+            columns = [column for column in updates[0] if column != 'b_id']
+            connection.execute(
+                update(table).where(table.c.id == bindparam('b_id')).
+                values({column[2:]: bindparam(column) for column in columns}),
+                updates
+            )
+        if inserts:
+            connection.execute(table.insert(), inserts)
+        applied += len(updates) + len(inserts)
+
+    for record in records:
+        batch.append(record)
+        if len(batch) >= BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return applied, skipped
+
+
+def _restore_full(root, manifest, target_url):
+    path = _check_file(root, manifest)
+    target_url = make_url(target_url)
+    if manifest['dialect'] == 'sqlite':
+        if target_url.get_backend_name() != 'sqlite':
+            raise BackupError('A SQLite snapshot can only be restored into a SQLite database')
+        _sqlite_backup(path, target_url.database, pages=-1, pause=0)
+    else:
+        if target_url.get_backend_name() != 'postgresql':
+            raise BackupError('A pg_dump snapshot can only be restored into a PostgreSQL database')
+        dsn, env = _libpq_args(target_url)
+        _run_pg_tool(['pg_restore', '--clean', '--if-exists', '--no-owner', '--single-transaction',
+                      f'--dbname={dsn}', path], env)
+
+
+def restore_snapshot(root, snapshot_id, target_url):
+    """Restore a snapshot chain (full plus incrementals) into the target database; returns per-step results
+
+    The target's previous contents are replaced; stop the app while restoring
+    its own database.
+    """
+    chain = snapshot_chain(root, snapshot_id)
+    for manifest in chain:
+        _check_file(root, manifest)
+
+    steps = []
+    _restore_full(root, chain[0], target_url)
+    steps.append({'id': chain[0]['id'], 'kind': FULL})
+
+    engine = create_engine(target_url)
+    try:
+        for manifest in chain[1:]:
+            path = os.path.join(root, manifest['file'])
+            with engine.begin() as connection:
+                applied, skipped = _apply_feedback(connection, _iter_feedback_records(path, manifest['columns']))
+            steps.append({'id': manifest['id'], 'kind': FEEDBACK, 'applied': applied, 'skipped': skipped})
+    finally:
+        engine.dispose()
+    return steps
+
+
+def verify_snapshot(root, snapshot_id, target_url=None):
+    """Restore a snapshot chain into a scratch database and check it; returns a report
+
+    SQLite chains are restored into a temporary file. PostgreSQL chains need
+    target_url, a scratch database to restore into; without one only the
+    checksums and the dump's table of contents are checked.
+    """
+    chain = snapshot_chain(root, snapshot_id)
+    checks = []
+    for manifest in chain:
+        _check_file(root, manifest)
+        checks.append(f'{manifest["file"]}: checksum ok')
+
+    full = chain[0]
+    scratch_dir = None
+    if target_url is None and full['dialect'] == 'sqlite':
+        scratch_dir = tempfile.mkdtemp(prefix='snapshot-verify-')
+        target_url = f'sqlite:///{os.path.join(scratch_dir, "restore.db")}'
+    if target_url is None:
+        _run_pg_tool(['pg_restore', '--list', os.path.join(root, full['file'])], dict(os.environ))
+        checks.append(f'{full["file"]}: pg_restore can read the dump')
+        return {'snapshot': snapshot_id, 'restored': False, 'checks': checks}
+
+    try:
+        steps = restore_snapshot(root, snapshot_id, target_url)
+        engine = create_engine(target_url)
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name == 'sqlite':
+                    result = connection.exec_driver_sql('PRAGMA integrity_check').scalar()
+                    if result != 'ok':
+                        raise BackupError(f'Integrity check of the restored database failed: {result}')
+                    checks.append('restored database: integrity check ok')
+                counts = _table_counts(connection)
+                if not full.get('counts_approximate') and len(chain) == 1 and counts != full['counts']:
+                    raise BackupError(f'Restored row counts {counts} differ from the snapshot {full["counts"]}')
+                if len(chain) == 1:
+                    checks.append(f'restored row counts match: {counts}')
+                for manifest, step in zip(chain[1:], steps[1:]):
+                    # Every row of an incremental must be in the restored feedback table
+                    ids = [record['id'] for record in _iter_feedback_records(
+                        os.path.join(root, manifest['file']), manifest['columns'])]
+                    found = 0
+                    for start in range(0, len(ids), BATCH_SIZE):
+                        found += connection.execute(select(func.count()).select_from(Feedback.__table__).where(
+                            Feedback.__table__.c.id.in_(ids[start:start + BATCH_SIZE]))).scalar()
+                    if found != len(ids) - step['skipped']:
+                        raise BackupError(f'{manifest["id"]}: {len(ids) - step["skipped"]} rows applied '
+                                          f'but {found} found after restore')
+                    check = f'{manifest["id"]}: {step["applied"]} feedback rows applied'
+                    if step['skipped']:
+                        check += f', {step["skipped"]} skipped (their pairs were created after the full snapshot)'
+                    checks.append(check)
+        finally:
+            engine.dispose()
+    finally:
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+    return {'snapshot': snapshot_id, 'restored': True, 'checks': checks}
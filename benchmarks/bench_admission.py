@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Feedback-save latency while other clients run bulk downloads, against a
+gunicorn server with a few sync workers: with no bulk load, with bulk load
+and admission control off, and with bulk load and admission control on.
+Bulk clients download a whole dataset in a loop and honour Retry-After
+when refused; one reviewer saves feedback every --save-interval seconds.
+
+    python benchmarks/bench_admission.py --pairs 20000 --workers 3 --bulk-clients 4 --seconds 20
+
+The temporary SQLite database runs in WAL mode so reads do not block the
+reviewer's commits, as on a server database.
+"""
+
+import argparse
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Logging in from a script needs the form's CSRF check off
+WSGI_SHIM = '''from app import app
+app.config['WTF_CSRF_ENABLED'] = False
+'''
+
+
+def seed(db, models, pairs, reviewers):
+    """Bulk insert a dataset every reviewer can access, with every pair scored"""
+    User, Dataset, QuestionAnswerPair, Feedback = models
+    users = [User(username=f'reviewer{i}', password='bench', access_level='admin' if i == 0 else 'user')
+             for i in range(reviewers)]
+    db.session.add_all(users)
+    dataset = Dataset(name='bench')
+    db.session.add(dataset)
+    db.session.flush()
+    dataset.authorized_users.extend(users)
+
+    db.session.execute(db.insert(QuestionAnswerPair), [{
+        'dataset_id': dataset.id,
+        'question_text': f'question {i} ' + 'lorem ipsum ' * 10,
+        'system_answer_text': f'answer {i} ' + 'dolor sit amet ' * 20
+    } for i in range(pairs)])
+    qa_ids = [row[0] for row in db.session.query(QuestionAnswerPair.id).filter_by(dataset_id=dataset.id)]
+
+    now = datetime.utcnow() - timedelta(days=1)
+    for start in range(0, len(qa_ids), 10000):
+        db.session.execute(db.insert(Feedback), [{
+            'qa_pair_id': qa_id,
+            'user_id': user.id,
+            'accuracy_score': random.randint(1, 5),
+            'completeness_score': random.randint(1, 5),
+            'clarity_score': random.randint(1, 5),
+            'submitted_at': now,
+            'updated_at': now
+        } for qa_id in qa_ids[start:start + 10000] for user in users[1:]])
+    db.session.commit()
+    return dataset.id, qa_ids
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir, database_url, workers, admission, bulk_concurrency):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, ADMISSION_ENABLED='1' if admission else '0',
+               ADMISSION_DIR=tempfile.mkdtemp(dir=workdir), ADMISSION_BULK_CONCURRENCY=str(bulk_concurrency))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--pythonpath', f'{ROOT},{workdir}', '-w', str(workers),
+         '-b', f'127.0.0.1:{port}', '--timeout', '120', '--log-level', 'warning', 'bench_wsgi:app'],
+        cwd=ROOT, env=env)
+    base = f'http://127.0.0.1:{port}'
+    for _ in range(300):
+        try:
+            urllib.request.urlopen(f'{base}/login', timeout=1).read()
+            return server, base
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def login(base, username):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    form = urllib.parse.urlencode({'username': username, 'password': 'bench'}).encode()
+    opener.open(f'{base}/login', data=form).read()
+    return opener
+
+
+def reviewer(opener, base, qa_ids, interval, stop, latencies, errors):
+    while not stop.is_set():
+        body = json.dumps({'qa_id': random.choice(qa_ids), 'accuracy_score': random.randint(1, 5),
+                           'completeness_score': 3, 'clarity_score': 3}).encode()
+        request = urllib.request.Request(f'{base}/api/submit_feedback', data=body,
+                                         headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            opener.open(request, timeout=120).read()
+            latencies.append((time.perf_counter() - start) * 1000)
+        except OSError:
+            errors.append(1)
+        stop.wait(interval)
+
+
+def bulk_client(base, dataset_id, stop, downloads, refused):
+    """Download in a loop; runs in its own process so it does not hold up the reviewer's thread"""
+    opener = login(base, 'reviewer0')
+    while not stop.is_set():
+        try:
+            with opener.open(f'{base}/api/download_dataset/{dataset_id}?format=json', timeout=120) as response:
+                while response.read(1 << 20):
+                    pass
+            with downloads.get_lock():
+                downloads.value += 1
+        except urllib.error.HTTPError as error:
+            if error.code != 429:
+                raise
+            # Close before backing off: the worker lingers until the client hangs up
+            error.close()
+            with refused.get_lock():
+                refused.value += 1
+            stop.wait(float(error.headers.get('Retry-After', 1)))
+
+
+def run_scenario(workdir, database_url, dataset_id, qa_ids, args, bulk_clients, admission):
+    server, base = start_server(workdir, database_url, args.workers, admission, args.bulk_concurrency)
+    try:
+        stop = multiprocessing.Event()
+        downloads, refused = multiprocessing.Value('i', 0), multiprocessing.Value('i', 0)
+        clients = [multiprocessing.Process(target=bulk_client, args=(base, dataset_id, stop, downloads, refused))
+                   for _ in range(bulk_clients)]
+        for client in clients:
+            client.start()
+        # Let the downloads get going before measuring
+        time.sleep(1 if bulk_clients else 0)
+        latencies, errors = [], []
+        thread = threading.Thread(target=reviewer, args=(
+            login(base, 'reviewer1'), base, qa_ids, args.save_interval, stop, latencies, errors))
+        thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        thread.join()
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    quantile = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else float('nan')
+    return {
+        'saves': len(latencies), 'errors': len(errors), 'p50': statistics.median(latencies) if latencies else float('nan'),
+        'p95': quantile(0.95), 'p99': quantile(0.99), 'max': latencies[-1] if latencies else float('nan'),
+        'downloads': downloads.value, 'refused': refused.value
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=20000)
+    parser.add_argument('--reviewers', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn sync workers')
+    parser.add_argument('--bulk-clients', type=int, default=4)
+    parser.add_argument('--bulk-concurrency', type=int, default=2)
+    parser.add_argument('--save-interval', type=float, default=0.2)
+    parser.add_argument('--seconds', type=float, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    database_url = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ['DATABASE_URL'] = database_url
+    with open(os.path.join(workdir, 'bench_wsgi.py'), 'w') as f:
+        f.write(WSGI_SHIM)
+
+    from app import app
+    from models import db, upgrade_schema, User, Dataset, QuestionAnswerPair, Feedback
+
+    random.seed(0)
+    with app.app_context():
+        upgrade_schema()
+        db.session.execute(db.text('PRAGMA journal_mode=WAL'))
+        dataset_id, qa_ids = seed(db, (User, Dataset, QuestionAnswerPair, Feedback), args.pairs, args.reviewers)
+        db.engine.dispose()
+    print(f'{args.pairs} pairs, {args.workers} workers, {args.bulk_clients} bulk clients, '
+          f'bulk concurrency {args.bulk_concurrency}, {args.seconds:.0f} s per scenario')
+
+    scenarios = [('no bulk load', 0, True), ('bulk, admission off', args.bulk_clients, False),
+                 ('bulk, admission on', args.bulk_clients, True)]
+    print(f'{"scenario":<22}{"saves":>7}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"max ms":>9}'
+          f'{"downloads":>11}{"refused":>9}{"errors":>8}')
+    for name, bulk_clients, admission in scenarios:
+        result = run_scenario(workdir, database_url, dataset_id, qa_ids, args, bulk_clients, admission)
+        print(f'{name:<22}{result["saves"]:>7}{result["p50"]:>9.1f}{result["p95"]:>9.1f}{result["p99"]:>9.1f}'
+              f'{result["max"]:>9.1f}{result["downloads"]:>11}{result["refused"]:>9}{result["errors"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Cost of moving a dataset to cold storage and back on a synthetic dataset:
+archive time and size, a full JSON download served from the archive against
+the same download from the live tables, and the bulk rehydrate.
+
+    python benchmarks/bench_archive.py --pairs 100000 --reviewers 3
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, models, pairs, reviewers):
+    """Bulk insert a dataset where every reviewer scores every pair"""
+    User, Dataset, QuestionAnswerPair, Feedback = models
+    users = [User(username=f'reviewer{i}', password='bench', access_level='admin' if i == 0 else 'user') for i in range(reviewers)]
+    db.session.add_all(users)
+    dataset = Dataset(name='bench')
+    db.session.add(dataset)
+    db.session.flush()
+
+    db.session.execute(db.insert(QuestionAnswerPair), [{
+        'dataset_id': dataset.id,
+        'question_text': f'question {i} ' + 'lorem ipsum ' * 10,
+        'system_answer_text': f'answer {i} ' + 'dolor sit amet ' * 20
+    } for i in range(pairs)])
+    qa_ids = [row[0] for row in db.session.query(QuestionAnswerPair.id).filter_by(dataset_id=dataset.id)]
+
+    now = datetime.utcnow() - timedelta(days=1)
+    for start in range(0, len(qa_ids), 10000):
+        db.session.execute(db.insert(Feedback), [{
+            'qa_pair_id': qa_id,
+            'user_id': user.id,
+            'accuracy_score': random.randint(1, 5),
+            'completeness_score': random.randint(1, 5),
+            'clarity_score': random.randint(1, 5),
+            'comments': random.choice([None, 'fine', 'needs a citation']),
+            'submitted_at': now,
+            'updated_at': now
+        } for qa_id in qa_ids[start:start + 10000] for user in users])
+    db.session.commit()
+    return dataset.id
+
+
+def download(client, dataset_id):
+    start = time.perf_counter()
+    response = client.get(f'/api/download_dataset/{dataset_id}?format=json')
+    body = response.get_data()
+    assert response.status_code == 200, response.status_code
+    return (time.perf_counter() - start) * 1000, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=100000)
+    parser.add_argument('--reviewers', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ['ARCHIVE_DIR'] = os.path.join(workdir, 'archives')
+
+    from app import app
+    from models import db, upgrade_schema, User, Dataset, QuestionAnswerPair, Feedback
+    from cold_storage import archive_root, archive_dataset, rehydrate_dataset
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    random.seed(0)
+    with app.app_context():
+        upgrade_schema()
+        start = time.perf_counter()
+        dataset_id = seed(db, (User, Dataset, QuestionAnswerPair, Feedback), args.pairs, args.reviewers)
+        print(f'seeded {args.pairs} pairs and {args.pairs * args.reviewers} ratings in {time.perf_counter() - start:.1f} s')
+        root = archive_root(app)
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'reviewer0', 'password': 'bench'})
+
+    live_ms, live_body = download(client, dataset_id)
+    with app.app_context():
+        archived = archive_dataset(root, dataset_id)
+    size = sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, _, names in os.walk(root) for name in names)
+    archive_ms, archive_body = download(client, dataset_id)
+    assert archive_body == live_body, 'download from the archive differs'
+    with app.app_context():
+        rehydrated = rehydrate_dataset(root, dataset_id)
+
+    print(f'{"archive":<28}{archived["seconds"] * 1000:>10.1f} ms ({size / 1e6:.1f} MB on disk)')
+    print(f'{"download (live)":<28}{live_ms:>10.1f} ms ({len(live_body) / 1e6:.1f} MB)')
+    print(f'{"download (archive)":<28}{archive_ms:>10.1f} ms')
+    print(f'{"rehydrate":<28}{rehydrated["seconds"] * 1000:>10.1f} ms '
+          f'({rehydrated["pairs"]} pairs, {rehydrated["feedback"]} feedback)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Bytes on the wire and server CPU per content coding for the heavy endpoints:
+the Q&A list with full texts, JSON and CSV downloads and the streamed NDJSON
+export. Each request goes through the app's compression layer.
+
+    python benchmarks/bench_compression.py --pairs 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_read_models import seed
+
+
+def measure(client, url, encoding, repeat):
+    """Best-of-repeat wall and CPU time for fetching the full body"""
+    best_wall = best_cpu = None
+    size = 0
+    for _ in range(repeat):
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        response = client.get(url, headers={'Accept-Encoding': encoding} if encoding else {})
+        size = len(response.get_data())
+        wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+    return size, best_wall, best_cpu, response.headers.get('Content-Encoding') or 'identity'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=20000)
+    parser.add_argument('--reviewers', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+
+    from app import app
+    from compression import available_encodings
+    from models import db, upgrade_schema, User, Dataset, QuestionAnswerPair, Feedback
+
+    random.seed(0)
+    with app.app_context():
+        upgrade_schema()
+        dataset_id, _ = seed(db, (User, Dataset, QuestionAnswerPair, Feedback), args.pairs, args.reviewers)
+        admin = User(username='bench-admin', password='bench', access_level='admin')
+        db.session.add(admin)
+        db.session.commit()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench-admin', 'password': 'bench'})
+
+    urls = {
+        'qa list (full text)': f'/api/dataset/{dataset_id}/qa?include_text=true',
+        'download json': f'/api/download_dataset/{dataset_id}?format=json&include_scores=true&include_gold_standards=true',
+        'download csv': f'/api/download_dataset/{dataset_id}?format=csv&include_scores=true&include_gold_standards=true',
+        'ndjson stream': f'/api/download_dataset/{dataset_id}?format=ndjson&compression=none&include_scores=true',
+    }
+    print(f'{args.pairs} Q&A pairs; encodings available: {", ".join(available_encodings())}')
+    print(f'{"endpoint":<22}{"encoding":<10}{"bytes":>14}{"ratio":>8}{"wall":>10}{"cpu":>10}')
+    for label, url in urls.items():
+        baseline = None
+        for encoding in (None, *available_encodings()):
+            size, wall, cpu, served = measure(client, url, encoding, args.repeat)
+            baseline = baseline or size
+            print(f'{label:<22}{served:<10}{size:>14,}{size / baseline:>8.2f}{wall:>9.3f}s{cpu:>9.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark dataset export formats: bytes produced, export time and the time
+an ML pipeline needs to load the result back into memory.
+
+    python benchmarks/bench_exports.py --pairs 20000 --reviewers 3
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, models, pairs, reviewers):
+    """Bulk insert a synthetic dataset with scored feedback from every reviewer"""
+    User, Dataset, QuestionAnswerPair, Feedback = models
+    users = [User(username=f'reviewer{i}', password='bench', access_level='admin' if i == 0 else 'user')
+             for i in range(reviewers)]
+    db.session.add_all(users)
+    dataset = Dataset(name='bench')
+    db.session.add(dataset)
+    db.session.flush()
+
+    words = 'patient dose tablet daily renal hepatic contraindicated monitor levels weekly'.split()
+    db.session.execute(db.insert(QuestionAnswerPair), [{
+        'dataset_id': dataset.id,
+        'question_text': ' '.join(random.choices(words, k=20)),
+        'system_answer_text': ' '.join(random.choices(words, k=120)),
+        'original_qa_id': f'q{i}'
+    } for i in range(pairs)])
+    qa_ids = [row[0] for row in db.session.query(QuestionAnswerPair.id).filter_by(dataset_id=dataset.id)]
+    db.session.execute(db.insert(Feedback), [{
+        'qa_pair_id': qa_id,
+        'user_id': user.id,
+        'text_feedback': ' '.join(random.choices(words, k=15)),
+        'accuracy_score': random.randint(1, 5),
+        'completeness_score': random.randint(1, 5),
+        'clarity_score': random.randint(1, 5),
+        'clinical_relevance_score': random.randint(1, 5),
+        'gold_standard_answer': ' '.join(random.choices(words, k=100))
+    } for qa_id in qa_ids for user in users])
+    db.session.commit()
+    return dataset.id, users[0].username
+
+
+def load_json(data):
+    return json.loads(data)
+
+
+def load_csv(data):
+    return list(csv.DictReader(io.StringIO(data.decode('utf-8'))))
+
+
+def load_ndjson(data, compression):
+    if compression == 'gzip':
+        data = gzip.decompress(data)
+    elif compression == 'zstd':
+        import zstandard
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return [json.loads(line) for line in data.splitlines()]
+
+
+def load_parquet(data):
+    import pyarrow.parquet as pq
+    return pq.read_table(io.BytesIO(data))
+
+
+def load_arrow(data):
+    import pyarrow as pa
+    return pa.ipc.open_stream(data).read_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=5000)
+    parser.add_argument('--reviewers', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+
+    from app import app
+    from models import db, upgrade_schema, User, Dataset, QuestionAnswerPair, Feedback
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    random.seed(0)
+    with app.app_context():
+        upgrade_schema()
+        dataset_id, username = seed(db, (User, Dataset, QuestionAnswerPair, Feedback), args.pairs, args.reviewers)
+
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': 'bench'})
+
+    options = 'include_scores=true&include_gold_standards=true&include_text_feedback=true'
+    cases = [
+        ('json', 'format=json', load_json),
+        ('csv', 'format=csv', load_csv),
+        ('ndjson', 'format=ndjson&compression=none', lambda d: load_ndjson(d, 'none')),
+        ('ndjson.gz', 'format=ndjson&compression=gzip', lambda d: load_ndjson(d, 'gzip')),
+        ('ndjson.zst', 'format=ndjson&compression=zstd', lambda d: load_ndjson(d, 'zstd')),
+        ('parquet', 'format=parquet', load_parquet),
+        ('arrow', 'format=arrow', load_arrow),
+    ]
+
+    print(f'{args.pairs} Q&A pairs x {args.reviewers} reviewers')
+    print(f'{"format":<12}{"bytes":>14}{"export s":>12}{"load s":>10}')
+    for name, query, loader in cases:
+        start = time.perf_counter()
+        response = client.get(f'/api/download_dataset/{dataset_id}?{query}&{options}')
+        data = response.get_data()
+        export_seconds = time.perf_counter() - start
+        if response.status_code != 200:
+            print(f'{name:<12}{"skipped: " + response.get_json().get("error", ""):>36}')
+            continue
+
+        start = time.perf_counter()
+        loader(data)
+        load_seconds = time.perf_counter() - start
+        print(f'{name:<12}{len(data):>14,}{export_seconds:>12.3f}{load_seconds:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
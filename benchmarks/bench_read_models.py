@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Compare memory and latency of the row-tuple read models against loading full
+ORM objects (the previous implementation) on the list and export paths.
+
+    python benchmarks/bench_read_models.py --pairs 100000
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, models, pairs, reviewers):
+    """Bulk insert a synthetic dataset with scored feedback on every other pair"""
+    User, Dataset, QuestionAnswerPair, Feedback = models
+    users = [User(username=f'reviewer{i}', password='bench') for i in range(reviewers)]
+    db.session.add_all(users)
+    dataset = Dataset(name='bench')
+    db.session.add(dataset)
+    db.session.flush()
+
+    words = 'patient dose tablet daily renal hepatic contraindicated monitor levels weekly'.split()
+    db.session.execute(db.insert(QuestionAnswerPair), [{
+        'dataset_id': dataset.id,
+        'question_text': ' '.join(random.choices(words, k=60)),
+        'system_answer_text': ' '.join(random.choices(words, k=300)),
+        'original_qa_id': f'q{i}'
+    } for i in range(pairs)])
+    qa_ids = [row[0] for row in db.session.query(QuestionAnswerPair.id).filter_by(dataset_id=dataset.id)]
+    db.session.execute(db.insert(Feedback), [{
+        'qa_pair_id': qa_id,
+        'user_id': user.id,
+        'accuracy_score': random.randint(1, 5),
+        'gold_standard_answer': ' '.join(random.choices(words, k=100)) if random.random() < 0.3 else None
+    } for qa_id in qa_ids[::2] for user in users])
+    db.session.commit()
+    return dataset.id, users[0].id
+
+
+def measure(label, func):
+    """Run func once, reporting wall time and peak traced memory"""
+    from models import db
+
+    db.session.expunge_all()
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.expunge_all()
+    print(f'{label:<36}{elapsed:>10.2f} s{peak / 1024 / 1024:>12.1f} MiB   rows={result}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=100000)
+    parser.add_argument('--reviewers', type=int, default=2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+
+    from sqlalchemy.orm import selectinload
+    from app import app
+    from models import db, upgrade_schema, User, Dataset, QuestionAnswerPair, Feedback
+    from read_models import qa_list_rows, iter_qa_with_feedback
+
+    random.seed(0)
+    with app.app_context():
+        upgrade_schema()
+        dataset_id, user_id = seed(db, (User, Dataset, QuestionAnswerPair, Feedback), args.pairs, args.reviewers)
+
+        def orm_list():
+            # Previous list path: full ORM objects plus their feedback collections
+            qa_pairs = QuestionAnswerPair.query.options(selectinload(QuestionAnswerPair.feedback)).\
+                filter_by(dataset_id=dataset_id).order_by(QuestionAnswerPair.created_at.desc()).all()
+            rows = []
+            for qa in qa_pairs:
+                user_feedback = [f for f in qa.feedback if f.user_id == user_id]
+                rows.append((qa.id, qa.question_text[:100], len(user_feedback),
+                             any(f.gold_standard_answer for f in user_feedback)))
+            return len(rows)
+
+        def tuple_list():
+            return len(qa_list_rows(dataset_id, user_id))
+
+        def orm_export():
+            # Previous export path: every pair and feedback row as ORM objects
+            qa_pairs = QuestionAnswerPair.query.options(selectinload(QuestionAnswerPair.feedback)).\
+                filter_by(dataset_id=dataset_id).all()
+            return sum(1 + len(qa.feedback) for qa in qa_pairs)
+
+        def tuple_export():
+            return sum(1 + len(feedback) for _, feedback in iter_qa_with_feedback(dataset_id))
+
+        print(f'{args.pairs} Q&A pairs, {args.reviewers} reviewers on half of them')
+        print(f'{"path":<36}{"time":>12}{"peak memory":>16}')
+        measure('list: ORM objects', orm_list)
+        measure('list: row tuples (previews)', tuple_list)
+        measure('export: ORM objects', orm_export)
+        measure('export: streamed row tuples', tuple_export)
+
+
+if __name__ == '__main__':
+    main()
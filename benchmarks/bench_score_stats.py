@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Latency of the per-dataset score distributions (/api/admin/dataset/<id>/scores)
+on a synthetic dataset: the first (full) computation, a cached request, and
+the incremental merge after a batch of feedback is submitted or changed.
+
+    python benchmarks/bench_score_stats.py --pairs 250000 --reviewers 4 --changed 1000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(db, models, pairs, reviewers):
+    """Bulk insert a dataset where every reviewer scores every pair"""
+    User, Dataset, QuestionAnswerPair, Feedback = models
+    users = [User(username=f'reviewer{i}', password='bench') for i in range(reviewers)]
+    db.session.add_all(users)
+    dataset = Dataset(name='bench')
+    db.session.add(dataset)
+    db.session.flush()
+
+    db.session.execute(db.insert(QuestionAnswerPair), [{
+        'dataset_id': dataset.id,
+        'question_text': f'question {i}',
+        'system_answer_text': f'answer {i}'
+    } for i in range(pairs)])
+    qa_ids = [row[0] for row in db.session.query(QuestionAnswerPair.id).filter_by(dataset_id=dataset.id)]
+
+    # Reviewers lean differently so there is some bias to find; the ratings are a day old so
+    # the incremental request only rereads what changed
+    now = datetime.utcnow() - timedelta(days=1)
+    for start in range(0, len(qa_ids), 10000):
+        db.session.execute(db.insert(Feedback), [{
+            'qa_pair_id': qa_id,
+            'user_id': user.id,
+            'accuracy_score': min(5, max(1, round(random.gauss(3.5 + offset * 0.3, 1)))),
+            'completeness_score': random.randint(1, 5),
+            'clarity_score': random.randint(1, 5),
+            'clinical_relevance_score': random.choice([None, 3, 4, 5]),
+            'submitted_at': now,
+            'updated_at': now
+        } for qa_id in qa_ids[start:start + 10000] for offset, user in enumerate(users)])
+    db.session.commit()
+    return dataset.id, qa_ids, [user.id for user in users]
+
+
+def timed(func, runs=1):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=250000)
+    parser.add_argument('--reviewers', type=int, default=4)
+    parser.add_argument('--changed', type=int, default=1000, help='Feedback rows changed before the incremental request')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+
+    from app import app
+    from models import db, upgrade_schema, User, Dataset, QuestionAnswerPair, Feedback
+    from analytics import get_score_stats
+
+    random.seed(0)
+    with app.app_context():
+        upgrade_schema()
+        start = time.perf_counter()
+        dataset_id, qa_ids, user_ids = seed(db, (User, Dataset, QuestionAnswerPair, Feedback), args.pairs, args.reviewers)
+        ratings = args.pairs * args.reviewers
+        print(f'seeded {ratings} ratings in {time.perf_counter() - start:.1f} s')
+
+        full_ms, result = timed(lambda: get_score_stats(dataset_id))
+        assert result['cache'] == 'full'
+        hit_ms, result = timed(lambda: get_score_stats(dataset_id), args.runs)
+        assert result['cache'] == 'hit'
+
+        # Change a batch of scores the way the feedback endpoints do (bumping updated_at)
+        feedback = Feedback.__table__
+        changed = random.sample(qa_ids, min(args.changed, len(qa_ids)))
+        db.session.execute(feedback.update().where(feedback.c.qa_pair_id.in_(changed), feedback.c.user_id == user_ids[0]).
+                           values(accuracy_score=1, updated_at=datetime.utcnow()))
+        db.session.commit()
+        incremental_ms, result = timed(lambda: get_score_stats(dataset_id))
+        assert result['cache'] == 'incremental', result['cache']
+
+        print(f'{"full computation":<28}{full_ms:>10.1f} ms')
+        print(f'{"cached":<28}{hit_ms:>10.1f} ms')
+        print(f'{f"incremental ({len(changed)} changed)":<28}{incremental_ms:>10.1f} ms')
+        accuracy = result['dimensions']['accuracy']
+        print(f'accuracy mean {accuracy["mean"]} (95% CI {accuracy["ci95"]}), '
+              f'reviewer bias {[reviewer["dimensions"]["accuracy"]["bias"] for reviewer in result["reviewers"]]}')
+
+
+if __name__ == '__main__':
+    main()
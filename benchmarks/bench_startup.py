@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Startup cost of the app, checked against a budget: the cumulative import time
+of `app` reported by `python -X importtime`, and the wall time from launching
+a fresh interpreter to the first served request. Importing the app must not
+touch the database either. Exits with status 1 when a budget is exceeded or
+the import created the database, so it can gate CI.
+
+    python benchmarks/bench_startup.py --import-budget-ms 1500 --first-request-budget-ms 3000
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST = '''
+from app import create_app
+app = create_app({'TESTING': True})
+response = app.test_client().get('/login')
+assert response.status_code == 200, response.status_code
+'''
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times(env):
+    """{module: cumulative microseconds} for one `import app`"""
+    result = run_python(['-X', 'importtime', '-c', 'import app'], env)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Keep the outermost entry for modules imported more than once
+        times.setdefault(name.strip(), int(cumulative))
+    return times
+
+
+def first_request_seconds(env):
+    start = time.perf_counter()
+    run_python(['-c', FIRST_REQUEST], env)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--import-budget-ms', type=float, default=1500)
+    parser.add_argument('--first-request-budget-ms', type=float, default=3000)
+    parser.add_argument('--top', type=int, default=10, help='Slowest imported modules to list')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    database = os.path.join(workdir, 'bench.db')
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}')
+    failures = []
+
+    # Warm the bytecode cache so every run measures the same thing
+    run_python(['-c', 'import app'], env)
+    if os.path.exists(database):
+        failures.append('importing the app created the database')
+
+    runs = [import_times(env) for _ in range(args.runs)]
+    import_ms = statistics.median(times['app'] for times in runs) / 1000
+    print(f'import app (median of {args.runs}): {import_ms:.0f} ms (budget {args.import_budget_ms:.0f} ms)')
+    slowest = sorted(runs[-1].items(), key=lambda item: -item[1])
+    listed = [(name, micros) for name, micros in slowest if name != 'app'][:args.top]
+    for name, micros in listed:
+        print(f'  {name:<40}{micros / 1000:>10.1f} ms')
+    if import_ms > args.import_budget_ms:
+        failures.append(f'import took {import_ms:.0f} ms')
+
+    run_python(['-m', 'flask', '--app', 'app', 'init-db'], env)
+    first_request_ms = statistics.median(first_request_seconds(env) for _ in range(args.runs)) * 1000
+    print(f'time to first request (median of {args.runs}): {first_request_ms:.0f} ms '
+          f'(budget {args.first_request_budget_ms:.0f} ms)')
+    if first_request_ms > args.first_request_budget_ms:
+        failures.append(f'first request took {first_request_ms:.0f} ms')
+
+    if failures:
+        print('FAILED: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
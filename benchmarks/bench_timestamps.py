@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare the format-inferring timestamp parser used during ingestion against
+the previous per-row python-dateutil parse, for a few common formats.
+
+    python benchmarks/bench_timestamps.py --rows 200000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FORMATS = {
+    'iso8601': lambda value: value.isoformat(),
+    'iso8601 with offset': lambda value: value.isoformat() + '+02:00',
+    'us': lambda value: value.strftime('%m/%d/%Y %H:%M'),
+    'rfc2822': lambda value: value.strftime('%a, %d %b %Y %H:%M:%S +0000'),
+}
+
+
+def previous_parse(values):
+    """The per-row parse ingestion used before format inference"""
+    from dateutil import parser
+
+    parsed = []
+    for value in values:
+        try:
+            parsed.append(parser.parse(value))
+        except Exception:
+            parsed.append(datetime.utcnow())
+    return parsed
+
+
+def timed(func, values):
+    start = time.perf_counter()
+    func(values)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='timestamps per format')
+    parser.add_argument('--bad-fraction', type=float, default=0.001,
+                        help='fraction of values that do not match the format')
+    args = parser.parse_args()
+
+    from timestamps import parse_timestamps
+
+    base = datetime(2023, 1, 1)
+    moments = [base + timedelta(seconds=random.randint(0, 365 * 86400)) for _ in range(args.rows)]
+
+    print(f'{"format":<22}{"dateutil":>12}{"inferred":>12}{"speedup":>10}  fallbacks / unparsable')
+    for name, render in FORMATS.items():
+        values = [render(moment) for moment in moments]
+        for index in random.sample(range(args.rows), int(args.rows * args.bad_fraction)):
+            values[index] = random.choice(['not a date', '2023-13-45', moments[index].strftime('%d %B %Y')])
+
+        before = timed(previous_parse, values)
+        start = time.perf_counter()
+        _, report = parse_timestamps(values)
+        after = time.perf_counter() - start
+        print(f'{name:<22}{before:>11.3f}s{after:>11.3f}s{before / after:>9.1f}x  '
+              f'{report["generic_fallbacks"]} / {report["unparsable_timestamps"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+Incremental change feed of Q&A pairs and feedback for the ML pipeline.
+
+Records are returned in (updated_at, id) order per entity type and streamed
+as NDJSON. The cursor is an opaque token holding the last (updated_at, id)
+position for each entity type, so a client can resume from any checkpoint
+line after an interrupted download.
+
+updated_at is stamped when a row is flushed, not when its transaction
+commits, so a row can become visible after rows with later stamps. Reads
+stop at a horizon CHANGEFEED_SETTLE_SECONDS (default 5) in the past; on
+PostgreSQL the horizon is also held back to the start of the oldest open
+write transaction, so long bulk writes (dataset uploads, revision uploads,
+rehydration) are never skipped. On SQLite nothing can see another
+connection's open transaction: the window must be longer than any write
+transaction, so raise it when bulk writes take longer. Incremental
+snapshots (backup.py) and the score-distribution cache (analytics.py) use
+the same horizon.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, select, text
+
+from models import db, Feedback, QuestionAnswerPair, User
+
+BATCH_SIZE = 1000
+DEFAULT_LIMIT = 10000
+MAX_LIMIT = 100000
+
+# Default for CHANGEFEED_SETTLE_SECONDS
+DEFAULT_SETTLE_SECONDS = 5
+
+ENTITY_KEYS = ('qa_pair', 'feedback')
+
+
+class CursorError(ValueError):
+    """Raised when a cursor or watermark cannot be parsed"""
+
+
+def settle_seconds():
+    return float(current_app.config.get('CHANGEFEED_SETTLE_SECONDS', DEFAULT_SETTLE_SECONDS))
+
+
+def _oldest_write_transaction(engine):
+    """UTC start of the oldest other transaction that has written, or None (PostgreSQL only)"""
+    if engine.dialect.name != 'postgresql':
+        return None
+    with engine.connect() as connection:
+        return connection.execute(text(
+            "SELECT (min(xact_start) AT TIME ZONE 'UTC') FROM pg_stat_activity "
+            "WHERE datname = current_database() AND backend_xid IS NOT NULL AND pid <> pg_backend_pid()"
+        )).scalar()
+
+
+def settled_horizon(engine):
+    """Newest updated_at that readers may advance past: every row stamped up to it has committed"""
+    settle = timedelta(seconds=settle_seconds())
+    horizon = datetime.utcnow() - settle
+    oldest = _oldest_write_transaction(engine)
+    if oldest is not None:
+        # The settle window also absorbs clock skew between the app and the database
+        horizon = min(horizon, oldest - settle)
+    return horizon
+
+
+def encode_cursor(positions):
+    """Encode {entity: (updated_at, id)} as an opaque URL-safe token"""
+    payload = {
+        entity: [position[0].isoformat(), position[1]] if position else None
+        for entity, position in positions.items()
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    """Decode a cursor token back into {entity: (updated_at, id)}"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return {
+            entity: (datetime.fromisoformat(payload[entity][0]), int(payload[entity][1])) if payload.get(entity) else None
+            for entity in ENTITY_KEYS
+        }
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+        raise CursorError('Invalid cursor')
+
+
+def cursor_from_watermark(since):
+    """Start positions for every entity from an ISO timestamp watermark"""
+    try:
+        watermark = datetime.fromisoformat(since)
+    except ValueError:
+        raise CursorError('Invalid since timestamp; use ISO 8601')
+    # Id 0 includes every row stamped exactly at the watermark
+    return {entity: (watermark, 0) for entity in ENTITY_KEYS}
+
+
+def _after(model, position):
+    if position is None:
+        return None
+    updated_at, last_id = position
+    return or_(model.updated_at > updated_at,
+               and_(model.updated_at == updated_at, model.id > last_id))
+
+
+def _qa_pair_query(position, dataset_ids, horizon):
+    query = select(
+        QuestionAnswerPair.id,
+        QuestionAnswerPair.dataset_id,
+        QuestionAnswerPair.original_qa_id,
+        QuestionAnswerPair.question_text,
+        QuestionAnswerPair.system_answer_text,
+        QuestionAnswerPair.created_at,
+        QuestionAnswerPair.updated_at
+    ).where(QuestionAnswerPair.updated_at <= horizon)
+    if position is not None:
+        query = query.where(_after(QuestionAnswerPair, position))
+    if dataset_ids is not None:
+        query = query.where(QuestionAnswerPair.dataset_id.in_(dataset_ids))
+    return query.order_by(QuestionAnswerPair.updated_at, QuestionAnswerPair.id)
+
+
+def _feedback_query(position, dataset_ids, user_ids, horizon):
+    query = select(
+        Feedback.id,
+        Feedback.qa_pair_id,
+        QuestionAnswerPair.dataset_id,
+        Feedback.user_id,
+        User.username,
+        Feedback.text_feedback,
+        Feedback.accuracy_score,
+        Feedback.completeness_score,
+        Feedback.clarity_score,
+        Feedback.clinical_relevance_score,
+        Feedback.gold_standard_answer,
+        Feedback.submitted_at,
+        Feedback.updated_at
+    ).join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).\
+        outerjoin(User, Feedback.user_id == User.id).\
+        where(Feedback.updated_at <= horizon)
+    if position is not None:
+        query = query.where(_after(Feedback, position))
+    if dataset_ids is not None:
+        query = query.where(QuestionAnswerPair.dataset_id.in_(dataset_ids))
+    if user_ids is not None:
+        query = query.where(Feedback.user_id.in_(user_ids))
+    return query.order_by(Feedback.updated_at, Feedback.id)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _qa_pair_record(row):
+    return {
+        'type': 'qa_pair',
+        'id': row.id,
+        'dataset_id': row.dataset_id,
+        'original_qa_id': row.original_qa_id,
+        'question': row.question_text,
+        'system_answer': row.system_answer_text,
+        'created_at': _isoformat(row.created_at),
+        'updated_at': _isoformat(row.updated_at)
+    }
+
+
+def _feedback_record(row):
+    return {
+        'type': 'feedback',
+        'id': row.id,
+        'qa_pair_id': row.qa_pair_id,
+        'dataset_id': row.dataset_id,
+        'user_id': row.user_id,
+        'username': row.username,
+        'text_feedback': row.text_feedback,
+        'accuracy_score': row.accuracy_score,
+        'completeness_score': row.completeness_score,
+        'clarity_score': row.clarity_score,
+        'clinical_relevance_score': row.clinical_relevance_score,
+        'gold_standard_answer': row.gold_standard_answer,
+        'submitted_at': _isoformat(row.submitted_at),
+        'updated_at': _isoformat(row.updated_at)
+    }
+
+
+def _line(record):
+    return json.dumps(record) + '\n'
+
+
+def stream_changes(positions, dataset_ids=None, user_ids=None, limit=DEFAULT_LIMIT):
+    """Yield NDJSON lines for changes after the given positions"""
+    positions = dict(positions)
+    horizon = settled_horizon(db.engine)
+    remaining = limit
+    has_more = False
+
+    sources = [
+        ('qa_pair', _qa_pair_query(positions['qa_pair'], dataset_ids, horizon), _qa_pair_record),
+        ('feedback', _feedback_query(positions['feedback'], dataset_ids, user_ids, horizon), _feedback_record),
+    ]
+    for entity, query, to_record in sources:
+        if remaining <= 0:
+            has_more = True
+            break
+
+        result = db.session.execute(query.limit(remaining + 1), execution_options={'yield_per': BATCH_SIZE})
+        for partition in result.partitions(BATCH_SIZE):
+            lines = []
+            for row in partition:
+                if remaining <= 0:
+                    has_more = True
+                    break
+                lines.append(_line(to_record(row)))
+                positions[entity] = (row.updated_at, row.id)
+                remaining -= 1
+            if lines:
+                # Checkpoint after every batch so an interrupted stream can resume here
+                lines.append(_line({'type': 'checkpoint', 'cursor': encode_cursor(positions)}))
+                yield ''.join(lines)
+            if has_more:
+                break
+        result.close()
+
+    yield _line({
+        'type': 'end',
+        'cursor': encode_cursor(positions),
+        'has_more': has_more,
+        'horizon': horizon.isoformat()
+    })
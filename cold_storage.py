@@ -0,0 +1,491 @@
+"""
+Cold storage for finished datasets.
+
+Archiving moves a dataset's Q&A pairs, feedback and answer history out of
+the live tables into zstd-compressed Parquet files, one per table, in a
+directory under ARCHIVE_DIR (default instance/archives). A JSON manifest
+with row counts and checksums is written last; the directory only gets its
+final name once the manifest is complete. The Dataset row stays behind as a
+stub: it keeps its name, access grants and revision, and `archive_summary`
+holds the counts and score means the admin and datasets pages show.
+Downloads of an archived dataset are read straight from its files.
+
+The files are written while the app keeps running. Before the rows are
+deleted the dataset's fingerprint (row counts, newest ids and update times)
+is taken again, and the archive is abandoned if anything changed meanwhile.
+
+Rehydrating inserts the rows back in bulk batches and removes the archive.
+Rows keep their ids, except where SQLite handed an id out again after the
+rows were archived; those rows get new ids and feedback follows its pair.
+Pairs and feedback are stamped with a new `updated_at` so the change feed
+delivers them again, and `Dataset.rehydrated_at` makes the next incremental
+snapshot a full one (see backup.py).
+Feedback of users deleted in the meantime is dropped, as deleting a user
+does for live feedback. Similarity metrics and review leases are not
+archived; run `flask --app app rebuild-stats` after rehydrating to
+recompute the metrics.
+
+pyarrow is only imported when an archive is written or read.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, select
+
+from exports import SCORE_COLUMNS
+from live import publish
+from models import db, AnswerRevision, Dataset, Feedback, FeedbackMetric, QuestionAnswerPair, ReviewAssignment, User
+from read_models import dataset_has_original_ids, group_qa_feedback
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 5000
+READ_BLOCK_SIZE = 1024 * 1024
+MANIFEST = 'manifest.json'
+
+# Columns read when serving downloads, in the order of read_models.qa_feedback_query()
+PAIR_COLUMNS = ['id', 'original_qa_id', 'question_text', 'system_answer_text', 'created_at']
+FEEDBACK_COLUMNS = ['qa_pair_id', 'id', 'user_id', 'submitted_at', 'text_feedback'] + SCORE_COLUMNS + \
+    ['gold_standard_answer']
+
+
+class ColdStorageError(Exception):
+    """Raised when a dataset cannot be archived, read from its archive or rehydrated"""
+
+
+def archive_root(app):
+    """Directory holding dataset archives"""
+    root = app.config.get('ARCHIVE_DIR') or os.path.join(app.instance_path, 'archives')
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+class _DatasetLock:
+    """Allows one archive or rehydration of a dataset at a time, across worker processes"""
+
+    def __init__(self, root, dataset_id):
+        self.path = os.path.join(root, f'dataset-{dataset_id}.lock')
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'w')
+        try:
+            import fcntl
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError:
+            pass  # No cross-process locking on this platform
+        except OSError:
+            self._file.close()
+            raise ColdStorageError('The dataset is already being archived or rehydrated')
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ColdStorageError('Cold storage requires the "pyarrow" package to be installed')
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _arrow_schema(table):
+    """Arrow schema with one column per table column"""
+    import pyarrow as pa
+
+    types = {int: pa.int64(), float: pa.float64(), datetime: pa.timestamp('us')}
+    return pa.schema([(column.name, types.get(column.type.python_type, pa.string())) for column in table.columns])
+
+
+def _archive_queries(dataset_id):
+    """(file name, table, query) for each archived table, sorted the way downloads read them"""
+    pair_ids = select(QuestionAnswerPair.id).where(QuestionAnswerPair.dataset_id == dataset_id)
+    pairs = QuestionAnswerPair.__table__
+    feedback = Feedback.__table__
+    revisions = AnswerRevision.__table__
+    return [
+        ('pairs', pairs, select(pairs).where(pairs.c.dataset_id == dataset_id).order_by(pairs.c.id)),
+        ('feedback', feedback, select(feedback).where(feedback.c.qa_pair_id.in_(pair_ids)).
+         order_by(feedback.c.qa_pair_id, feedback.c.id)),
+        ('answer_revisions', revisions, select(revisions).where(revisions.c.qa_pair_id.in_(pair_ids)).
+         order_by(revisions.c.qa_pair_id, revisions.c.revision)),
+    ]
+
+
+def _write_table(table, query, path):
+    """Stream a query into a Parquet file batch by batch; returns the number of rows"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(table)
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        result = db.session.execute(query, execution_options={'yield_per': BATCH_SIZE})
+        for partition in result.partitions(BATCH_SIZE):
+            columns = list(zip(*partition))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            rows += len(partition)
+        if not rows:
+            writer.write_table(schema.empty_table())
+    return rows
+
+
+def _fingerprint(dataset_id):
+    """Changes whenever a pair or feedback row of the dataset is added, updated or deleted"""
+    pair_ids = select(QuestionAnswerPair.id).where(QuestionAnswerPair.dataset_id == dataset_id)
+    pairs = db.session.execute(
+        select(func.count(), func.max(QuestionAnswerPair.id), func.max(QuestionAnswerPair.updated_at)).
+        where(QuestionAnswerPair.dataset_id == dataset_id)
+    ).one()
+    feedback = db.session.execute(
+        select(func.count(), func.max(Feedback.id), func.max(Feedback.updated_at)).
+        where(Feedback.qa_pair_id.in_(pair_ids))
+    ).one()
+    return tuple(pairs) + tuple(feedback)
+
+
+def _summary(dataset_id):
+    """Counts and score means kept on the stub Dataset row"""
+    pair_ids = select(QuestionAnswerPair.id).where(QuestionAnswerPair.dataset_id == dataset_id)
+    in_dataset = Feedback.qa_pair_id.in_(pair_ids)
+    has_gold = (Feedback.gold_standard_answer.isnot(None)) & (Feedback.gold_standard_answer != '')
+
+    feedback = db.session.execute(select(
+        func.count(Feedback.id),
+        func.count(func.distinct(case((has_gold, Feedback.qa_pair_id)))),
+        func.min(Feedback.submitted_at),
+        func.max(Feedback.submitted_at),
+        *[func.avg(getattr(Feedback, column)) for column in SCORE_COLUMNS]
+    ).where(in_dataset)).one()
+    # Per reviewer: feedback rows and pairs with a gold standard, as on the datasets page
+    reviewers = db.session.execute(select(
+        Feedback.user_id,
+        func.count(Feedback.id),
+        func.count(func.distinct(case((has_gold, Feedback.qa_pair_id))))
+    ).where(in_dataset, Feedback.user_id.isnot(None)).group_by(Feedback.user_id)).all()
+
+    return {
+        'qa_count': db.session.execute(select(func.count()).select_from(pair_ids.subquery())).scalar(),
+        'feedback_count': feedback[0],
+        'gold_standard_count': feedback[1],
+        'reviewer_count': len(reviewers),
+        'first_feedback_at': feedback[2].isoformat() if feedback[2] else None,
+        'last_feedback_at': feedback[3].isoformat() if feedback[3] else None,
+        'score_means': {column: round(float(mean), 3) if mean is not None else None
+                        for column, mean in zip(SCORE_COLUMNS, feedback[4:])},
+        'has_original_ids': dataset_has_original_ids(dataset_id),
+        'reviewers': {str(user_id): {'feedback': count, 'gold': gold} for user_id, count, gold in reviewers}
+    }
+
+
+def delete_dataset_rows(dataset_id):
+    """Delete a dataset's pairs and everything that references them, in foreign key order"""
+    pair_ids = select(QuestionAnswerPair.id).where(QuestionAnswerPair.dataset_id == dataset_id)
+    FeedbackMetric.query.filter(FeedbackMetric.qa_pair_id.in_(pair_ids)).delete(synchronize_session=False)
+    ReviewAssignment.query.filter_by(dataset_id=dataset_id).delete(synchronize_session=False)
+    AnswerRevision.query.filter(AnswerRevision.qa_pair_id.in_(pair_ids)).delete(synchronize_session=False)
+    Feedback.query.filter(Feedback.qa_pair_id.in_(pair_ids)).delete(synchronize_session=False)
+    QuestionAnswerPair.query.filter_by(dataset_id=dataset_id).delete(synchronize_session=False)
+
+
+def archive_summary(dataset):
+    """The stub's summary stats, or None for a live dataset"""
+    return json.loads(dataset.archive_summary) if dataset.archive_summary else None
+
+
+def idle_dataset_ids(days):
+    """Live datasets with pairs whose pairs and feedback have not changed for `days` days"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    last_change = dict(db.session.execute(
+        select(QuestionAnswerPair.dataset_id, func.max(QuestionAnswerPair.updated_at)).
+        group_by(QuestionAnswerPair.dataset_id)
+    ).all())
+    last_feedback = db.session.execute(
+        select(QuestionAnswerPair.dataset_id, func.max(Feedback.updated_at)).
+        join(Feedback, Feedback.qa_pair_id == QuestionAnswerPair.id).group_by(QuestionAnswerPair.dataset_id)
+    )
+    for dataset_id, updated_at in last_feedback:
+        if updated_at is not None and (last_change[dataset_id] is None or updated_at > last_change[dataset_id]):
+            last_change[dataset_id] = updated_at
+    return sorted(dataset_id for dataset_id, updated_at in last_change.items()
+                  if updated_at is not None and updated_at < cutoff)
+
+
+def archive_dataset(root, dataset_id):
+    """Move a dataset's pairs, feedback and answer history to cold storage; returns the stub's summary"""
+    _require_pyarrow()
+    started = time.perf_counter()
+    with _DatasetLock(root, dataset_id):
+        dataset = db.session.get(Dataset, dataset_id)
+        if dataset is None:
+            raise ColdStorageError(f'Unknown dataset {dataset_id}')
+        if dataset.is_archived():
+            raise ColdStorageError(f'Dataset "{dataset.name}" is already archived')
+
+        name = f'dataset-{dataset_id}-{datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")}'
+        directory = os.path.join(root, name)
+        staging = directory + '.tmp'
+        os.makedirs(staging)
+        try:
+            fingerprint = _fingerprint(dataset_id)
+            files = {}
+            for key, table, query in _archive_queries(dataset_id):
+                path = os.path.join(staging, f'{key}.parquet')
+                rows = _write_table(table, query, path)
+                files[key] = {'file': f'{key}.parquet', 'rows': rows, 'size': os.path.getsize(path),
+                              'sha256': _sha256(path)}
+            # Don't hold the read snapshot (or a SQLite read lock) any longer than the copy
+            db.session.rollback()
+
+            # Claiming the stub starts the write transaction, then nothing may have changed since the copy
+            dataset = db.session.get(Dataset, dataset_id)
+            dataset.archived_at = datetime.utcnow()
+            db.session.flush()
+            if _fingerprint(dataset_id) != fingerprint:
+                raise ColdStorageError(f'Dataset "{dataset.name}" changed while it was being archived; try again')
+
+            summary = dict(_summary(dataset_id), bytes=sum(entry['size'] for entry in files.values()))
+            manifest = {
+                'format': FORMAT_VERSION,
+                'dataset_id': dataset_id,
+                'dataset_name': dataset.name,
+                'revision': dataset.revision,
+                'created_at': dataset.archived_at.isoformat(),
+                'files': files,
+                'user_ids': sorted(int(user_id) for user_id in summary['reviewers']),
+                'summary': summary
+            }
+            with open(os.path.join(staging, MANIFEST), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(staging, directory)
+
+            delete_dataset_rows(dataset_id)
+            dataset.archive_path = name
+            dataset.archive_summary = json.dumps(summary)
+            publish('dataset_archived', dataset_id=dataset_id)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            shutil.rmtree(staging, ignore_errors=True)
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+
+    return dict(summary, dataset_id=dataset_id, archive=name, seconds=round(time.perf_counter() - started, 3))
+
+
+def _archive_directory(root, dataset):
+    if not dataset.is_archived():
+        raise ColdStorageError(f'Dataset "{dataset.name}" is not archived')
+    return os.path.join(root, dataset.archive_path)
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        raise ColdStorageError(f'Archive {os.path.basename(directory)} is missing or incomplete')
+    with open(path) as f:
+        return json.load(f)
+
+
+def verify_archive(directory):
+    """Check every file of an archive against its manifest; returns the manifest"""
+    manifest = load_manifest(directory)
+    for entry in manifest['files'].values():
+        path = os.path.join(directory, entry['file'])
+        if not os.path.exists(path):
+            raise ColdStorageError(f'{entry["file"]} is missing from archive {os.path.basename(directory)}')
+        if _sha256(path) != entry['sha256']:
+            raise ColdStorageError(f'{entry["file"]} in archive {os.path.basename(directory)} does not match its checksum')
+    return manifest
+
+
+def list_archives(root):
+    """Archived datasets with their summaries, and archive directories no dataset refers to"""
+    datasets = Dataset.query.filter(Dataset.archived_at.isnot(None)).order_by(Dataset.id).all()
+    referenced = {dataset.archive_path for dataset in datasets}
+    return {
+        'datasets': [{
+            'dataset_id': dataset.id,
+            'name': dataset.name,
+            'archived_at': dataset.archived_at.isoformat(),
+            'archive': dataset.archive_path,
+            'summary': archive_summary(dataset)
+        } for dataset in datasets],
+        # Left behind when a process died between writing an archive and committing it
+        'orphans': sorted(name for name in os.listdir(root)
+                          if os.path.isdir(os.path.join(root, name)) and name not in referenced)
+    }
+
+
+def _iter_records(path, columns, batch_size=BATCH_SIZE):
+    """Yield rows of a Parquet file as tuples of the given columns"""
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+        data = batch.to_pydict()
+        yield from zip(*(data[column] for column in columns))
+
+
+def iter_archived_rows(root, dataset_id, selected_user_ids=None, batch_size=BATCH_SIZE):
+    """Yield partitions of rows shaped like read_models.qa_feedback_query() from a dataset's archive
+
+    Pairs and feedback are both sorted by pair id, so they are merged in one
+    pass. Pairs without (selected) feedback appear once with empty feedback
+    columns, as in the outer join.
+    """
+    _require_pyarrow()
+    directory = _archive_directory(root, db.session.get(Dataset, dataset_id))
+    manifest = load_manifest(directory)
+    # Usernames as of now; feedback of deleted users is skipped like their live feedback was deleted
+    usernames = dict(db.session.execute(select(User.id, User.username).where(User.id.in_(manifest['user_ids']))).all())
+    selected = None if selected_user_ids is None else set(selected_user_ids)
+    empty = (None,) * (len(FEEDBACK_COLUMNS) + 1)
+
+    feedback = _iter_records(os.path.join(directory, manifest['files']['feedback']['file']), FEEDBACK_COLUMNS)
+    pending = next(feedback, None)
+    partition = []
+    for pair in _iter_records(os.path.join(directory, manifest['files']['pairs']['file']), PAIR_COLUMNS):
+        matched = False
+        while pending is not None and pending[0] <= pair[0]:
+            user_id = pending[2]
+            if pending[0] == pair[0] and (user_id is None or user_id in usernames) and \
+                    (selected is None or user_id in selected):
+                partition.append(pair + pending[1:3] + (usernames.get(user_id),) + pending[3:])
+                matched = True
+            pending = next(feedback, None)
+        if not matched:
+            partition.append(pair + empty)
+        if len(partition) >= batch_size:
+            yield partition
+            partition = []
+    if partition:
+        yield partition
+
+
+def iter_archived_qa_with_feedback(root):
+    """Yield (QARecord, [FeedbackRecord, ...]) for every archived dataset, like read_models.iter_qa_with_feedback()"""
+    dataset_ids = db.session.execute(
+        select(Dataset.id).where(Dataset.archived_at.isnot(None)).order_by(Dataset.id)
+    ).scalars().all()
+    for dataset_id in dataset_ids:
+        yield from group_qa_feedback(itertools.chain.from_iterable(iter_archived_rows(root, dataset_id)))
+
+
+def _restore_table(path, table, transform=None):
+    """Insert an archived table in batches; returns (rows inserted, {archived id: new id})
+
+    Rows keep their ids unless another row took the id since the archive was
+    written; those are inserted without one and get a new id.
+    """
+    import pyarrow.parquet as pq
+
+    rows = 0
+    remapped = {}
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=BATCH_SIZE):
+        records = batch.to_pylist()
+        if transform is not None:
+            records = [record for record in map(transform, records) if record is not None]
+        if not records:
+            continue
+        taken = set(db.session.execute(
+            select(table.c.id).where(table.c.id.in_([record['id'] for record in records]))
+        ).scalars())
+        kept = [record for record in records if record['id'] not in taken]
+        if kept:
+            db.session.execute(table.insert(), kept)
+        moved = [record for record in records if record['id'] in taken]
+        if moved:
+            new_ids = db.session.execute(
+                table.insert().returning(table.c.id, sort_by_parameter_order=True),
+                [{key: value for key, value in record.items() if key != 'id'} for record in moved]
+            ).scalars().all()
+            remapped.update(zip((record['id'] for record in moved), new_ids))
+        rows += len(records)
+    return rows, remapped
+
+
+def rehydrate_dataset(root, dataset_id):
+    """Move an archived dataset back into the live tables in bulk; returns row counts"""
+    _require_pyarrow()
+    started = time.perf_counter()
+    with _DatasetLock(root, dataset_id):
+        dataset = db.session.get(Dataset, dataset_id)
+        if dataset is None:
+            raise ColdStorageError(f'Unknown dataset {dataset_id}')
+        directory = _archive_directory(root, dataset)
+        manifest = verify_archive(directory)
+        if manifest['dataset_id'] != dataset_id:
+            raise ColdStorageError(f'Archive {dataset.archive_path} belongs to dataset {manifest["dataset_id"]}')
+
+        def path(key):
+            return os.path.join(directory, manifest['files'][key]['file'])
+
+        now = datetime.utcnow()
+
+        def touch(record):
+            record['updated_at'] = now
+            return record
+
+        try:
+            pairs, pair_ids = _restore_table(path('pairs'), QuestionAnswerPair.__table__, touch)
+
+            users = set(db.session.execute(select(User.id).where(User.id.in_(manifest['user_ids']))).scalars())
+            dropped = 0
+
+            def follow_pair(record):
+                nonlocal dropped
+                if record.get('user_id') is not None and record['user_id'] not in users:
+                    dropped += 1
+                    return None
+                record['qa_pair_id'] = pair_ids.get(record['qa_pair_id'], record['qa_pair_id'])
+                return record
+
+            feedback, feedback_ids = _restore_table(path('feedback'), Feedback.__table__,
+                                                    lambda record: follow_pair(touch(record)))
+            revisions, _ = _restore_table(path('answer_revisions'), AnswerRevision.__table__, follow_pair)
+
+            dataset.archived_at = None
+            dataset.archive_path = None
+            dataset.archive_summary = None
+            dataset.rehydrated_at = now
+            publish('dataset_rehydrated', dataset_id=dataset_id)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            raise
+
+        # The rows are live again, so the archive is no longer needed
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'dataset_id': dataset_id,
+        'pairs': pairs,
+        'feedback': feedback,
+        'answer_revisions': revisions,
+        'dropped_feedback': dropped,
+        'new_pair_ids': len(pair_ids),
+        'new_feedback_ids': len(feedback_ids),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def remove_archive(root, dataset):
+    """Delete an archived dataset's files (when the dataset itself is deleted)"""
+    if dataset.is_archived():
+        shutil.rmtree(os.path.join(root, dataset.archive_path), ignore_errors=True)
@@ -0,0 +1,425 @@
+"""
+Flask CLI commands, run with `flask --app app <command>`.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from werkzeug.utils import secure_filename
+
+from dedup import DUPLICATE_MODES
+from exports import EXPORT_FORMATS, NDJSON_COMPRESSIONS
+from models import db, Dataset, FeedbackMetric, QuestionAnswerPair, User, upgrade_schema
+
+# Connection settings handed to worker processes, which build their own app
+WORKER_CONFIG_KEYS = ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_BINDS', 'ARCHIVE_DIR')
+
+
+def _throughput(count, seconds, unit, digits=0):
+    return f'{count / seconds:,.{digits}f} {unit}/s' if seconds else f'n/a {unit}/s'
+
+
+def _owner(username):
+    if not username:
+        return None
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'Unknown user "{username}"')
+    return user
+
+
+def _echo_ingest_report(report):
+    for result in report['files']:
+        if result['error']:
+            click.echo(f'FAILED  {result["file"]}: {result["error"]}', err=True)
+        else:
+            click.echo(f'OK      {result["file"]} -> "{result["dataset_name"]}" '
+                       f'(id {result["dataset_id"]}, {result["rows"]} rows, parsed in {result["parse_seconds"]}s)')
+    click.echo(json.dumps({key: value for key, value in report.items() if key != 'files'}))
+    if report['failed_files']:
+        raise SystemExit(1)
+
+
+def _run_maintenance(statements):
+    """Run maintenance statements outside a transaction and report the time and file size"""
+    # VACUUM cannot run inside a transaction on SQLite or PostgreSQL
+    engine = db.engines[None]
+    size_before = os.path.getsize(engine.url.database) if engine.dialect.name == 'sqlite' else None
+    started = time.perf_counter()
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for statement in statements(engine.dialect.name):
+            click.echo(f'{statement} ...')
+            connection.exec_driver_sql(statement)
+    message = f'Done in {time.perf_counter() - started:.2f}s'
+    if size_before is not None:
+        message += f'; database file {size_before:,} -> {os.path.getsize(engine.url.database):,} bytes'
+    click.echo(message)
+
+
+def _run_export(job):
+    """Export one dataset to a file and time it"""
+    from cold_storage import archive_summary
+    from exports import write_export
+
+    started = time.perf_counter()
+    dataset = db.session.get(Dataset, job['dataset_id'])
+    if dataset.is_archived():
+        pairs = archive_summary(dataset)['qa_count']
+    else:
+        pairs = QuestionAnswerPair.query.filter_by(dataset_id=job['dataset_id']).count()
+    size = write_export(job['dataset_id'], job['path'], job['format'], job['compression'], **job['options'])
+    return dict(job, pairs=pairs, bytes=size, seconds=time.perf_counter() - started)
+
+
+def _export_worker(job, config):
+    """Export one dataset in a worker process, with an app of its own"""
+    from app import create_app
+
+    with create_app(config).app_context():
+        try:
+            return _run_export(job)
+        except Exception as e:
+            return dict(job, error=str(e))
+
+
+def _move_datasets(move, root, dataset_ids, describe):
+    """Archive or rehydrate datasets one at a time, reporting each and the overall throughput"""
+    from cold_storage import ColdStorageError
+
+    started = time.perf_counter()
+    pairs = failed = 0
+    for dataset_id in dataset_ids:
+        try:
+            result = move(root, dataset_id)
+        except ColdStorageError as e:
+            failed += 1
+            click.echo(f'FAILED  dataset {dataset_id}: {e}', err=True)
+            continue
+        pairs += result['qa_count'] if 'qa_count' in result else result['pairs']
+        click.echo(f'OK      dataset {dataset_id}: {describe(result)} in {result["seconds"]:.2f}s')
+    elapsed = time.perf_counter() - started
+    click.echo(f'{len(dataset_ids) - failed} datasets, {pairs} pairs in {elapsed:.2f}s ({_throughput(pairs, elapsed, "pairs")})')
+    if failed:
+        raise SystemExit(1)
+
+
+def register_commands(app):
+    """Register CLI commands on the app"""
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Create missing tables, columns and indexes"""
+        upgrade_schema()
+        click.echo(f'Schema of {db.engine.url.render_as_string(hide_password=True)} is up to date')
+
+    @app.cli.command('import-zip')
+    @click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--owner', help='Username granted access to the new datasets')
+    @click.option('--prefix', help='Prefix for dataset names (default: member file names)')
+    @click.option('--description', help='Description for every new dataset')
+    @click.option('--workers', type=int, help='Parser processes (default: CPU count)')
+    @click.option('--duplicates', type=click.Choice(DUPLICATE_MODES), default='keep',
+                  help='Rows that duplicate existing pairs: keep, skip, or keep and copy their feedback')
+    def import_zip(archive, owner, prefix, description, workers, duplicates):
+        """Create one dataset per JSON, JSONL or CSV file in a ZIP archive"""
+        from ingestion import IngestionError, ingest_archive
+
+        owner_user = _owner(owner)
+        try:
+            report = ingest_archive(archive, owner_user, prefix, description, workers, duplicates)
+        except IngestionError as e:
+            raise click.ClickException(str(e))
+
+        _echo_ingest_report(report)
+
+    @app.cli.command('import-dataset')
+    @click.argument('files', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+    @click.option('--name', help='Dataset name (single file only; default: the file name without extension)')
+    @click.option('--prefix', help='Prefix for dataset names')
+    @click.option('--description', help='Description for every new dataset')
+    @click.option('--owner', help='Username granted access to the new datasets')
+    @click.option('--workers', type=int, help='Parser processes (default: CPU count)')
+    @click.option('--duplicates', type=click.Choice(DUPLICATE_MODES), default='keep',
+                  help='Rows that duplicate existing pairs: keep, skip, or keep and copy their feedback')
+    def import_dataset(files, name, prefix, description, owner, workers, duplicates):
+        """Create one dataset per JSON, JSONL or CSV file, parsing files in parallel"""
+        from ingestion import ingest_files, member_dataset_name
+
+        if name and len(files) > 1:
+            raise click.ClickException('--name can only be used with a single file')
+        names = {path: name or member_dataset_name(path, prefix) for path in files}
+        if len(set(names.values())) < len(names):
+            raise click.ClickException('Several files would create datasets with the same name; use --prefix or rename them')
+
+        _echo_ingest_report(ingest_files(list(files), _owner(owner), names, description, workers, duplicates))
+
+    @app.cli.command('export-dataset')
+    @click.argument('dataset_ids', nargs=-1, type=int)
+    @click.option('--all', 'all_datasets', is_flag=True, help='Export every dataset')
+    @click.option('--format', 'format_type', type=click.Choice(EXPORT_FORMATS), default='json')
+    @click.option('--compression', type=click.Choice(list(NDJSON_COMPRESSIONS)), default='gzip',
+                  help='NDJSON compression')
+    @click.option('--user-ids', help='Comma-separated reviewer ids whose feedback is exported (default: all)')
+    @click.option('--include-scores', is_flag=True)
+    @click.option('--include-gold-standards', is_flag=True)
+    @click.option('--include-text-feedback', is_flag=True)
+    @click.option('--output', type=click.Path(dir_okay=False), help='Output file (single dataset only)')
+    @click.option('--output-dir', type=click.Path(file_okay=False), default='.',
+                  help='Directory for <dataset name>_feedback.<extension> files')
+    @click.option('--workers', type=int, help='Export processes (default: CPU count)')
+    def export_dataset(dataset_ids, all_datasets, format_type, compression, user_ids, include_scores,
+                       include_gold_standards, include_text_feedback, output, output_dir, workers):
+        """Export datasets to files with the options of the download endpoint, in parallel"""
+        from exports import export_mimetype_and_extension
+
+        if all_datasets:
+            dataset_ids = [dataset_id for (dataset_id,) in db.session.query(Dataset.id).order_by(Dataset.id)]
+        if not dataset_ids:
+            raise click.ClickException('Give dataset ids or --all')
+        if output and len(dataset_ids) > 1:
+            raise click.ClickException('--output can only be used with a single dataset')
+        datasets = dict(db.session.query(Dataset.id, Dataset.name).filter(Dataset.id.in_(dataset_ids)))
+        unknown = [str(dataset_id) for dataset_id in dataset_ids if dataset_id not in datasets]
+        if unknown:
+            raise click.ClickException(f'Unknown dataset ids: {", ".join(unknown)}')
+
+        selected_user_ids = None
+        if user_ids and user_ids != 'all':
+            try:
+                selected_user_ids = [int(uid.strip()) for uid in user_ids.split(',') if uid.strip()]
+            except ValueError:
+                raise click.BadParameter('must be comma-separated integers', param_hint='--user-ids')
+
+        if format_type != 'ndjson':
+            compression = 'none'
+        _, extension = export_mimetype_and_extension(format_type, compression)
+        os.makedirs(output_dir, exist_ok=True)
+        options = dict(selected_user_ids=selected_user_ids, include_gold_standards=include_gold_standards,
+                       include_scores=include_scores, include_text_feedback=include_text_feedback)
+        jobs = [{
+            'dataset_id': dataset_id,
+            'path': output or os.path.join(
+                output_dir, f'{secure_filename(datasets[dataset_id]) or f"dataset_{dataset_id}"}_feedback.{extension}'
+            ),
+            'format': format_type,
+            'compression': compression,
+            'options': options
+        } for dataset_id in dataset_ids]
+
+        started = time.perf_counter()
+        if len(jobs) == 1 or workers == 1:
+            results = []
+            for job in jobs:
+                try:
+                    results.append(_run_export(job))
+                except Exception as e:
+                    results.append(dict(job, error=str(e)))
+        else:
+            config = {key: app.config[key] for key in WORKER_CONFIG_KEYS if key in app.config}
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_export_worker, jobs, [config] * len(jobs)))
+        elapsed = time.perf_counter() - started
+
+        failed = 0
+        for result in results:
+            if result.get('error'):
+                failed += 1
+                click.echo(f'FAILED  dataset {result["dataset_id"]}: {result["error"]}', err=True)
+            else:
+                click.echo(f'OK      dataset {result["dataset_id"]} -> {result["path"]} ({result["pairs"]} pairs, '
+                           f'{result["bytes"]:,} bytes in {result["seconds"]:.2f}s)')
+        pairs = sum(result.get('pairs', 0) for result in results)
+        size = sum(result.get('bytes', 0) for result in results)
+        click.echo(f'{len(results) - failed} datasets, {pairs} pairs, {size:,} bytes in {elapsed:.2f}s '
+                   f'({_throughput(pairs, elapsed, "pairs")}, {_throughput(size / 1024 / 1024, elapsed, "MiB", 1)})')
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.command('rebuild-stats')
+    @click.argument('dataset_ids', nargs=-1, type=int)
+    @click.option('--full', is_flag=True, help='Drop stored metrics and recompute them all')
+    @click.option('--workers', type=int, help='Scoring processes (default: CPU count)')
+    def rebuild_stats(dataset_ids, full, workers):
+        """Recompute similarity metrics for the given datasets (default: all)"""
+        from text_metrics import refresh_dataset_metrics
+
+        if not dataset_ids:
+            dataset_ids = [dataset_id for (dataset_id,) in db.session.query(Dataset.id).order_by(Dataset.id)]
+
+        started = time.perf_counter()
+        recomputed = 0
+        for dataset_id in dataset_ids:
+            dataset_started = time.perf_counter()
+            if full:
+                db.session.query(FeedbackMetric).filter(FeedbackMetric.qa_pair_id.in_(
+                    db.session.query(QuestionAnswerPair.id).filter_by(dataset_id=dataset_id)
+                )).delete(synchronize_session=False)
+                db.session.commit()
+            result = refresh_dataset_metrics(dataset_id, workers=workers)
+            recomputed += result['recomputed']
+            click.echo(f'dataset {dataset_id}: {result["recomputed"]} recomputed, {result["unchanged"]} unchanged '
+                       f'({time.perf_counter() - dataset_started:.2f}s)')
+        elapsed = time.perf_counter() - started
+        click.echo(f'{recomputed} metrics recomputed in {elapsed:.2f}s ({_throughput(recomputed, elapsed, "metrics")})')
+
+    @app.cli.command('snapshot')
+    @click.option('--incremental', is_flag=True, help='Only feedback inserted or updated since the last snapshot')
+    @click.option('--pages', type=int, default=None, help='SQLite pages copied per backup step')
+    def snapshot(incremental, pages):
+        """Take a full or incremental snapshot of the database while the app keeps running"""
+        from backup import DEFAULT_BACKUP_PAGES, BackupError, backup_root, create_snapshot
+
+        options = {} if incremental else {'pages': pages or DEFAULT_BACKUP_PAGES}
+        try:
+            manifest = create_snapshot(backup_root(app), db.engines[None], incremental, **options)
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        rows = f'{manifest["rows"]} feedback rows' if manifest['parent'] else f'{sum(manifest["counts"].values())} rows'
+        click.echo(f'{manifest["id"]}: {manifest["file"]} ({rows}, {manifest["size"]:,} bytes in {manifest["seconds"]}s)')
+        if manifest.get('reason'):
+            click.echo(f'Taken as a full snapshot: {manifest["reason"]}')
+
+    @app.cli.command('list-snapshots')
+    def list_snapshots_command():
+        """List complete snapshots, oldest first"""
+        from backup import backup_root, list_snapshots
+
+        for manifest in list_snapshots(backup_root(app)):
+            detail = f'{manifest["rows"]} feedback rows since {manifest["parent"]}' if manifest['parent'] \
+                else f'{sum(manifest["counts"].values())} rows'
+            click.echo(f'{manifest["id"]}  {manifest["size"]:>14,} bytes  {detail}')
+
+    @app.cli.command('verify-snapshot')
+    @click.argument('snapshot_id')
+    @click.option('--target', help='Scratch database URL to restore into (required to restore PostgreSQL dumps)')
+    def verify_snapshot_command(snapshot_id, target):
+        """Restore a snapshot and its parents into a scratch database and check the result"""
+        from backup import BackupError, backup_root, verify_snapshot
+
+        try:
+            report = verify_snapshot(backup_root(app), snapshot_id, target)
+        except BackupError as e:
+            raise click.ClickException(f'Verification failed: {e}')
+        for check in report['checks']:
+            click.echo(f'OK      {check}')
+        click.echo('Snapshot verified' + ('' if report['restored'] else ' (not restored; pass --target to do so)'))
+
+    @app.cli.command('restore-snapshot')
+    @click.argument('snapshot_id')
+    @click.option('--target', help='Database URL to restore into (default: the app database)')
+    @click.confirmation_option(prompt='This replaces the contents of the target database. Continue?')
+    def restore_snapshot_command(snapshot_id, target):
+        """Restore a full snapshot and the incremental snapshots up to the given one"""
+        from backup import BackupError, backup_root, restore_snapshot
+
+        target = target or db.engines[None].url.render_as_string(hide_password=False)
+        try:
+            steps = restore_snapshot(backup_root(app), snapshot_id, target)
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        for step in steps:
+            if step['kind'] == 'full':
+                click.echo(f'Restored {step["id"]}')
+            else:
+                click.echo(f'Applied {step["id"]}: {step["applied"]} feedback rows, {step["skipped"]} skipped')
+
+    @app.cli.command('archive-dataset')
+    @click.argument('dataset_ids', nargs=-1, type=int)
+    @click.option('--idle-days', type=float, help='Also archive every dataset unchanged for this many days')
+    def archive_dataset_command(dataset_ids, idle_days):
+        """Move datasets' pairs and feedback to compressed cold storage, leaving stub datasets"""
+        from cold_storage import archive_dataset, archive_root, idle_dataset_ids
+
+        if idle_days is not None:
+            dataset_ids = tuple(dataset_ids) + tuple(dataset_id for dataset_id in idle_dataset_ids(idle_days)
+                                                     if dataset_id not in dataset_ids)
+        if not dataset_ids:
+            raise click.ClickException('Give dataset ids or --idle-days (no dataset was idle that long)'
+                                       if idle_days is not None else 'Give dataset ids or --idle-days')
+        _move_datasets(archive_dataset, archive_root(app), dataset_ids, lambda result: (
+            f'{result["qa_count"]} pairs, {result["feedback_count"]} feedback -> {result["archive"]} '
+            f'({result["bytes"]:,} bytes)'
+        ))
+
+    @app.cli.command('rehydrate-dataset')
+    @click.argument('dataset_ids', nargs=-1, type=int)
+    @click.option('--all', 'all_datasets', is_flag=True, help='Rehydrate every archived dataset')
+    def rehydrate_dataset_command(dataset_ids, all_datasets):
+        """Move archived datasets back into the live tables"""
+        from cold_storage import archive_root, rehydrate_dataset
+
+        if all_datasets:
+            dataset_ids = [dataset_id for (dataset_id,) in
+                           db.session.query(Dataset.id).filter(Dataset.archived_at.isnot(None)).order_by(Dataset.id)]
+        if not dataset_ids:
+            raise click.ClickException('Give dataset ids or --all')
+
+        def describe(result):
+            text = f'{result["pairs"]} pairs, {result["feedback"]} feedback, {result["answer_revisions"]} answer revisions'
+            if result['new_pair_ids'] or result['new_feedback_ids']:
+                text += f' ({result["new_pair_ids"]} pairs and {result["new_feedback_ids"]} feedback got new ids)'
+            if result['dropped_feedback']:
+                text += f' ({result["dropped_feedback"]} feedback of deleted users dropped)'
+            return text
+
+        _move_datasets(rehydrate_dataset, archive_root(app), dataset_ids, describe)
+
+    @app.cli.command('list-archives')
+    def list_archives_command():
+        """List archived datasets and their archive sizes"""
+        from cold_storage import archive_root, list_archives
+
+        archives = list_archives(archive_root(app))
+        for entry in archives['datasets']:
+            summary = entry['summary']
+            click.echo(f'{entry["dataset_id"]:>6}  {entry["name"]}  archived {entry["archived_at"][:19]}  '
+                       f'{summary["qa_count"]} pairs, {summary["feedback_count"]} feedback, {summary["bytes"]:>14,} bytes')
+        for name in archives['orphans']:
+            click.echo(f'orphan  {name} (no dataset refers to it)')
+
+    @app.cli.command('vacuum')
+    def vacuum():
+        """Reclaim free space and refresh planner statistics (VACUUM, then ANALYZE)"""
+        _run_maintenance(lambda dialect: ['VACUUM ANALYZE'] if dialect == 'postgresql' else ['VACUUM', 'ANALYZE'])
+
+    @app.cli.command('analyze')
+    def analyze():
+        """Refresh query planner statistics"""
+        _run_maintenance(lambda dialect: ['ANALYZE', 'PRAGMA optimize'] if dialect == 'sqlite' else ['ANALYZE'])
+
+    @app.cli.command('sync-replica')
+    def sync_replica():
+        """Copy the primary SQLite database into the replica file (for local replica testing)"""
+        from replica import REPLICA_BIND
+
+        replica = db.engines.get(REPLICA_BIND)
+        if replica is None:
+            raise click.ClickException('DATABASE_REPLICA_URL is not set')
+        primary = db.engines[None]
+        if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+            raise click.ClickException('Only SQLite replicas can be synced; use PostgreSQL replication otherwise')
+
+        source, target = primary.raw_connection(), replica.raw_connection()
+        try:
+            source.driver_connection.backup(target.driver_connection)
+        finally:
+            source.close()
+            target.close()
+        click.echo(f'Copied {primary.url.database} to {replica.url.database}')
+
+    @app.cli.command('vendor-assets')
+    @click.option('--force', is_flag=True, help='Download files that are already vendored again')
+    def vendor_assets(force):
+        """Download Bootstrap and Font Awesome into static/vendor so pages load without the CDNs"""
+        from assets import download_vendor_assets
+
+        try:
+            written = download_vendor_assets(app.static_folder, force=force)
+        except OSError as e:
+            raise click.ClickException(f'Download failed: {e}')
+        for path in written:
+            click.echo(f'Wrote static/{path}')
+        click.echo(f'{len(written)} files downloaded; restart the app to fingerprint them')
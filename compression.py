@@ -0,0 +1,211 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+gzip is always available; zstd and brotli are offered when the zstandard and
+Brotli packages are installed (imported on first use, not at startup). Buffered responses are compressed in one go
+once they exceed COMPRESS_MIN_SIZE; streamed responses (exports, the change
+feed) and file responses are wrapped in an incremental compressor that
+flushes after every chunk the generator yields, so clients still receive
+data batch by batch.
+
+Compressed bodies of large buffered responses are kept in a small LRU keyed
+by the body's digest and the encoding, so cached responses (for example
+agreement statistics that only change with the data) are compressed once
+rather than on every request.
+"""
+
+import functools
+import hashlib
+import importlib
+import importlib.util
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+# Mimetypes worth compressing; already-compressed exports (gzip/zstd NDJSON,
+# Parquet, Arrow) are left alone
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/csv', 'text/css', 'text/html', 'text/javascript', 'text/plain', 'text/xml'
+}
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+
+# Only bodies at least this large are worth a cache lookup
+CACHE_MIN_SIZE = 64 * 1024
+
+# Levels tuned for dynamic responses: most of the size win for little CPU
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+BROTLI_QUALITY = 5
+
+
+# Optional modules behind each content coding, imported on first use
+CODEC_MODULES = {'zstd': 'zstandard', 'br': 'brotli'}
+
+
+@functools.cache
+def codec_module(encoding):
+    """The module implementing an optional content coding"""
+    return importlib.import_module(CODEC_MODULES[encoding])
+
+
+@functools.cache
+def available_encodings():
+    """Supported content codings in server preference order"""
+    encodings = [
+        encoding for encoding in ('zstd', 'br')
+        if importlib.util.find_spec(CODEC_MODULES[encoding]) is not None
+    ]
+    return tuple(encodings) + ('gzip',)
+
+
+def negotiate_encoding(accept_encoding, encodings=None):
+    """The preferred supported encoding the client accepts, or None for identity"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in encodings or available_encodings():
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(data, encoding):
+    """Compress a complete body"""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    if encoding == 'zstd':
+        return codec_module('zstd').ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == 'br':
+        return codec_module('br').compress(data, quality=BROTLI_QUALITY)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of chunks, flushing after each so data keeps flowing"""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, flush = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+    elif encoding == 'zstd':
+        zstandard = codec_module('zstd')
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        process, flush = compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        finish = compressor.flush
+    elif encoding == 'br':
+        compressor = codec_module('br').Compressor(quality=BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        raise ValueError(f'Unsupported encoding: {encoding}')
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressedBodyCache:
+    """Thread-safe LRU of compressed bodies keyed by (body digest, encoding)"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, data, encoding):
+        key = (hashlib.blake2b(data, digest_size=20).digest(), encoding)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached
+
+        compressed = compress(data, encoding)
+        if len(compressed) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = compressed
+                    self.size += len(compressed)
+                while self.size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return compressed
+
+
+def _should_compress(response, min_size):
+    if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers or 'Content-Range' in response.headers:
+        return False
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return False
+    if 'no-transform' in (response.headers.get('Cache-Control') or ''):
+        return False
+    length = response.content_length
+    return length is None or length >= min_size
+
+
+def init_compression(app):
+    """Compress responses for clients that accept it"""
+    min_size = app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)
+    cache = CompressedBodyCache(app.config.get('COMPRESS_CACHE_BYTES', DEFAULT_CACHE_BYTES))
+    app.extensions['compression_cache'] = cache
+
+    @app.after_request
+    def compress_response(response):
+        response.vary.add('Accept-Encoding')
+        if not _should_compress(response, min_size):
+            return response
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        if response.is_streamed or response.direct_passthrough:
+            chunks = response.response
+            response.direct_passthrough = False
+            response.response = compress_stream(chunks, encoding)
+            # Closing the response must still release the wrapped generator or file
+            if hasattr(chunks, 'close'):
+                response.call_on_close(chunks.close)
+            response.headers.pop('Content-Length', None)
+            response.headers.pop('Accept-Ranges', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            if len(data) >= CACHE_MIN_SIZE:
+                response.set_data(cache.get_or_compress(data, encoding))
+            else:
+                response.set_data(compress(data, encoding))
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # The compressed representation needs its own validator
+            response.set_etag(f'{etag}-{encoding}', weak=weak)
+        return response
@@ -0,0 +1,195 @@
+"""
+Content-hash deduplication of Q&A pairs across uploads.
+
+Every pair stores a SHA-256 of its normalised question and answer text
+(Unicode NFC, whitespace collapsed), indexed, so an upload can find exact
+duplicates of its rows among existing pairs with one indexed IN lookup per
+chunk of hashes. Uploads report what they duplicate and can keep the
+duplicates (default), skip them, or keep them and copy over the feedback
+already given on the matching pair.
+
+Matches are restricted to datasets the uploader can access, so neither the
+summary nor carried-over feedback exposes other datasets. Only feedback on a
+pair's current answer counts and is carried over; feedback that judged an
+answer a revision upload has since replaced is about different text.
+"""
+
+import hashlib
+import unicodedata
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from models import db, Dataset, Feedback, QuestionAnswerPair, user_dataset_access
+
+DUPLICATE_MODES = ('keep', 'skip', 'carry_feedback')
+
+# Hashes per IN lookup and rows per backfill batch
+LOOKUP_CHUNK_SIZE = 500
+BACKFILL_BATCH_SIZE = 5000
+
+MAX_REPORTED_DATASETS = 10
+
+FEEDBACK_COPY_COLUMNS = (
+    'user_id', 'text_feedback', 'accuracy_score', 'completeness_score', 'clarity_score',
+    'clinical_relevance_score', 'gold_standard_answer', 'submitted_at'
+)
+
+
+def normalize_text(text):
+    return ' '.join(unicodedata.normalize('NFC', text or '').split())
+
+
+def content_hash(question, answer):
+    """SHA-256 hex digest identifying a pair by its normalised texts"""
+    digest = hashlib.sha256()
+    digest.update(normalize_text(question).encode('utf-8'))
+    digest.update(b'\x00')
+    digest.update(normalize_text(answer).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def backfill_content_hashes(batch_size=BACKFILL_BATCH_SIZE):
+    """Hash pairs stored before the content_hash column existed; returns the number updated"""
+    updated = 0
+    while True:
+        rows = db.session.execute(
+            select(QuestionAnswerPair.id, QuestionAnswerPair.question_text, QuestionAnswerPair.system_answer_text).
+            where(QuestionAnswerPair.content_hash.is_(None)).limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        table = QuestionAnswerPair.__table__
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('qa_id')).values(content_hash=bindparam('hash')),
+            [{'qa_id': qa_id, 'hash': content_hash(question, answer)} for qa_id, question, answer in rows]
+        )
+        db.session.commit()
+        updated += len(rows)
+
+
+def _accessible(query, owner):
+    if owner is None or owner.is_admin():
+        return query
+    return query.where(QuestionAnswerPair.dataset_id.in_(
+        select(user_dataset_access.c.dataset_id).where(user_dataset_access.c.user_id == owner.id)
+    ))
+
+
+def existing_matches(hashes, owner=None):
+    """Existing pairs per hash as {hash: [(qa_id, dataset_id, feedback_count)]}"""
+    feedback_count = select(func.count(Feedback.id)).\
+        where(Feedback.qa_pair_id == QuestionAnswerPair.id, Feedback.answer_revision == QuestionAnswerPair.revision).\
+        scalar_subquery()
+    hashes = sorted(set(hashes))
+    matches = {}
+    for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+        query = select(
+            QuestionAnswerPair.content_hash, QuestionAnswerPair.id, QuestionAnswerPair.dataset_id, feedback_count
+        ).where(QuestionAnswerPair.content_hash.in_(hashes[start:start + LOOKUP_CHUNK_SIZE]))
+        for hash_value, qa_id, dataset_id, count in db.session.execute(_accessible(query, owner)):
+            matches.setdefault(hash_value, []).append((qa_id, dataset_id, count))
+    return matches
+
+
+def _feedback_source(candidates):
+    # The most recent matching pair that has feedback, else the most recent one
+    return max(candidates, key=lambda candidate: (candidate[2] > 0, candidate[0]))
+
+
+def find_duplicates(qa_pairs_data, owner=None):
+    """Mark parsed rows that repeat an earlier row or an existing pair; returns the duplicate summary
+
+    Each row gets 'duplicate_in_file' and 'duplicate_of' (the id of the
+    existing pair feedback would be carried over from, or None).
+    """
+    backfill_content_hashes()
+    matches = existing_matches([qa_data['content_hash'] for qa_data in qa_pairs_data], owner)
+
+    seen = set()
+    dataset_rows = {}
+    in_file = existing = with_feedback = 0
+    for qa_data in qa_pairs_data:
+        hash_value = qa_data['content_hash']
+        qa_data['duplicate_in_file'] = hash_value in seen
+        seen.add(hash_value)
+        in_file += qa_data['duplicate_in_file']
+
+        candidates = matches.get(hash_value)
+        qa_data['duplicate_of'] = _feedback_source(candidates)[0] if candidates else None
+        if candidates:
+            existing += 1
+            with_feedback += any(count for _, _, count in candidates)
+            for dataset_id in {dataset_id for _, dataset_id, _ in candidates}:
+                dataset_rows[dataset_id] = dataset_rows.get(dataset_id, 0) + 1
+
+    top = sorted(dataset_rows.items(), key=lambda item: (-item[1], item[0]))[:MAX_REPORTED_DATASETS]
+    names = dict(db.session.execute(
+        select(Dataset.id, Dataset.name).where(Dataset.id.in_([dataset_id for dataset_id, _ in top]))
+    ).all()) if top else {}
+    return {
+        'rows': len(qa_pairs_data),
+        'duplicates_in_file': in_file,
+        'existing_duplicates': existing,
+        'existing_duplicates_with_feedback': with_feedback,
+        'new_rows': sum(1 for qa_data in qa_pairs_data if not qa_data['duplicate_in_file'] and not qa_data['duplicate_of']),
+        'matching_datasets': [
+            {'dataset_id': dataset_id, 'name': names.get(dataset_id), 'rows': rows} for dataset_id, rows in top
+        ]
+    }
+
+
+def drop_duplicates(qa_pairs_data):
+    """Rows that neither repeat an earlier row nor match an existing pair"""
+    return [qa_data for qa_data in qa_pairs_data if not qa_data['duplicate_in_file'] and not qa_data['duplicate_of']]
+
+
+def carry_over_feedback(dataset_id, qa_pairs_data):
+    """Copy feedback from the pairs find_duplicates matched onto a new dataset's pairs
+
+    Runs in the caller's transaction; returns the number of feedback rows copied.
+    """
+    source_by_hash = {
+        qa_data['content_hash']: qa_data['duplicate_of'] for qa_data in qa_pairs_data if qa_data.get('duplicate_of')
+    }
+    sources = {}
+    for qa_id, hash_value in db.session.execute(
+        select(QuestionAnswerPair.id, QuestionAnswerPair.content_hash).where(QuestionAnswerPair.dataset_id == dataset_id)
+    ):
+        if hash_value in source_by_hash:
+            sources.setdefault(source_by_hash[hash_value], []).append(qa_id)
+
+    copied = 0
+    source_ids = sorted(sources)
+    columns = [getattr(Feedback, name) for name in FEEDBACK_COPY_COLUMNS]
+    for start in range(0, len(source_ids), LOOKUP_CHUNK_SIZE):
+        # Only feedback on the source's current answer, the text the new pair duplicates
+        rows = db.session.execute(
+            select(Feedback.qa_pair_id, *columns).
+            join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).
+            where(Feedback.qa_pair_id.in_(source_ids[start:start + LOOKUP_CHUNK_SIZE]),
+                  Feedback.answer_revision == QuestionAnswerPair.revision)
+        ).all()
+        copies = [
+            {'qa_pair_id': target_id, **dict(zip(FEEDBACK_COPY_COLUMNS, row[1:]))}
+            for row in rows for target_id in sources[row[0]]
+        ]
+        if copies:
+            db.session.execute(insert(Feedback), copies)
+            copied += len(copies)
+    return copied
+
+
+def duplicate_message(summary):
+    """Message suffix describing duplicates, or an empty string"""
+    if not summary['existing_duplicates'] and not summary['duplicates_in_file']:
+        return ''
+    parts = []
+    if summary['existing_duplicates']:
+        parts.append(f'{summary["existing_duplicates"]} rows match existing pairs')
+    if summary['duplicates_in_file']:
+        parts.append(f'{summary["duplicates_in_file"]} rows repeat earlier rows')
+    if summary.get('skipped_rows'):
+        parts.append(f'{summary["skipped_rows"]} duplicates skipped')
+    if summary.get('carried_feedback'):
+        parts.append(f'{summary["carried_feedback"]} feedback entries carried over')
+    return f' ({", ".join(parts)})'
@@ -0,0 +1,473 @@
+"""
+Exports of dataset feedback.
+
+JSON and CSV keep their original shapes (nested feedback entries; one row per
+feedback entry or aggregated per pair) and are encoded pair by pair. The
+streaming formats share one fixed row schema (one row per feedback entry, with
+Q&A pairs that have no matching feedback exported once with empty feedback
+columns). Rows are fetched from the database in batches and encoded batch by
+batch, so memory stays bounded regardless of dataset size. Archived datasets
+are read from their cold storage files instead (see cold_storage.py).
+
+pyarrow (Parquet / Arrow IPC) and zstandard (zstd NDJSON) are optional and
+only imported when those formats are requested.
+"""
+
+import csv
+import io
+import itertools
+import json
+import os
+import textwrap
+import zlib
+
+from flask import current_app
+
+from models import db, Dataset
+from read_models import BATCH_SIZE as RECORD_BATCH_SIZE, dataset_has_original_ids, group_qa_feedback, qa_feedback_query
+
+BATCH_SIZE = 5000
+
+# Fixed export schema: (column, arrow type name)
+EXPORT_COLUMNS = [
+    ('qa_id', 'int64'),
+    ('original_qa_id', 'string'),
+    ('question', 'string'),
+    ('answer', 'string'),
+    ('qa_created_at', 'timestamp'),
+    ('feedback_id', 'int64'),
+    ('user_id', 'int64'),
+    ('username', 'string'),
+    ('submitted_at', 'timestamp'),
+    ('text_feedback', 'string'),
+    ('accuracy_score', 'int8'),
+    ('completeness_score', 'int8'),
+    ('clarity_score', 'int8'),
+    ('clinical_relevance_score', 'int8'),
+    ('gold_standard_answer', 'string'),
+]
+COLUMN_NAMES = [name for name, _ in EXPORT_COLUMNS]
+SCORE_COLUMNS = ['accuracy_score', 'completeness_score', 'clarity_score', 'clinical_relevance_score']
+
+# format -> (mimetype, file extension)
+STREAMING_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+NDJSON_COMPRESSIONS = {
+    'none': ('application/x-ndjson', ''),
+    'gzip': ('application/gzip', '.gz'),
+    'zstd': ('application/zstd', '.zst'),
+}
+
+
+# Buffered formats: format -> (mimetype, file extension)
+DOCUMENT_FORMATS = {
+    'json': ('application/json', 'json'),
+    'csv': ('text/csv', 'csv'),
+}
+EXPORT_FORMATS = list(DOCUMENT_FORMATS) + list(STREAMING_FORMATS)
+
+# Pairs encoded per chunk of JSON/CSV output
+DOCUMENT_CHUNK_PAIRS = 500
+
+
+class ExportError(Exception):
+    """Raised when an export cannot be produced with the requested options"""
+
+
+def _row_partitions(dataset_id, selected_user_ids, batch_size):
+    """Partitions of qa_feedback_query() rows, from the archive files for archived datasets"""
+    if db.session.query(Dataset.archived_at).filter(Dataset.id == dataset_id).scalar() is not None:
+        from cold_storage import archive_root, iter_archived_rows
+        return iter_archived_rows(archive_root(current_app), dataset_id, selected_user_ids, batch_size)
+    result = db.session.execute(
+        qa_feedback_query(dataset_id, selected_user_ids),
+        execution_options={'yield_per': batch_size}
+    )
+    return result.partitions(batch_size)
+
+
+def _qa_with_feedback(dataset_id, selected_user_ids):
+    """(QARecord, [FeedbackRecord, ...]) for a live or archived dataset"""
+    partitions = _row_partitions(dataset_id, selected_user_ids, RECORD_BATCH_SIZE)
+    return group_qa_feedback(itertools.chain.from_iterable(partitions))
+
+
+def _has_original_ids(dataset_id):
+    dataset = db.session.get(Dataset, dataset_id)
+    if dataset is not None and dataset.is_archived():
+        from cold_storage import archive_summary
+        return archive_summary(dataset)['has_original_ids']
+    return dataset_has_original_ids(dataset_id)
+
+
+def iter_row_batches(dataset_id, selected_user_ids=None, include_gold_standards=True,
+                     include_scores=True, include_text_feedback=True, batch_size=BATCH_SIZE):
+    """Yield lists of export rows (dicts keyed by COLUMN_NAMES)"""
+    blanked = []
+    if not include_text_feedback:
+        blanked.append('text_feedback')
+    if not include_scores:
+        blanked.extend(SCORE_COLUMNS)
+    if not include_gold_standards:
+        blanked.append('gold_standard_answer')
+
+    for partition in _row_partitions(dataset_id, selected_user_ids, batch_size):
+        batch = []
+        for row in partition:
+            record = dict(zip(COLUMN_NAMES, row))
+            for column in blanked:
+                record[column] = None
+            batch.append(record)
+        yield batch
+
+
+class _DrainableSink:
+    """Write-only file object whose buffered bytes can be drained between batches"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # Writers record absolute offsets (e.g. the Parquet footer), so this
+        # must keep counting after buffered bytes have been drained
+        return self._position
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def arrow_schema():
+    """The fixed export schema as a pyarrow schema"""
+    import pyarrow as pa
+
+    types = {
+        'int64': pa.int64(),
+        'int8': pa.int8(),
+        'string': pa.string(),
+        'timestamp': pa.timestamp('us'),
+    }
+    return pa.schema([(name, types[type_name]) for name, type_name in EXPORT_COLUMNS])
+
+
+def _record_batch(rows, schema):
+    import pyarrow as pa
+
+    return pa.RecordBatch.from_arrays(
+        [pa.array([row[name] for row in rows], type=schema.field(name).type) for name in COLUMN_NAMES],
+        schema=schema
+    )
+
+
+def _require(module, format_type):
+    try:
+        return __import__(module)
+    except ImportError:
+        raise ExportError(f'{format_type} export requires the "{module}" package to be installed')
+
+
+def _stream_arrow(batches, format_type):
+    _require('pyarrow', format_type)
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    schema = arrow_schema()
+    sink = _DrainableSink()
+    if format_type == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+        write = writer.write_batch
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+
+    wrote_any = False
+    for rows in batches:
+        write(_record_batch(rows, schema))
+        wrote_any = True
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    if not wrote_any and format_type == 'parquet':
+        writer.write_table(schema.empty_table())
+    writer.close()
+    yield sink.drain()
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def _stream_ndjson(batches, compression):
+    if compression == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        finish = compressor.flush
+    elif compression == 'zstd':
+        zstandard = _require('zstandard', 'zstd')
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        finish = compressor.flush
+    else:
+        compressor = None
+
+    for rows in batches:
+        data = ''.join(json.dumps(row, default=_json_default) + '\n' for row in rows).encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield finish()
+
+
+def stream_export(dataset_id, format_type, compression='none', **options):
+    """Return a generator of encoded bytes for a streaming export format"""
+    if format_type not in STREAMING_FORMATS:
+        raise ExportError(f'Unsupported streaming format: {format_type}')
+    if format_type == 'ndjson' and compression not in NDJSON_COMPRESSIONS:
+        raise ExportError('Invalid compression. Use none, gzip or zstd')
+
+    # Fail fast on missing optional dependencies, before the response starts
+    if format_type in ('parquet', 'arrow'):
+        _require('pyarrow', format_type)
+    elif compression == 'zstd':
+        _require('zstandard', 'zstd')
+
+    batches = iter_row_batches(dataset_id, **options)
+    if format_type == 'ndjson':
+        return _stream_ndjson(batches, compression)
+    return _stream_arrow(batches, format_type)
+
+
+def _json_entry(qa, feedback_list, has_feedback_options, include_gold_standards, include_scores,
+                include_text_feedback):
+    qa_data = {
+        'id': qa.id,
+        'question': qa.question_text,
+        'answer': qa.system_answer_text,
+        'created_at': qa.created_at.isoformat()
+    }
+
+    # Add original_qa_id if it exists
+    if qa.original_qa_id:
+        qa_data['original_qa_id'] = qa.original_qa_id
+
+    # Add feedback if any options are selected
+    if has_feedback_options:
+        qa_data['feedback_entries'] = []
+
+        for feedback in feedback_list:
+            feedback_data = {
+                'feedback_id': feedback.id,
+                'user_id': feedback.user_id,
+                'username': feedback.username,
+                'submitted_at': feedback.submitted_at.isoformat() if feedback.submitted_at else None
+            }
+
+            if include_text_feedback and feedback.text_feedback:
+                feedback_data['text_feedback'] = feedback.text_feedback
+
+            if include_scores:
+                if feedback.accuracy_score:
+                    feedback_data['accuracy_score'] = feedback.accuracy_score
+                if feedback.completeness_score:
+                    feedback_data['completeness_score'] = feedback.completeness_score
+                if feedback.clarity_score:
+                    feedback_data['clarity_score'] = feedback.clarity_score
+                if feedback.clinical_relevance_score:
+                    feedback_data['clinical_relevance_score'] = feedback.clinical_relevance_score
+
+            if include_gold_standards and feedback.gold_standard_answer:
+                feedback_data['gold_standard_answer'] = feedback.gold_standard_answer
+
+            qa_data['feedback_entries'].append(feedback_data)
+    return qa_data
+
+
+def iter_json_export(dataset_id, selected_user_ids=None, include_gold_standards=False, include_scores=False,
+                     include_text_feedback=False):
+    """Yield the JSON export (an indented array of pairs with their feedback) in text chunks"""
+    has_feedback_options = include_gold_standards or include_scores or include_text_feedback
+
+    # Feedback is not fetched at all when no feedback options are selected
+    qa_pairs = _qa_with_feedback(dataset_id, selected_user_ids if has_feedback_options else [])
+
+    # Same bytes as json.dump(entries, indent=2), written one pair at a time
+    empty = True
+    chunk = []
+    for qa, feedback_list in qa_pairs:
+        entry = _json_entry(qa, feedback_list, has_feedback_options, include_gold_standards, include_scores,
+                            include_text_feedback)
+        chunk.append(('[\n' if empty else ',\n') + textwrap.indent(json.dumps(entry, indent=2), '  '))
+        empty = False
+        if len(chunk) >= DOCUMENT_CHUNK_PAIRS:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append('[]' if empty else '\n]')
+    yield ''.join(chunk)
+
+
+def _csv_rows(dataset_id, selected_user_ids, include_gold_standards, include_scores, include_text_feedback):
+    has_feedback_options = include_gold_standards or include_scores or include_text_feedback
+    qa_pairs = _qa_with_feedback(dataset_id, selected_user_ids if has_feedback_options else [])
+
+    # Determine if we're doing individual feedback rows or aggregated
+    multiple_users = selected_user_ids is None or len(selected_user_ids) != 1
+    has_original_ids = _has_original_ids(dataset_id)
+
+    if has_feedback_options and multiple_users:
+        # Individual feedback rows (one row per QA-user pair)
+        headers = ['qa_id', 'question', 'answer', 'created_at']
+        if has_original_ids:
+            headers.append('original_qa_id')
+        headers.extend(['user_id', 'username', 'submitted_at'])
+
+        if include_text_feedback:
+            headers.append('text_feedback')
+        if include_scores:
+            headers.extend(['accuracy_score', 'completeness_score', 'clarity_score', 'clinical_relevance_score'])
+        if include_gold_standards:
+            headers.append('gold_standard_answer')
+
+        yield headers
+
+        for qa, feedback_list in qa_pairs:
+            for feedback in feedback_list:
+                row = [qa.id, qa.question_text, qa.system_answer_text, qa.created_at.strftime('%Y-%m-%d %H:%M:%S')]
+
+                if has_original_ids:
+                    row.append(qa.original_qa_id or '')
+
+                row.extend([
+                    feedback.user_id,
+                    feedback.username or '',
+                    feedback.submitted_at.strftime('%Y-%m-%d %H:%M:%S') if feedback.submitted_at else ''
+                ])
+
+                if include_text_feedback:
+                    row.append(feedback.text_feedback or '')
+                if include_scores:
+                    row.extend([
+                        feedback.accuracy_score or '',
+                        feedback.completeness_score or '',
+                        feedback.clarity_score or '',
+                        feedback.clinical_relevance_score or ''
+                    ])
+                if include_gold_standards:
+                    row.append(feedback.gold_standard_answer or '')
+
+                yield row
+    else:
+        # Aggregated format (one row per QA pair)
+        headers = ['id', 'question', 'answer', 'created_at']
+        if has_original_ids:
+            headers.append('original_qa_id')
+
+        if has_feedback_options:
+            headers.append('feedback_count')
+            if include_scores:
+                headers.extend(['avg_accuracy', 'avg_completeness', 'avg_clarity', 'avg_clinical_relevance'])
+            if include_text_feedback:
+                headers.append('text_feedback_combined')
+            if include_gold_standards:
+                headers.append('gold_standards_combined')
+
+        yield headers
+
+        for qa, feedback_list in qa_pairs:
+            row = [qa.id, qa.question_text, qa.system_answer_text, qa.created_at.strftime('%Y-%m-%d %H:%M:%S')]
+
+            if has_original_ids:
+                row.append(qa.original_qa_id or '')
+
+            if has_feedback_options:
+                row.append(len(feedback_list))
+
+                if include_scores:
+                    feedback_scores = {
+                        'accuracy': [f.accuracy_score for f in feedback_list if f.accuracy_score],
+                        'completeness': [f.completeness_score for f in feedback_list if f.completeness_score],
+                        'clarity': [f.clarity_score for f in feedback_list if f.clarity_score],
+                        'clinical_relevance': [f.clinical_relevance_score for f in feedback_list if f.clinical_relevance_score]
+                    }
+
+                    for score_type in ['accuracy', 'completeness', 'clarity', 'clinical_relevance']:
+                        scores = feedback_scores[score_type]
+                        row.append(round(sum(scores) / len(scores), 2) if scores else '')
+
+                if include_text_feedback:
+                    text_feedback = [f.text_feedback for f in feedback_list if f.text_feedback]
+                    row.append(' | '.join(text_feedback) if text_feedback else '')
+
+                if include_gold_standards:
+                    gold_standards = [f.gold_standard_answer for f in feedback_list if f.gold_standard_answer]
+                    row.append(' | '.join(gold_standards) if gold_standards else '')
+
+            yield row
+
+
+def iter_csv_export(dataset_id, selected_user_ids=None, include_gold_standards=False, include_scores=False,
+                    include_text_feedback=False):
+    """Yield the CSV export in text chunks"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    for count, row in enumerate(_csv_rows(dataset_id, selected_user_ids, include_gold_standards, include_scores,
+                                          include_text_feedback), 1):
+        writer.writerow(row)
+        if count % DOCUMENT_CHUNK_PAIRS == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+
+def export_chunks(dataset_id, format_type, compression='none', **options):
+    """Return a generator of encoded bytes for any export format"""
+    if format_type in DOCUMENT_FORMATS:
+        chunks = iter_json_export if format_type == 'json' else iter_csv_export
+        return (chunk.encode('utf-8') for chunk in chunks(dataset_id, **options))
+    return stream_export(dataset_id, format_type, compression, **options)
+
+
+def export_mimetype_and_extension(format_type, compression='none'):
+    """Mimetype and file extension for an export"""
+    if format_type in DOCUMENT_FORMATS:
+        return DOCUMENT_FORMATS[format_type]
+    mimetype, extension = STREAMING_FORMATS[format_type]
+    if format_type == 'ndjson':
+        mimetype, suffix = NDJSON_COMPRESSIONS[compression]
+        extension += suffix
+    return mimetype, extension
+
+
+def write_export(dataset_id, path, format_type, compression='none', **options):
+    """Write an export to a file (via a temporary file, renamed when complete); returns bytes written"""
+    written = 0
+    with open(path + '.tmp', 'wb') as f:
+        for chunk in export_chunks(dataset_id, format_type, compression, **options):
+            f.write(chunk)
+            written += len(chunk)
+    os.replace(path + '.tmp', path)
+    return written
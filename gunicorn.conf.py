@@ -0,0 +1,28 @@
+"""
+Gunicorn settings, loaded automatically when gunicorn starts in this directory.
+
+The admin and datasets pages keep a Server-Sent Events stream (/api/events)
+open, so workers are threaded: a stream occupies one thread, not a whole
+worker, and threaded workers heartbeat independently of long requests.
+"""
+
+import os
+
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# At most half of each worker's threads hold live streams; the rest serve requests
+os.environ.setdefault('LIVE_MAX_STREAMS', str(max(1, threads // 2)))
+
+
+def on_starting(server):
+    """Create or upgrade the schema once, in the master, before any worker serves a request"""
+    from app import app
+    from models import db, upgrade_schema
+
+    with app.app_context():
+        upgrade_schema()
+        # Workers are forked from the master; they must not share its connections
+        db.engine.dispose()
+    server.log.info('Database schema is up to date')
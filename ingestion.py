@@ -0,0 +1,341 @@
+"""
+Parsing and creation of datasets from uploaded JSON, JSONL and CSV files.
+
+Shared by the single-request upload endpoint, the chunked upload protocol
+(which hands over the assembled file once all chunks arrived) and the
+import-zip and import-dataset CLI commands. ZIP archives are ingested as one
+dataset per member file and local files as one dataset each, parsed
+concurrently in a process pool.
+"""
+
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from dedup import carry_over_feedback, content_hash, drop_duplicates, find_duplicates
+from live import publish
+from models import db, Dataset, QuestionAnswerPair
+from timestamps import parse_timestamps
+
+SUPPORTED_EXTENSIONS = ('.json', '.jsonl', '.csv')
+ARCHIVE_EXTENSIONS = ('.zip',)
+
+# Guards against archives that expand far beyond their upload size
+MAX_ARCHIVE_MEMBERS = 1000
+MAX_ARCHIVE_UNCOMPRESSED = 4 * 1024 * 1024 * 1024
+
+INSERT_BATCH_SIZE = 5000
+
+
+class IngestionError(ValueError):
+    """Raised when an uploaded file does not contain a valid dataset"""
+
+
+def _json_row(item, row):
+    if not isinstance(item, dict) or 'question' not in item or 'answer' not in item:
+        raise IngestionError('Each JSON object must have "question" and "answer" fields')
+
+    # Parse optional fields (timestamps are parsed for the whole file afterwards)
+    original_id = item.get('id', item.get('original_id'))
+    timestamp_str = item.get('timestamp', item.get('created_at'))
+
+    return {
+        'question': str(item['question']).strip(),
+        'answer': str(item['answer']).strip(),
+        'original_id': str(original_id).strip() if original_id else None,
+        'timestamp': str(timestamp_str).strip() if timestamp_str else None,
+        'row': row
+    }
+
+
+def parse_json(file_content):
+    """Parse a JSON array of Q&A objects"""
+    try:
+        data = json.loads(file_content)
+    except json.JSONDecodeError as e:
+        raise IngestionError(f'Invalid JSON format: {str(e)}')
+    if not isinstance(data, list):
+        raise IngestionError('JSON must be an array of objects')
+
+    return [_json_row(item, index + 1) for index, item in enumerate(data)]
+
+
+def parse_jsonl(binary_stream):
+    """Parse one Q&A object per line, reading the stream incrementally"""
+    qa_pairs_data = []
+    for line_number, line in enumerate(binary_stream, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise IngestionError(f'Invalid JSON on line {line_number}: {str(e)}')
+        qa_pairs_data.append(_json_row(item, line_number))
+    return qa_pairs_data
+
+
+def parse_csv(text_stream):
+    """Parse CSV rows with question and answer columns from a text stream"""
+    try:
+        csv_reader = csv.DictReader(text_stream)
+
+        # Check if required columns exist
+        if not csv_reader.fieldnames or 'question' not in csv_reader.fieldnames or 'answer' not in csv_reader.fieldnames:
+            raise IngestionError('CSV must have "question" and "answer" columns')
+
+        qa_pairs_data = []
+        for row in csv_reader:
+            if not row['question'].strip() or not row['answer'].strip():
+                continue  # Skip empty rows
+
+            # Parse optional fields (timestamps are parsed for the whole file afterwards)
+            original_id = row.get('id', row.get('original_id', ''))
+            timestamp_str = row.get('timestamp', row.get('created_at', ''))
+
+            qa_pairs_data.append({
+                'question': row['question'].strip(),
+                'answer': row['answer'].strip(),
+                'original_id': original_id.strip() if original_id.strip() else None,
+                'timestamp': timestamp_str.strip() or None,
+                'row': csv_reader.line_num
+            })
+        return qa_pairs_data
+    except IngestionError:
+        raise
+    except Exception as e:
+        raise IngestionError(f'Error reading CSV: {str(e)}')
+
+
+def parse_dataset_file(filename, binary_stream):
+    """Parse an uploaded JSON, JSONL or CSV file into Q&A pair dicts and a timestamp report"""
+    lower = filename.lower()
+    if not lower.endswith(SUPPORTED_EXTENSIONS):
+        raise IngestionError('Only JSON, JSONL and CSV files are supported')
+
+    if lower.endswith('.json'):
+        qa_pairs_data = parse_json(binary_stream.read().decode('utf-8'))
+    elif lower.endswith('.jsonl'):
+        qa_pairs_data = parse_jsonl(binary_stream)
+    else:
+        # CSV rows are read incrementally from the stream
+        qa_pairs_data = parse_csv(io.TextIOWrapper(binary_stream, encoding='utf-8', newline=''))
+
+    if not qa_pairs_data:
+        raise IngestionError('No valid Q&A pairs found in the file')
+
+    # Rows with unparsable timestamps keep the upload time and are reported
+    timestamps, timestamp_report = parse_timestamps(
+        [qa_data['timestamp'] for qa_data in qa_pairs_data],
+        [qa_data.pop('row') for qa_data in qa_pairs_data]
+    )
+    for qa_data, timestamp in zip(qa_pairs_data, timestamps):
+        qa_data['timestamp'] = timestamp
+        qa_data['content_hash'] = content_hash(qa_data['question'], qa_data['answer'])
+    return qa_pairs_data, timestamp_report
+
+
+def timestamp_warning(timestamp_report):
+    """Message suffix for unparsable timestamps, or an empty string"""
+    count = timestamp_report['unparsable_timestamps']
+    if not count:
+        return ''
+    rows = ', '.join(str(example['row']) for example in timestamp_report['unparsable_examples'][:5])
+    return f' ({count} rows had unparsable timestamps and use the upload time, e.g. rows {rows})'
+
+
+def create_dataset(dataset_name, dataset_description, qa_pairs_data, owner, duplicates='keep'):
+    """Create a dataset with its Q&A pairs and grant the owner access; returns (dataset, duplicate summary)
+
+    duplicates is one of dedup.DUPLICATE_MODES: keep every row, skip rows
+    that duplicate an earlier row or an existing pair, or keep them and carry
+    over the feedback of the matching pair.
+    """
+    summary = find_duplicates(qa_pairs_data, owner)
+    summary['mode'] = duplicates
+    if duplicates == 'skip':
+        kept = drop_duplicates(qa_pairs_data)
+        if not kept:
+            raise IngestionError('Every row duplicates an existing Q&A pair')
+        summary['skipped_rows'] = len(qa_pairs_data) - len(kept)
+        qa_pairs_data = kept
+
+    new_dataset = Dataset(
+        name=dataset_name,
+        description=dataset_description if dataset_description else None
+    )
+    db.session.add(new_dataset)
+    db.session.flush()  # Get the dataset ID
+
+    # Add Q&A pairs to the dataset with batched multi-row inserts
+    now = datetime.utcnow()
+    for start in range(0, len(qa_pairs_data), INSERT_BATCH_SIZE):
+        db.session.execute(insert(QuestionAnswerPair), [
+            {
+                'dataset_id': new_dataset.id,
+                'question_text': qa_data['question'],
+                'system_answer_text': qa_data['answer'],
+                'original_qa_id': qa_data.get('original_id'),
+                'content_hash': qa_data['content_hash'],
+                'created_at': qa_data.get('timestamp') or now,
+                'updated_at': now
+            }
+            for qa_data in qa_pairs_data[start:start + INSERT_BATCH_SIZE]
+        ])
+
+    if duplicates == 'carry_feedback':
+        summary['carried_feedback'] = carry_over_feedback(new_dataset.id, qa_pairs_data)
+
+    # Grant access to the current user (and admins get access to everything)
+    if owner is not None:
+        new_dataset.authorized_users.append(owner)
+
+    publish('dataset_created', dataset_id=new_dataset.id, user_id=owner.id if owner is not None else None,
+            name=new_dataset.name, qa_count=len(qa_pairs_data))
+    db.session.commit()
+    return new_dataset, summary
+
+
+def archive_members(archive_path):
+    """Dataset files inside a ZIP archive, validated against the archive limits"""
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and info.filename.lower().endswith(SUPPORTED_EXTENSIONS)
+                and not any(part.startswith(('.', '__MACOSX')) for part in info.filename.split('/'))
+            ]
+    except zipfile.BadZipFile:
+        raise IngestionError('File is not a valid ZIP archive')
+
+    if not members:
+        raise IngestionError('ZIP archive contains no JSON, JSONL or CSV files')
+    if len(members) > MAX_ARCHIVE_MEMBERS:
+        raise IngestionError(f'ZIP archive may contain at most {MAX_ARCHIVE_MEMBERS} dataset files')
+    if sum(info.file_size for info in members) > MAX_ARCHIVE_UNCOMPRESSED:
+        raise IngestionError('ZIP archive is too large when uncompressed')
+    return [info.filename for info in members]
+
+
+def _timed_parse(label, parse):
+    """Run a parse callable, returning its rows or error with the time it took"""
+    started = time.perf_counter()
+    try:
+        rows, timestamp_report = parse()
+        return {'file': label, 'rows': rows, 'timestamps': timestamp_report, 'error': None,
+                'parse_seconds': time.perf_counter() - started}
+    except IngestionError as e:
+        return {'file': label, 'rows': None, 'timestamps': None, 'error': str(e),
+                'parse_seconds': time.perf_counter() - started}
+    except Exception as e:
+        return {'file': label, 'rows': None, 'timestamps': None, 'error': f'Error reading file: {str(e)}',
+                'parse_seconds': time.perf_counter() - started}
+
+
+def _parse_member(archive_path, member):
+    """Parse one archive member (runs in a worker process)"""
+    def parse():
+        with zipfile.ZipFile(archive_path) as archive, archive.open(member) as stream:
+            return parse_dataset_file(member, stream)
+    return _timed_parse(member, parse)
+
+
+def _parse_path(path):
+    """Parse one local file (runs in a worker process)"""
+    def parse():
+        with open(path, 'rb') as stream:
+            return parse_dataset_file(path, stream)
+    return _timed_parse(path, parse)
+
+
+def parse_archive(archive_path, members, workers=None):
+    """Parse archive members, in a process pool when there is more than one"""
+    if len(members) == 1 or workers == 1:
+        yield from (_parse_member(archive_path, member) for member in members)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_parse_member, [archive_path] * len(members), members)
+
+
+def parse_files(paths, workers=None):
+    """Parse local dataset files, in a process pool when there is more than one"""
+    if len(paths) == 1 or workers == 1:
+        yield from (_parse_path(path) for path in paths)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_parse_path, paths)
+
+
+def member_dataset_name(member, name_prefix=None):
+    """Dataset name for an archive member: its file name without extension, optionally prefixed"""
+    stem = os.path.splitext(os.path.basename(member))[0]
+    return f'{name_prefix} - {stem}' if name_prefix else stem
+
+
+def _create_parsed_datasets(parsed_files, names, owner, description, duplicates):
+    """Create a dataset per parsed file, in order, and report per-file results with throughput"""
+    started = time.perf_counter()
+    taken = {name for (name,) in db.session.query(Dataset.name).filter(Dataset.name.in_(set(names.values())))}
+
+    files = []
+    for parsed in parsed_files:
+        name = names[parsed['file']]
+        result = {
+            'file': parsed['file'],
+            'dataset_name': name,
+            'dataset_id': None,
+            'rows': 0,
+            'error': parsed['error'],
+            'timestamps': parsed['timestamps'],
+            'duplicates': None,
+            'parse_seconds': round(parsed['parse_seconds'], 3)
+        }
+        if result['error'] is None and name in taken:
+            result['error'] = 'Dataset name already exists'
+        if result['error'] is None:
+            try:
+                dataset, result['duplicates'] = create_dataset(name, description, parsed['rows'], owner, duplicates)
+                result['dataset_id'] = dataset.id
+                result['rows'] = len(parsed['rows']) - result['duplicates'].get('skipped_rows', 0)
+                taken.add(name)
+            except Exception as e:
+                db.session.rollback()
+                result['error'] = f'Error creating dataset: {str(e)}'
+        files.append(result)
+
+    elapsed = time.perf_counter() - started
+    total_rows = sum(result['rows'] for result in files)
+    return {
+        'files': files,
+        'datasets_created': sum(1 for result in files if result['dataset_id']),
+        'failed_files': sum(1 for result in files if result['error']),
+        'total_rows': total_rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(total_rows / elapsed) if elapsed else None
+    }
+
+
+def ingest_archive(archive_path, owner, name_prefix=None, description=None, workers=None, duplicates='keep'):
+    """Create one dataset per JSON/JSONL/CSV member of a ZIP archive and report per-file results"""
+    members = archive_members(archive_path)
+    names = {member: member_dataset_name(member, name_prefix) for member in members}
+    return _create_parsed_datasets(parse_archive(archive_path, members, workers), names, owner, description, duplicates)
+
+
+def ingest_files(paths, owner, names=None, description=None, workers=None, duplicates='keep'):
+    """Create one dataset per local JSON/JSONL/CSV file and report per-file results
+
+    Files are parsed in worker processes; datasets are inserted one at a time
+    so a single-writer database (SQLite) is never contended.
+    """
+    names = names or {path: member_dataset_name(path) for path in paths}
+    return _create_parsed_datasets(parse_files(paths, workers), names, owner, description, duplicates)
@@ -0,0 +1,403 @@
+"""
+Live updates for the admin and datasets pages over Server-Sent Events.
+
+Write paths call `publish()` before they commit, so the event row in
+live_event is part of the same transaction and an event never describes a
+change that rolled back. Once the transaction commits its events are handed
+to the streams open in this process straight away; every stream also polls
+live_event every LIVE_POLL_SECONDS for events committed by other workers or
+CLI commands. Events carry deltas (one more feedback on dataset 3) or just
+name what changed; pages apply feedback deltas themselves and refetch the
+aggregate stats for everything else.
+
+An open stream holds a worker thread, so streams end after
+LIVE_STREAM_SECONDS and the browser reconnects with Last-Event-ID, and at
+most LIVE_MAX_STREAMS are open per process. Workers must be threaded
+(gunicorn.conf.py runs gthread workers) so that open streams leave threads
+for other requests.
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, select
+
+from models import db, Dataset, Feedback, LiveEvent, QuestionAnswerPair, User, user_dataset_access
+from replica import RoutingSession
+
+DEFAULT_POLL_SECONDS = 5
+DEFAULT_HEARTBEAT_SECONDS = 15
+DEFAULT_STREAM_SECONDS = 300
+DEFAULT_MAX_STREAMS = 32
+DEFAULT_RETENTION_HOURS = 24
+
+# Browsers wait this long before reconnecting a stream that ended
+RECONNECT_MS = 2000
+
+# Ids are allocated before commit, so with concurrent writers a lower id can
+# become visible after a higher one; polls look back this far and skip ids
+# already sent
+REORDER_WINDOW = 200
+POLL_BATCH = 500
+
+# Old events are pruned whenever an event id crosses a multiple of this
+PRUNE_EVERY = 1000
+
+# Events about user accounts only go to admins
+ADMIN_KINDS = {'user_created', 'user_updated', 'user_deleted'}
+
+_PENDING = 'live_events_pending'
+_FLUSHED = 'live_events_flushed'
+_listeners_installed = False
+
+
+def publish(kind, dataset_id=None, user_id=None, **data):
+    """Record an event in the current transaction; streams get it once it commits"""
+    live_event = LiveEvent(kind=kind, dataset_id=dataset_id, user_id=user_id, payload=json.dumps(data))
+    db.session.add(live_event)
+    db.session.info.setdefault(_PENDING, []).append(live_event)
+    return live_event
+
+
+def event_dict(live_event):
+    data = json.loads(live_event.payload or '{}')
+    data.update(id=live_event.id, kind=live_event.kind, dataset_id=live_event.dataset_id, user_id=live_event.user_id)
+    return data
+
+
+class Broker:
+    """Fan-out of committed events to the streams open in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def deliver(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(events)
+            except queue.Full:
+                pass  # A stalled stream catches up from its next poll
+
+
+broker = Broker()
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.get(_PENDING)
+    if pending:
+        session.info.setdefault(_FLUSHED, []).extend(event_dict(live_event) for live_event in pending)
+        session.info[_PENDING] = []
+
+
+def _after_commit(session):
+    events = session.info.pop(_FLUSHED, None)
+    if not events:
+        return
+    broker.deliver(events)
+    if any(live_event['id'] // PRUNE_EVERY != (live_event['id'] - 1) // PRUNE_EVERY for live_event in events):
+        prune_events()
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+    session.info.pop(_FLUSHED, None)
+
+
+def _install_listeners():
+    global _listeners_installed
+    if not _listeners_installed:
+        event.listen(RoutingSession, 'after_flush', _after_flush)
+        event.listen(RoutingSession, 'after_commit', _after_commit)
+        event.listen(RoutingSession, 'after_soft_rollback', _after_rollback)
+        _listeners_installed = True
+
+
+def prune_events(retention_hours=None):
+    """Delete events older than the retention window; returns the number removed"""
+    if retention_hours is None:
+        retention_hours = current_app.config.get('LIVE_EVENT_RETENTION_HOURS', DEFAULT_RETENTION_HOURS)
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    table = LiveEvent.__table__
+    # Its own transaction: this runs after the caller's commit
+    with db.engine.begin() as connection:
+        return connection.execute(table.delete().where(table.c.created_at < cutoff)).rowcount
+
+
+def latest_event_id():
+    """Position of the newest event, for pages to resume the stream from"""
+    return db.session.query(func.max(LiveEvent.id)).scalar() or 0
+
+
+def acquire_stream_slot():
+    """Reserve one of this process's LIVE_MAX_STREAMS; False when all are taken"""
+    global _open_streams
+    with _open_streams_lock:
+        if _open_streams >= current_app.config.get('LIVE_MAX_STREAMS', DEFAULT_MAX_STREAMS):
+            return False
+        _open_streams += 1
+        return True
+
+
+def release_stream_slot():
+    global _open_streams
+    with _open_streams_lock:
+        _open_streams = max(0, _open_streams - 1)
+
+
+def _accessible_dataset_ids(user_id):
+    return set(db.session.execute(
+        select(user_dataset_access.c.dataset_id).where(user_dataset_access.c.user_id == user_id)
+    ).scalars())
+
+
+class _Audience:
+    """Decides which events a stream's user sees, and in what form"""
+
+    def __init__(self, user_id, is_admin):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.datasets = None if is_admin else _accessible_dataset_ids(user_id)
+
+    def view(self, data):
+        if self.is_admin:
+            return data
+        kind = data['kind']
+        if kind in ADMIN_KINDS:
+            return None
+        if kind == 'access':
+            if self.user_id not in data.get('user_ids', ()):
+                return None
+            self.datasets = _accessible_dataset_ids(self.user_id)
+            return {'id': data['id'], 'kind': kind}
+        if kind == 'dataset_created' and data['user_id'] == self.user_id:
+            self.datasets.add(data['dataset_id'])
+        if data['dataset_id'] not in self.datasets:
+            return None
+        if kind == 'dataset_deleted':
+            self.datasets.discard(data['dataset_id'])
+        # Reviewers learn whether a change is theirs, not who else made it
+        data = dict(data, mine=data['user_id'] == self.user_id)
+        del data['user_id']
+        return data
+
+
+def _format(data):
+    if data.get('id') is None:
+        return f'data: {json.dumps(data)}\n\n'
+    return f'id: {data["id"]}\ndata: {json.dumps(data)}\n\n'
+
+
+def _poll(after_id):
+    rows = LiveEvent.query.filter(LiveEvent.id > after_id).order_by(LiveEvent.id).limit(POLL_BATCH).all()
+    events = [event_dict(row) for row in rows]
+    # Don't hold a snapshot (or a SQLite read lock) while waiting
+    db.session.rollback()
+    return events
+
+
+def event_stream(user_id, is_admin, after_id=None):
+    """Server-Sent Events for one user, starting after event `after_id` (or from now)
+
+    Must run inside the request context (stream_with_context). Sends a
+    `resync` message, without an id, when events after `after_id` were
+    already pruned, so the page refetches its stats instead.
+    """
+    config = current_app.config
+    poll_seconds = config.get('LIVE_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+    heartbeat_seconds = config.get('LIVE_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS)
+    deadline = time.monotonic() + config.get('LIVE_STREAM_SECONDS', DEFAULT_STREAM_SECONDS)
+
+    subscriber = broker.subscribe()
+    try:
+        audience = _Audience(user_id, is_admin)
+        latest = latest_event_id()
+        oldest = db.session.query(func.min(LiveEvent.id)).scalar()
+        db.session.rollback()
+
+        yield f'retry: {RECONNECT_MS}\n\n'
+        if after_id is None or after_id > latest:
+            floor = latest
+        elif (oldest is None and after_id < latest) or (oldest is not None and after_id < oldest - 1):
+            yield _format({'kind': 'resync'})
+            floor = latest
+        else:
+            floor = after_id
+
+        cursor = floor
+        sent = set()
+        next_poll = time.monotonic()
+        last_write = time.monotonic()
+
+        while time.monotonic() < deadline:
+            now = time.monotonic()
+            if poll_seconds and now >= next_poll:
+                batch = _poll(max(floor, cursor - REORDER_WINDOW))
+                if batch:
+                    cursor = max(cursor, batch[-1]['id'])
+                # Keep polling without waiting while a backlog is being replayed
+                next_poll = now if len(batch) == POLL_BATCH else now + poll_seconds
+            else:
+                wait = heartbeat_seconds - (now - last_write)
+                if poll_seconds:
+                    wait = min(wait, next_poll - now)
+                try:
+                    batch = subscriber.get(timeout=max(0.0, min(wait, deadline - now)))
+                except queue.Empty:
+                    batch = []
+
+            chunks = []
+            for data in batch:
+                if data['id'] <= floor or data['id'] in sent:
+                    continue
+                sent.add(data['id'])
+                visible = audience.view(data)
+                if visible is not None:
+                    chunks.append(_format(visible))
+            sent = {event_id for event_id in sent if event_id > cursor - REORDER_WINDOW}
+
+            if chunks:
+                yield ''.join(chunks)
+                last_write = time.monotonic()
+            elif time.monotonic() - last_write >= heartbeat_seconds:
+                # Keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                last_write = time.monotonic()
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+def _count_by(column, source=None, where=None):
+    """{value: row count} grouped by `column`"""
+    query = select(column, func.count()).select_from(source if source is not None else column.table)
+    if where is not None:
+        query = query.where(where)
+    return dict(db.session.execute(query.group_by(column)).all())
+
+
+def _archived_summaries():
+    """{dataset id: summary} of archived datasets, whose rows are no longer in the live tables"""
+    query = select(Dataset.id, Dataset.archive_summary).where(Dataset.archived_at.isnot(None))
+    return {dataset_id: json.loads(summary) for dataset_id, summary in db.session.execute(query)}
+
+
+def _archived_user_feedback(archived, user_id):
+    return sum(summary['reviewers'].get(str(user_id), {}).get('feedback', 0) for summary in archived.values())
+
+
+def admin_stats(dataset_ids=None, user_ids=None):
+    """Totals plus per-dataset and per-user counts for the admin page, optionally for some rows only
+
+    Archived datasets are counted from the summaries kept on their stubs.
+    """
+    qa_table = QuestionAnswerPair.__table__
+    feedback_table = Feedback.__table__
+    feedback_with_pair = feedback_table.join(qa_table, feedback_table.c.qa_pair_id == qa_table.c.id)
+
+    def only(column, ids):
+        return None if ids is None else column.in_(ids)
+
+    qa_counts = _count_by(qa_table.c.dataset_id, where=only(qa_table.c.dataset_id, dataset_ids))
+    feedback_counts = _count_by(qa_table.c.dataset_id, feedback_with_pair, only(qa_table.c.dataset_id, dataset_ids))
+    dataset_users = _count_by(user_dataset_access.c.dataset_id, where=only(user_dataset_access.c.dataset_id, dataset_ids))
+    user_feedback = _count_by(feedback_table.c.user_id, where=only(feedback_table.c.user_id, user_ids))
+    user_datasets = _count_by(user_dataset_access.c.user_id, where=only(user_dataset_access.c.user_id, user_ids))
+    archived = _archived_summaries()
+    for dataset_id, summary in archived.items():
+        qa_counts[dataset_id] = summary['qa_count']
+        feedback_counts[dataset_id] = summary['feedback_count']
+
+    datasets = select(Dataset.id) if dataset_ids is None else select(Dataset.id).where(Dataset.id.in_(dataset_ids))
+    users = select(User.id) if user_ids is None else select(User.id).where(User.id.in_(user_ids))
+    return {
+        'totals': {
+            'total_users': User.query.count(),
+            'total_datasets': Dataset.query.count(),
+            'total_qa_pairs': QuestionAnswerPair.query.count() + sum(summary['qa_count'] for summary in archived.values()),
+            'total_feedback': Feedback.query.count() + sum(summary['feedback_count'] for summary in archived.values())
+        },
+        'rows': {
+            'dataset': {dataset_id: {
+                'qa_count': qa_counts.get(dataset_id, 0),
+                'feedback_count': feedback_counts.get(dataset_id, 0),
+                'user_count': dataset_users.get(dataset_id, 0)
+            } for dataset_id in db.session.execute(datasets).scalars()},
+            'user': {user_id: {
+                'feedback_count': user_feedback.get(user_id, 0) + _archived_user_feedback(archived, user_id),
+                'dataset_count': user_datasets.get(user_id, 0)
+            } for user_id in db.session.execute(users).scalars()}
+        }
+    }
+
+
+def reviewer_stats(user, dataset_ids=None):
+    """Totals plus per-dataset counts of the user's own work for the datasets page
+
+    Admins see every dataset, everyone else the datasets they were granted.
+    Archived datasets are counted from the summaries kept on their stubs.
+    """
+    qa_table = QuestionAnswerPair.__table__
+    feedback_table = Feedback.__table__
+    feedback_with_pair = feedback_table.join(qa_table, feedback_table.c.qa_pair_id == qa_table.c.id)
+
+    if user.is_admin():
+        visible = set(db.session.execute(select(Dataset.id)).scalars())
+    else:
+        visible = _accessible_dataset_ids(user.id)
+    if dataset_ids is not None:
+        visible &= set(dataset_ids)
+
+    own = (feedback_table.c.user_id == user.id) & qa_table.c.dataset_id.in_(visible)
+    qa_counts = _count_by(qa_table.c.dataset_id, where=qa_table.c.dataset_id.in_(visible))
+    feedback_counts = _count_by(qa_table.c.dataset_id, feedback_with_pair, own)
+    # Pairs with a gold standard from the user, however many feedback rows carry one
+    gold_counts = dict(db.session.execute(
+        select(qa_table.c.dataset_id, func.count(func.distinct(qa_table.c.id))).select_from(feedback_with_pair).where(
+            own, feedback_table.c.gold_standard_answer.isnot(None), feedback_table.c.gold_standard_answer != ''
+        ).group_by(qa_table.c.dataset_id)
+    ).all())
+
+    for dataset_id, summary in _archived_summaries().items():
+        if dataset_id in visible:
+            own_archived = summary['reviewers'].get(str(user.id), {})
+            qa_counts[dataset_id] = summary['qa_count']
+            feedback_counts[dataset_id] = own_archived.get('feedback', 0)
+            gold_counts[dataset_id] = own_archived.get('gold', 0)
+
+    rows = {dataset_id: {
+        'qa_count': qa_counts.get(dataset_id, 0),
+        'user_feedback_count': feedback_counts.get(dataset_id, 0),
+        'user_gold_standards': gold_counts.get(dataset_id, 0)
+    } for dataset_id in sorted(visible)}
+    return {
+        'totals': {
+            'total_datasets': len(rows),
+            'total_qa_pairs': sum(row['qa_count'] for row in rows.values()),
+            'user_feedback_count': sum(row['user_feedback_count'] for row in rows.values()),
+            'user_gold_standards': sum(row['user_gold_standards'] for row in rows.values())
+        },
+        'rows': {'dataset': rows}
+    }
+
+
+def init_live(app):
+    """Hand committed events to open streams"""
+    _install_listeners()
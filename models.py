@@ -1,8 +1,42 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from replica import RoutingSession
 
-db = SQLAlchemy()
+# Reads of @read_replica views go to the optional replica bind (see replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Backfills for columns added to tables that may already exist in deployed databases
+COLUMN_BACKFILLS = {
+    ('question_answer_pair', 'updated_at'): 'UPDATE question_answer_pair SET updated_at = created_at WHERE updated_at IS NULL',
+    ('feedback', 'updated_at'): 'UPDATE feedback SET updated_at = submitted_at WHERE updated_at IS NULL',
+    ('dataset', 'target_overlap'): 'UPDATE dataset SET target_overlap = 2 WHERE target_overlap IS NULL',
+    ('dataset', 'revision'): 'UPDATE dataset SET revision = 1 WHERE revision IS NULL',
+    ('question_answer_pair', 'revision'): 'UPDATE question_answer_pair SET revision = 1 WHERE revision IS NULL',
+    ('feedback', 'answer_revision'): 'UPDATE feedback SET answer_revision = 1 WHERE answer_revision IS NULL',
+}
+
+def upgrade_schema():
+    """Create missing tables, then add columns and indexes introduced since a table was created"""
+    db.create_all()
+    inspector = db.inspect(db.engine)
+    
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                backfill = COLUMN_BACKFILLS.get((table.name, column.name))
+                if backfill:
+                    connection.execute(db.text(backfill))
+            
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
 
 # Association table for user-dataset access
 user_dataset_access = db.Table('user_dataset_access',
@@ -16,12 +50,29 @@ class Dataset(db.Model):
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Number of reviewers the work scheduler aims to assign to each Q&A pair
+    target_overlap = db.Column(db.Integer, nullable=False, default=2)
+    
+    # Incremented by every revision upload that changes the dataset's answers
+    revision = db.Column(db.Integer, nullable=False, default=1)
+
+    # Set while the dataset's pairs and feedback live in a cold storage archive (see cold_storage.py)
+    archived_at = db.Column(db.DateTime, nullable=True)
+    archive_path = db.Column(db.String(255), nullable=True)  # Directory under ARCHIVE_DIR
+    archive_summary = db.Column(db.Text, nullable=True)  # JSON counts and score means kept for the stub
+    # Last time the dataset was loaded back from cold storage; incremental snapshots cannot capture that
+    rehydrated_at = db.Column(db.DateTime, nullable=True)
+
     # Relationship to Q&A pairs
     qa_pairs = db.relationship('QuestionAnswerPair', backref='dataset', lazy=True)
     
     # Relationship to users who have access to this dataset
     authorized_users = db.relationship('User', secondary=user_dataset_access, back_populates='accessible_datasets')
-    
+
+    def is_archived(self):
+        """Check if the dataset's pairs and feedback were moved to cold storage"""
+        return self.archived_at is not None
+
     def __repr__(self):
         return f'<Dataset {self.name}>'
 
@@ -57,12 +108,20 @@ class User(UserMixin, db.Model):
         return f'<User {self.username}>'
 
 class QuestionAnswerPair(db.Model):
+    # Dataset listings filter by dataset and order newest first
+    __table_args__ = (
+        db.Index('ix_question_answer_pair_dataset_created', 'dataset_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     dataset_id = db.Column(db.Integer, db.ForeignKey('dataset.id'), nullable=False)
     question_text = db.Column(db.Text, nullable=False)
     system_answer_text = db.Column(db.Text, nullable=False)
     original_qa_id = db.Column(db.String(255), nullable=True)  # User-provided ID
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 of normalised question and answer
+    revision = db.Column(db.Integer, nullable=False, default=1)  # Dataset revision that introduced the current answer
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationship to feedback
     feedback = db.relationship('Feedback', backref='qa_pair', lazy=True)
@@ -71,6 +130,11 @@ class QuestionAnswerPair(db.Model):
         return f'<QuestionAnswerPair {self.id}>'
 
 class Feedback(db.Model):
+    # Per-reviewer status queries aggregate one user's feedback by pair
+    __table_args__ = (
+        db.Index('ix_feedback_user_qa_pair', 'user_id', 'qa_pair_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     qa_pair_id = db.Column(db.Integer, db.ForeignKey('question_answer_pair.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Optional for now
@@ -87,7 +151,79 @@ class Feedback(db.Model):
     # Gold standard answer (edited version)
     gold_standard_answer = db.Column(db.Text, nullable=True)
     
+    # Revision of the Q&A pair's answer this feedback judged (see AnswerRevision)
+    answer_revision = db.Column(db.Integer, nullable=False, default=1)
+    
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f'<Feedback {self.id} for QA {self.qa_pair_id}>'
+
+class FeedbackMetric(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    feedback_id = db.Column(db.Integer, db.ForeignKey('feedback.id'), unique=True, nullable=False)
+    qa_pair_id = db.Column(db.Integer, db.ForeignKey('question_answer_pair.id'), nullable=False, index=True)
+    
+    # Similarity between the system answer and the gold standard answer
+    token_f1 = db.Column(db.Float, nullable=False)
+    rouge_l = db.Column(db.Float, nullable=False)
+    edit_distance = db.Column(db.Float, nullable=False)  # Normalized token-level Levenshtein
+    
+    # Fingerprint of the texts the metrics were computed from
+    input_hash = db.Column(db.String(40), nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<FeedbackMetric for Feedback {self.feedback_id}>'
+
+# A reviewer's lease on a Q&A pair, handed out by the work scheduler
+class ReviewAssignment(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('qa_pair_id', 'user_id', name='uq_review_assignment_qa_pair_user'),
+        db.Index('ix_review_assignment_dataset_user', 'dataset_id', 'user_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('dataset.id'), nullable=False)
+    qa_pair_id = db.Column(db.Integer, db.ForeignKey('question_answer_pair.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    completed_at = db.Column(db.DateTime, nullable=True)  # Set when the reviewer submits feedback
+    
+    def __repr__(self):
+        return f'<ReviewAssignment QA {self.qa_pair_id} to User {self.user_id}>'
+
+# A superseded answer of a Q&A pair, kept when a revision upload replaces it
+class AnswerRevision(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('qa_pair_id', 'revision', name='uq_answer_revision_qa_pair_revision'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    qa_pair_id = db.Column(db.Integer, db.ForeignKey('question_answer_pair.id'), nullable=False)
+    revision = db.Column(db.Integer, nullable=False)
+    system_answer_text = db.Column(db.Text, nullable=False)
+    question_text = db.Column(db.Text, nullable=True)  # Only stored when the revision also changed the question
+    content_hash = db.Column(db.String(64), nullable=True)
+    superseded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AnswerRevision {self.revision} of QA {self.qa_pair_id}>'
+
+# A change pushed to live dashboards (see live.py); pruned after LIVE_EVENT_RETENTION_HOURS
+class LiveEvent(db.Model):
+    # Ids are stream positions, so SQLite must never reuse them after pruning
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False)
+    dataset_id = db.Column(db.Integer, nullable=True)  # No foreign keys: events outlive what they describe
+    user_id = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<LiveEvent {self.id} {self.kind}>'
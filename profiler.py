@@ -0,0 +1,237 @@
+"""
+On-demand request profiling for admins.
+
+An admin adds `?_profile=1` to a URL (or sends `X-Profile: 1`) and that one
+request runs under cProfile while every SQL statement it executes is timed.
+The report (slowest functions, statements grouped by text, totals) is saved
+as JSON under PROFILE_DIR and its id returned in the X-Profile-Id header; the
+admin profile endpoints list and show saved reports. Only the newest
+PROFILE_MAX_REPORTS reports are kept, and the directory is shared by all
+workers on the host.
+
+Without the trigger the cost is one argument lookup per request and one
+integer check per SQL statement. Work done while a streamed response is
+being sent happens after the report is written and is not included.
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from flask import g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_MAX_REPORTS = 50
+
+# Functions and distinct statements listed per report
+TOP_FUNCTIONS = 40
+TOP_STATEMENTS = 50
+MAX_STATEMENT_LENGTH = 2000
+
+TRIGGER_PARAM = '_profile'
+TRIGGER_HEADER = 'X-Profile'
+
+_REPORT_ID = re.compile(r'^[0-9]{16}-[0-9a-f]{8}$')
+
+# Requests being profiled in this process; SQL hooks return immediately at zero
+_active = 0
+_active_lock = threading.Lock()
+_listeners_installed = False
+
+
+def profile_root(app):
+    """Directory holding saved profile reports"""
+    root = app.config.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'qa_feedback_profiles')
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _set_active(delta):
+    global _active
+    with _active_lock:
+        _active += delta
+
+
+def _current_profile():
+    if not _active or not has_request_context():
+        return None
+    return g.get('profile')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile() is not None:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile()
+    if profile is None:
+        return
+    starts = conn.info.get('profile_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    profile['statements'].append((statement, elapsed, executemany))
+
+
+def _install_listeners():
+    global _listeners_installed
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
+
+
+def _requested():
+    return request.args.get(TRIGGER_PARAM) or request.headers.get(TRIGGER_HEADER)
+
+
+def _function_rows(profiler):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (primitive_calls, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f'{filename}:{line}({name})',
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'total_ms': round(total * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3)
+        })
+    rows.sort(key=lambda row: -row['cumulative_ms'])
+    return rows[:TOP_FUNCTIONS]
+
+
+def _statement_rows(statements):
+    grouped = {}
+    for statement, elapsed, executemany in statements:
+        entry = grouped.setdefault(statement, {
+            'statement': statement[:MAX_STATEMENT_LENGTH], 'count': 0, 'total_ms': 0.0,
+            'max_ms': 0.0, 'executemany': executemany
+        })
+        entry['count'] += 1
+        entry['total_ms'] += elapsed * 1000
+        entry['max_ms'] = max(entry['max_ms'], elapsed * 1000)
+    rows = sorted(grouped.values(), key=lambda row: -row['total_ms'])
+    for row in rows:
+        row['total_ms'] = round(row['total_ms'], 3)
+        row['max_ms'] = round(row['max_ms'], 3)
+    return rows[:TOP_STATEMENTS]
+
+
+def _build_report(profile, status, error=None):
+    statements = profile['statements']
+    return {
+        'id': profile['id'],
+        'created_at': profile['created_at'],
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'user': profile['user'],
+        'status': status,
+        'error': error,
+        'duration_ms': round((time.perf_counter() - profile['start']) * 1000, 3),
+        'sql_count': len(statements),
+        'sql_total_ms': round(sum(elapsed for _, elapsed, _ in statements) * 1000, 3),
+        'sql_distinct': len({statement for statement, _, _ in statements}),
+        'statements': _statement_rows(statements),
+        'functions': _function_rows(profile['profiler'])
+    }
+
+
+def save_report(root, report, max_reports=DEFAULT_MAX_REPORTS):
+    """Write a report and drop the oldest beyond max_reports"""
+    path = os.path.join(root, f'{report["id"]}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(report, f)
+    os.replace(path + '.tmp', path)
+
+    # Ids start with a fixed-width timestamp, so name order is age order
+    names = sorted(name for name in os.listdir(root) if name.endswith('.json'))
+    for name in names[:max(0, len(names) - max_reports)]:
+        try:
+            os.remove(os.path.join(root, name))
+        except OSError:
+            pass  # Another worker removed it first
+
+
+def list_reports(root):
+    """Summaries of saved reports, newest first"""
+    summaries = []
+    for name in sorted(os.listdir(root), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(root, name)) as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue  # Removed or being written concurrently
+        summaries.append({key: report.get(key) for key in (
+            'id', 'created_at', 'method', 'path', 'user', 'status', 'duration_ms', 'sql_count', 'sql_total_ms'
+        )})
+    return summaries
+
+
+def load_report(root, report_id):
+    """A saved report, or None"""
+    if not _REPORT_ID.match(report_id or ''):
+        return None
+    try:
+        with open(os.path.join(root, f'{report_id}.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def init_profiler(app):
+    """Profile requests from admins that ask for it"""
+    _install_listeners()
+
+    def finish(status, error=None):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return None
+        profile['profiler'].disable()
+        _set_active(-1)
+        report = _build_report(profile, status, error)
+        save_report(profile_root(app), report, app.config.get('PROFILE_MAX_REPORTS', DEFAULT_MAX_REPORTS))
+        return report
+
+    @app.before_request
+    def start_profile():
+        if not _requested():
+            return
+        if not current_user.is_authenticated or not current_user.is_admin():
+            return
+        profiler = cProfile.Profile()
+        g.profile = {
+            'id': f'{time.time_ns() // 1000:016d}-{secrets.token_hex(4)}',
+            'created_at': datetime.utcnow().isoformat(),
+            'user': current_user.username,
+            'start': time.perf_counter(),
+            'statements': [],
+            'profiler': profiler
+        }
+        _set_active(1)
+        profiler.enable()
+
+    @app.after_request
+    def finish_profile(response):
+        report = finish(response.status_code)
+        if report is not None:
+            response.headers['X-Profile-Id'] = report['id']
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        # after_request does not run when the view raised
+        if g.get('profile') is not None:
+            finish(500, repr(exc) if exc else None)
@@ -0,0 +1,247 @@
+"""
+Read models for list and export paths.
+
+These queries select only the columns a view needs and return lightweight
+named tuples instead of ORM objects, so large datasets are not loaded into
+the session identity map and long text columns are only transferred where
+they are actually displayed.
+"""
+
+from collections import namedtuple
+from itertools import groupby
+
+from sqlalchemy import and_, case, func, or_, select, exists
+
+from models import db, Feedback, QuestionAnswerPair, User
+
+PREVIEW_LENGTH = 100
+BATCH_SIZE = 2000
+# Pair ids per IN lookup
+LOOKUP_CHUNK_SIZE = 500
+
+# Review status codes used by the compact list index (order matters to the UI)
+REVIEW_STATUSES = ['pending', 'feedback', 'gold', 'completed']
+
+
+QAListRow = namedtuple('QAListRow', [
+    'id', 'question_preview', 'question_truncated', 'created_at', 'feedback_count', 'has_gold_standard'
+])
+
+QARecord = namedtuple('QARecord', [
+    'id', 'original_qa_id', 'question_text', 'system_answer_text', 'created_at'
+])
+
+FeedbackRecord = namedtuple('FeedbackRecord', [
+    'id', 'user_id', 'username', 'submitted_at', 'text_feedback',
+    'accuracy_score', 'completeness_score', 'clarity_score', 'clinical_relevance_score',
+    'gold_standard_answer'
+])
+
+
+def user_feedback_summary(user_id):
+    """Per-pair feedback count and gold standard flag for one user, as a subquery"""
+    return select(
+        Feedback.qa_pair_id,
+        func.count(Feedback.id).label('feedback_count'),
+        func.max(case((Feedback.gold_standard_answer != '', 1), else_=0)).label('has_gold_standard')
+    ).where(Feedback.user_id == user_id).\
+        group_by(Feedback.qa_pair_id).subquery()
+
+
+def status_code_expression(summary):
+    """SQL expression computing review_status() from a user_feedback_summary() join"""
+    feedback_count = func.coalesce(summary.c.feedback_count, 0)
+    has_gold = func.coalesce(summary.c.has_gold_standard, 0)
+    return case(
+        (and_(feedback_count > 0, has_gold == 1), 3),
+        (has_gold == 1, 2),
+        (feedback_count > 0, 1),
+        else_=0
+    )
+
+
+def parse_statuses(value):
+    """Parse a comma-separated status filter into status codes (None for no filter)"""
+    if not value:
+        return None
+    names = [name.strip().lower() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in REVIEW_STATUSES]
+    if unknown:
+        raise ValueError(f'Invalid status: {", ".join(unknown)}. Use {", ".join(REVIEW_STATUSES)}')
+    return sorted({REVIEW_STATUSES.index(name) for name in names})
+
+
+def _status_filter(summary, statuses):
+    codes = [code for code in statuses if code != 0]
+    conditions = []
+    if 0 in statuses:
+        # Pending is an anti-join: no feedback row from this user for the pair
+        conditions.append(summary.c.qa_pair_id.is_(None))
+    if codes:
+        conditions.append(status_code_expression(summary).in_(codes))
+    return or_(*conditions)
+
+
+def status_facets(dataset_id, user_id):
+    """Number of pairs in each review status for one user, counted in SQL"""
+    summary = user_feedback_summary(user_id)
+    code = status_code_expression(summary)
+    rows = db.session.execute(
+        select(code, func.count(QuestionAnswerPair.id)).
+        outerjoin(summary, summary.c.qa_pair_id == QuestionAnswerPair.id).
+        where(QuestionAnswerPair.dataset_id == dataset_id).
+        group_by(code)
+    )
+    counts = dict.fromkeys(REVIEW_STATUSES, 0)
+    for status, count in rows:
+        counts[REVIEW_STATUSES[status]] = count
+    return counts
+
+
+def qa_list_rows(dataset_id, user_id, preview_length=PREVIEW_LENGTH, statuses=None, limit=None, offset=0):
+    """List rows for a dataset with the user's review status, newest first"""
+    summary = user_feedback_summary(user_id)
+    query = select(
+        QuestionAnswerPair.id,
+        func.substr(QuestionAnswerPair.question_text, 1, preview_length),
+        func.length(QuestionAnswerPair.question_text) > preview_length,
+        QuestionAnswerPair.created_at,
+        func.coalesce(summary.c.feedback_count, 0),
+        func.coalesce(summary.c.has_gold_standard, 0)
+    ).outerjoin(summary, summary.c.qa_pair_id == QuestionAnswerPair.id).\
+        where(QuestionAnswerPair.dataset_id == dataset_id).\
+        order_by(QuestionAnswerPair.created_at.desc(), QuestionAnswerPair.id.desc())
+    if statuses is not None:
+        query = query.where(_status_filter(summary, statuses))
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+
+    return [
+        QAListRow(qa_id, preview or '', bool(truncated), created_at, feedback_count, bool(has_gold))
+        for qa_id, preview, truncated, created_at, feedback_count, has_gold in db.session.execute(query)
+    ]
+
+
+def review_status(feedback_count, has_gold_standard):
+    """Status code of a pair for one reviewer"""
+    if feedback_count > 0 and has_gold_standard:
+        return 3  # completed
+    if has_gold_standard:
+        return 2  # gold
+    if feedback_count > 0:
+        return 1  # feedback
+    return 0  # pending
+
+
+def qa_status_index(dataset_id, user_id, statuses=None):
+    """Compact columnar index of a dataset's pairs and the user's review status, newest first"""
+    summary = user_feedback_summary(user_id)
+    query = select(
+        QuestionAnswerPair.id,
+        func.coalesce(summary.c.feedback_count, 0),
+        func.coalesce(summary.c.has_gold_standard, 0)
+    ).outerjoin(summary, summary.c.qa_pair_id == QuestionAnswerPair.id).\
+        where(QuestionAnswerPair.dataset_id == dataset_id).\
+        order_by(QuestionAnswerPair.created_at.desc(), QuestionAnswerPair.id.desc())
+    if statuses is not None:
+        query = query.where(_status_filter(summary, statuses))
+
+    ids, status, feedback_counts = [], [], []
+    counts = [0] * len(REVIEW_STATUSES)
+    for qa_id, feedback_count, has_gold in db.session.execute(query):
+        code = review_status(feedback_count, has_gold)
+        ids.append(qa_id)
+        status.append(code)
+        feedback_counts.append(feedback_count)
+        counts[code] += 1
+
+    return {
+        'dataset_id': dataset_id,
+        'statuses': REVIEW_STATUSES,
+        'filter': [REVIEW_STATUSES[code] for code in statuses] if statuses is not None else None,
+        'ids': ids,
+        'status': status,
+        'feedback_counts': feedback_counts,
+        # Counts always cover the whole dataset, so a filtered list keeps its totals
+        'counts': dict(zip(REVIEW_STATUSES, counts)) if statuses is None else status_facets(dataset_id, user_id)
+    }
+
+
+def question_previews(dataset_id, qa_ids, preview_length=PREVIEW_LENGTH):
+    """Question previews for a window of pairs in a dataset"""
+    rows = db.session.execute(select(
+        QuestionAnswerPair.id,
+        func.substr(QuestionAnswerPair.question_text, 1, preview_length),
+        func.length(QuestionAnswerPair.question_text) > preview_length
+    ).where(QuestionAnswerPair.dataset_id == dataset_id, QuestionAnswerPair.id.in_(qa_ids)))
+    return {qa_id: (preview or '') + ('...' if truncated else '') for qa_id, preview, truncated in rows}
+
+
+def qa_texts(dataset_id, qa_ids):
+    """Full question and answer texts of the listed pairs in a dataset, as {id: (question, answer)}"""
+    texts = {}
+    for start in range(0, len(qa_ids), LOOKUP_CHUNK_SIZE):
+        texts.update((qa_id, (question, answer)) for qa_id, question, answer in db.session.execute(select(
+            QuestionAnswerPair.id,
+            QuestionAnswerPair.question_text,
+            QuestionAnswerPair.system_answer_text
+        ).where(QuestionAnswerPair.dataset_id == dataset_id,
+                QuestionAnswerPair.id.in_(qa_ids[start:start + LOOKUP_CHUNK_SIZE]))))
+    return texts
+
+
+def qa_feedback_query(dataset_id=None, selected_user_ids=None):
+    """Q&A pairs outer-joined to their feedback, ordered by pair then feedback id"""
+    feedback_join = Feedback.qa_pair_id == QuestionAnswerPair.id
+    if selected_user_ids is not None:
+        feedback_join = and_(feedback_join, Feedback.user_id.in_(selected_user_ids))
+
+    query = select(
+        QuestionAnswerPair.id,
+        QuestionAnswerPair.original_qa_id,
+        QuestionAnswerPair.question_text,
+        QuestionAnswerPair.system_answer_text,
+        QuestionAnswerPair.created_at,
+        Feedback.id,
+        Feedback.user_id,
+        User.username,
+        Feedback.submitted_at,
+        Feedback.text_feedback,
+        Feedback.accuracy_score,
+        Feedback.completeness_score,
+        Feedback.clarity_score,
+        Feedback.clinical_relevance_score,
+        Feedback.gold_standard_answer
+    ).select_from(QuestionAnswerPair).\
+        outerjoin(Feedback, feedback_join).\
+        outerjoin(User, Feedback.user_id == User.id)
+    if dataset_id is not None:
+        query = query.where(QuestionAnswerPair.dataset_id == dataset_id)
+    return query.order_by(QuestionAnswerPair.id, Feedback.id)
+
+
+def iter_qa_with_feedback(dataset_id=None, selected_user_ids=None, batch_size=BATCH_SIZE):
+    """Yield (QARecord, [FeedbackRecord, ...]) from a single streamed query"""
+    result = db.session.execute(
+        qa_feedback_query(dataset_id, selected_user_ids),
+        execution_options={'yield_per': batch_size}
+    )
+    return group_qa_feedback(result)
+
+
+def group_qa_feedback(rows):
+    """Yield (QARecord, [FeedbackRecord, ...]) from qa_feedback_query() rows ordered by pair"""
+    for _, rows in groupby(rows, key=lambda row: row[0]):
+        rows = list(rows)
+        qa = QARecord._make(rows[0][:5])
+        feedback = [FeedbackRecord._make(row[5:]) for row in rows if row[5] is not None]
+        yield qa, feedback
+
+
+def dataset_has_original_ids(dataset_id):
+    """Whether any pair in the dataset carries a user-provided ID"""
+    return db.session.query(exists().where(
+        QuestionAnswerPair.dataset_id == dataset_id,
+        QuestionAnswerPair.original_qa_id.isnot(None),
+        QuestionAnswerPair.original_qa_id != ''
+    )).scalar()
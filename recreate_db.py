@@ -4,12 +4,13 @@ Script to recreate the database with the new schema including dataset support.
 """
 
 import os
-from app import app
+from app import create_app
 from models import db
 
 def recreate_database():
     """Drop and recreate the database with new schema."""
     
+    app = create_app()
     with app.app_context():
         # Drop all existing tables
         db.drop_all()
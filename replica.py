@@ -0,0 +1,79 @@
+"""
+Optional read-replica routing.
+
+When DATABASE_REPLICA_URL is set it is configured as the 'replica' bind.
+View functions decorated with @read_replica run their queries against the
+replica; everything else, and any write or locking statement even inside a
+read-only view, goes to the primary. After a client's request writes to the
+primary, its reads stay on the primary for REPLICA_STICKY_SECONDS (a
+timestamp in the signed session cookie), so users always see their own
+writes despite replication lag.
+
+The change feed stays on the primary: its settle window is not designed for
+an arbitrarily lagging replica.
+"""
+
+import time
+from functools import wraps
+
+from flask import g, has_request_context, session as cookie_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+REPLICA_BIND = 'replica'
+DEFAULT_STICKY_SECONDS = 10
+
+_STICKY_KEY = '_primary_until'
+
+
+def _is_write(clause):
+    """Statements that must run on the primary: DML, raw SQL and SELECT ... FOR UPDATE"""
+    if clause is None:
+        return False
+    if isinstance(clause, (UpdateBase, TextClause)):
+        return True
+    return getattr(clause, '_for_update_arg', None) is not None
+
+
+def _reading_from_replica():
+    return has_request_context() and g.get('db_route') == REPLICA_BIND
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends reads of @read_replica views to the replica bind"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (self._flushing or _is_write(clause)):
+            if has_request_context():
+                g.db_wrote = True
+        elif bind is None and _reading_from_replica():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_configured(app):
+    return REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def read_replica(f):
+    """Run a read-only view against the replica unless the client wrote recently"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if cookie_session.get(_STICKY_KEY, 0) <= time.time():
+            g.db_route = REPLICA_BIND
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def init_replica(app):
+    """Keep clients on the primary for a while after their writes"""
+    sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        if g.get('db_wrote') and replica_configured(app):
+            cookie_session[_STICKY_KEY] = time.time() + sticky_seconds
+        return response
@@ -0,0 +1,199 @@
+"""
+Revision uploads: replace a dataset's answers in place after a rerun.
+
+Incoming rows are matched to existing pairs by original_qa_id with one query
+that loads the dataset's (original id, pair id, content hash) triples into a
+dict; comparing content hashes splits the rows into inserted, changed and
+unchanged sets without per-row queries. Changes are applied as bulk
+statements: superseded answers are copied to answer_revision, changed pairs
+are updated with one executemany UPDATE and new pairs are added with
+multi-row INSERTs. Pairs missing from the upload are reported, not deleted.
+
+Feedback records the revision of the answer it judged (answer_revision), so
+with the history table it stays tied to that answer after a revision.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from dedup import backfill_content_hashes
+from ingestion import INSERT_BATCH_SIZE, IngestionError
+from live import publish
+from models import db, AnswerRevision, Feedback, QuestionAnswerPair
+
+# Pair ids per IN lookup
+LOOKUP_CHUNK_SIZE = 500
+
+MAX_REPORTED_IDS = 20
+
+
+def _chunks(items, size=LOOKUP_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def plan_revision(dataset, qa_pairs_data):
+    """Split parsed rows into inserted, changed and unchanged against the dataset's pairs
+
+    Raises IngestionError when the dataset is archived (its pairs are not in
+    the database to match against) or when rows cannot be matched
+    unambiguously: every row needs an id, ids must be unique in the file and
+    among the dataset's pairs.
+    """
+    if dataset.is_archived():
+        raise IngestionError('Dataset is archived; rehydrate it before uploading a revision')
+    missing_ids = [index + 1 for index, qa_data in enumerate(qa_pairs_data) if not qa_data.get('original_id')]
+    if missing_ids:
+        raise IngestionError(f'Revision uploads need an "id" for every row; {len(missing_ids)} rows have none '
+                             f'(e.g. items {", ".join(map(str, missing_ids[:5]))})')
+    incoming = {}
+    for qa_data in qa_pairs_data:
+        if qa_data['original_id'] in incoming:
+            raise IngestionError(f'Duplicate id "{qa_data["original_id"]}" in the file')
+        incoming[qa_data['original_id']] = qa_data
+
+    backfill_content_hashes()
+    existing = {}
+    ambiguous = set()
+    for original_id, qa_id, hash_value in db.session.execute(
+        select(QuestionAnswerPair.original_qa_id, QuestionAnswerPair.id, QuestionAnswerPair.content_hash).
+        where(QuestionAnswerPair.dataset_id == dataset.id, QuestionAnswerPair.original_qa_id.isnot(None))
+    ):
+        if original_id in existing:
+            ambiguous.add(original_id)
+        existing[original_id] = (qa_id, hash_value)
+    if ambiguous:
+        examples = ', '.join(f'"{original_id}"' for original_id in sorted(ambiguous)[:5])
+        raise IngestionError(f'{len(ambiguous)} ids are used by several pairs in this dataset (e.g. {examples})')
+
+    inserted, changed, unchanged = [], [], []
+    for original_id, qa_data in incoming.items():
+        match = existing.get(original_id)
+        if match is None:
+            inserted.append(qa_data)
+        elif match[1] != qa_data['content_hash']:
+            changed.append((match[0], qa_data))
+        else:
+            unchanged.append(match[0])
+    missing = sorted(original_id for original_id in existing if original_id not in incoming)
+    return {'inserted': inserted, 'changed': changed, 'unchanged': unchanged, 'missing': missing}
+
+
+def revision_summary(plan):
+    """Counts of a revision plan, with the feedback that judged answers about to change"""
+    changed_ids = [qa_id for qa_id, _ in plan['changed']]
+    feedback_on_changed = 0
+    for chunk in _chunks(changed_ids):
+        feedback_on_changed += db.session.execute(
+            select(func.count(Feedback.id)).where(Feedback.qa_pair_id.in_(chunk))
+        ).scalar()
+    return {
+        'inserted': len(plan['inserted']),
+        'changed': len(plan['changed']),
+        'unchanged': len(plan['unchanged']),
+        'missing': len(plan['missing']),
+        'missing_examples': plan['missing'][:MAX_REPORTED_IDS],
+        'changed_examples': [qa_data['original_id'] for _, qa_data in plan['changed'][:MAX_REPORTED_IDS]],
+        'feedback_on_changed': feedback_on_changed
+    }
+
+
+def apply_revision(dataset, plan):
+    """Apply a revision plan to the dataset and commit; returns the summary with the new revision number"""
+    summary = revision_summary(plan)
+    if not plan['inserted'] and not plan['changed']:
+        summary['revision'] = dataset.revision
+        return summary
+
+    revision = (dataset.revision or 1) + 1
+    now = datetime.utcnow()
+    table = QuestionAnswerPair.__table__
+    incoming = {qa_id: qa_data for qa_id, qa_data in plan['changed']}
+
+    for chunk in _chunks(sorted(incoming)):
+        # Keep the superseded answers; the question only when it changes too
+        old_rows = db.session.execute(
+            select(table.c.id, table.c.question_text, table.c.system_answer_text, table.c.content_hash, table.c.revision).
+            where(table.c.id.in_(chunk))
+        ).all()
+        db.session.execute(insert(AnswerRevision), [
+            {
+                'qa_pair_id': qa_id,
+                'revision': old_revision or 1,
+                'system_answer_text': answer,
+                'question_text': question if question != incoming[qa_id]['question'] else None,
+                'content_hash': hash_value,
+                'superseded_at': now
+            }
+            for qa_id, question, answer, hash_value, old_revision in old_rows
+        ])
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('qa_id')).values(
+                question_text=bindparam('question'),
+                system_answer_text=bindparam('answer'),
+                content_hash=bindparam('hash'),
+                revision=revision,
+                updated_at=now
+            ),
+            [
+                {
+                    'qa_id': qa_id,
+                    'question': incoming[qa_id]['question'],
+                    'answer': incoming[qa_id]['answer'],
+                    'hash': incoming[qa_id]['content_hash']
+                }
+                for qa_id in chunk
+            ]
+        )
+
+    for start in range(0, len(plan['inserted']), INSERT_BATCH_SIZE):
+        db.session.execute(insert(QuestionAnswerPair), [
+            {
+                'dataset_id': dataset.id,
+                'question_text': qa_data['question'],
+                'system_answer_text': qa_data['answer'],
+                'original_qa_id': qa_data['original_id'],
+                'content_hash': qa_data['content_hash'],
+                'revision': revision,
+                'created_at': qa_data.get('timestamp') or now,
+                'updated_at': now
+            }
+            for qa_data in plan['inserted'][start:start + INSERT_BATCH_SIZE]
+        ])
+
+    dataset.revision = revision
+    publish('dataset_revised', dataset_id=dataset.id, revision=revision,
+            inserted=len(plan['inserted']), changed=len(plan['changed']))
+    db.session.commit()
+    summary['revision'] = revision
+    return summary
+
+
+def answer_history(qa_pair):
+    """Current and superseded answers of a pair, newest first, with the feedback given on each"""
+    feedback_counts = dict(db.session.execute(
+        select(Feedback.answer_revision, func.count(Feedback.id)).
+        where(Feedback.qa_pair_id == qa_pair.id).group_by(Feedback.answer_revision)
+    ).all())
+    history = [{
+        'revision': qa_pair.revision,
+        'current': True,
+        'question': qa_pair.question_text,
+        'answer': qa_pair.system_answer_text,
+        'since': qa_pair.updated_at.isoformat() if qa_pair.updated_at else None,
+        'feedback_count': feedback_counts.get(qa_pair.revision, 0)
+    }]
+    # A revision stores its question only when the next one changed it
+    question = qa_pair.question_text
+    for previous in AnswerRevision.query.filter_by(qa_pair_id=qa_pair.id).order_by(AnswerRevision.revision.desc()):
+        question = previous.question_text or question
+        history.append({
+            'revision': previous.revision,
+            'current': False,
+            'question': question,
+            'answer': previous.system_answer_text,
+            'superseded_at': previous.superseded_at.isoformat() if previous.superseded_at else None,
+            'feedback_count': feedback_counts.get(previous.revision, 0)
+        })
+    return history
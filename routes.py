@@ -1,15 +1,92 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify, abort, send_file
+from flask import render_template, request, redirect, url_for, flash, jsonify, abort, send_file, Response, stream_with_context
 from flask_login import login_user, login_required, logout_user, current_user
-from models import QuestionAnswerPair, Feedback, User, Dataset, db
+from models import QuestionAnswerPair, Feedback, FeedbackMetric, ReviewAssignment, User, Dataset, db
 from forms import FeedbackForm, LoginForm, RegisterForm
+from text_metrics import refresh_dataset_metrics, dataset_metrics_summary
+from exports import EXPORT_FORMATS, STREAMING_FORMATS, ExportError, stream_export, iter_json_export, iter_csv_export, export_mimetype_and_extension
+from read_models import REVIEW_STATUSES, qa_list_rows, qa_status_index, question_previews, qa_texts, parse_statuses, status_facets, iter_qa_with_feedback
+from access_control import AccessImportError, grant_access, revoke_access, grant_pairs, revoke_pairs, parse_access_csv, available_datasets, available_users, dataset_user_ids
+from ingestion import SUPPORTED_EXTENSIONS, ARCHIVE_EXTENSIONS, IngestionError, parse_dataset_file, timestamp_warning, create_dataset, ingest_archive
+from dedup import DUPLICATE_MODES, find_duplicates, duplicate_message
+from revisions import plan_revision, revision_summary, apply_revision, answer_history
+from uploads import UploadError, UploadNotFound, staging_root, create_upload, load_upload, upload_status, write_chunk, assemble, remove_upload
+from scheduler import SchedulerError, claim_next, release, complete_assignment, set_target_overlap, dataset_progress, assignment_to_dict
+from replica import read_replica
+from profiler import profile_root, list_reports, load_report
+from backup import BackupError, SnapshotLock, backup_root, list_snapshots, create_snapshot
+from cold_storage import ColdStorageError, archive_root, archive_dataset, rehydrate_dataset, list_archives, remove_archive, delete_dataset_rows, archive_summary, iter_archived_qa_with_feedback
+from changefeed import CursorError, DEFAULT_LIMIT, MAX_LIMIT, decode_cursor, cursor_from_watermark, stream_changes
+from admission import defer_to_interactive
+from live import publish, event_stream, acquire_stream_slot, release_stream_slot, latest_event_id, admin_stats, reviewer_stats
 from functools import wraps
 from datetime import datetime
-import json
-import csv
 import io
+import itertools
 import os
+import tempfile
+import threading
 from werkzeug.utils import secure_filename
 
+def parse_id_list(value):
+    """Validate a JSON list of integer ids, returning None if it is not one"""
+    if not isinstance(value, list) or not all(isinstance(item, int) and not isinstance(item, bool) for item in value):
+        return None
+    return value
+
+def page_args(default_limit=None, max_limit=1000):
+    """Read limit/offset query parameters, raising ValueError if invalid"""
+    limit = int(request.args['limit']) if request.args.get('limit') else default_limit
+    offset = int(request.args.get('offset', 0))
+    if (limit is not None and not 1 <= limit <= max_limit) or offset < 0:
+        raise ValueError('Invalid limit or offset')
+    return limit, offset
+
+def archive_response(report):
+    """JSON response for a ZIP archive ingestion report"""
+    return jsonify({
+        'success': report['datasets_created'] > 0,
+        'message': (f'Created {report["datasets_created"]} datasets with {report["total_rows"]} Q&A pairs '
+                    f'from {len(report["files"])} files ({report["failed_files"]} failed)'),
+        'report': report
+    })
+
+def duplicates_mode(value):
+    """Validate an upload's duplicate handling mode, returning None if invalid"""
+    value = (value or 'keep').strip().lower()
+    return value if value in DUPLICATE_MODES else None
+
+def duplicate_preview_response(dataset_name, qa_pairs_data, timestamp_report):
+    """JSON response for a dry run: what an upload would create, without creating it"""
+    summary = find_duplicates(qa_pairs_data, current_user)
+    return jsonify({
+        'success': True,
+        'dry_run': True,
+        'message': (f'"{dataset_name}" would be created with {len(qa_pairs_data)} Q&A pairs'
+                    + duplicate_message(summary) + timestamp_warning(timestamp_report)),
+        'duplicates': summary,
+        'timestamps': timestamp_report
+    })
+
+def revision_response(dataset, qa_pairs_data, timestamp_report, dry_run):
+    """JSON response for a revision upload: the diff against the dataset, applied unless dry_run"""
+    plan = plan_revision(dataset, qa_pairs_data)
+    summary = revision_summary(plan) if dry_run else apply_revision(dataset, plan)
+    changes = (f'{summary["inserted"]} new, {summary["changed"]} changed, {summary["unchanged"]} unchanged, '
+               f'{summary["missing"]} not in the file')
+    if dry_run:
+        message = f'Revision of "{dataset.name}" would apply: {changes}'
+    elif summary['inserted'] or summary['changed']:
+        message = f'"{dataset.name}" is now at revision {summary["revision"]}: {changes}'
+    else:
+        message = f'No changes to "{dataset.name}": {changes}'
+    return jsonify({
+        'success': True,
+        'dry_run': dry_run,
+        'message': message + timestamp_warning(timestamp_report),
+        'revision': summary,
+        'timestamps': timestamp_report
+    })
+
 def admin_required(f):
     """Decorator to require admin access"""
     @wraps(f)
@@ -50,8 +127,12 @@ def register_routes(app):
                             'message': 'Cannot delete the last admin user'
                         })
 
-                # Delete user's feedback
+                # Delete user's feedback and any metrics derived from it
+                FeedbackMetric.query.filter(
+                    FeedbackMetric.feedback_id.in_(db.session.query(Feedback.id).filter_by(user_id=user.id))
+                ).delete(synchronize_session=False)
                 Feedback.query.filter_by(user_id=user.id).delete()
+                ReviewAssignment.query.filter_by(user_id=user.id).delete()
                 
                 # Remove user from datasets
                 for dataset in user.accessible_datasets:
@@ -59,6 +140,7 @@ def register_routes(app):
                 
                 # Delete the user
                 db.session.delete(user)
+                publish('user_deleted', user_id=user_id)
                 db.session.commit()
                 
                 return jsonify({
@@ -101,6 +183,7 @@ def register_routes(app):
                     
                     user.access_level = access_level
                 
+                publish('user_updated', user_id=user_id)
                 db.session.commit()
                 
                 return jsonify({
@@ -127,9 +210,12 @@ def register_routes(app):
             # Get user's current datasets
             user_datasets = user.accessible_datasets
             
-            # Get datasets user doesn't have access to
-            all_datasets = Dataset.query.all()
-            available_datasets = [d for d in all_datasets if d not in user_datasets]
+            # Datasets the user doesn't have access to (anti-join, optionally paginated with limit/offset/q)
+            try:
+                limit, offset = page_args()
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)})
+            available, available_total = available_datasets(user_id, limit, offset, request.args.get('q', '').strip())
             
             return jsonify({
                 'success': True,
@@ -142,7 +228,8 @@ def register_routes(app):
                     'id': dataset.id,
                     'name': dataset.name,
                     'description': dataset.description
-                } for dataset in available_datasets]
+                } for dataset in available],
+                'available_total': available_total
             })
         else:  # POST
             try:
@@ -152,21 +239,17 @@ def register_routes(app):
                 if not data or 'dataset_ids' not in data:
                     return jsonify({'success': False, 'message': 'Dataset IDs required'})
                 
-                dataset_ids = data['dataset_ids']
-                if not isinstance(dataset_ids, list):
+                dataset_ids = parse_id_list(data['dataset_ids'])
+                if dataset_ids is None:
                     return jsonify({'success': False, 'message': 'Dataset IDs must be an array'})
                 
-                # Add datasets to user
-                for dataset_id in dataset_ids:
-                    dataset = Dataset.query.get(dataset_id)
-                    if dataset and dataset not in user.accessible_datasets:
-                        user.accessible_datasets.append(dataset)
-                
-                db.session.commit()
+                # Add datasets to user in one statement; existing grants are left alone
+                granted = grant_access([user_id], dataset_ids)
                 
                 return jsonify({
                     'success': True,
-                    'message': 'Datasets added to user successfully'
+                    'message': 'Datasets added to user successfully',
+                    'granted': granted
                 })
             except Exception as e:
                 db.session.rollback()
@@ -178,12 +261,11 @@ def register_routes(app):
     def api_admin_user_dataset_delete(user_id, dataset_id):
         """Remove dataset access from a user (admin only)"""
         try:
-            user = User.query.get_or_404(user_id)
-            dataset = Dataset.query.get_or_404(dataset_id)
+            User.query.get_or_404(user_id)
+            Dataset.query.get_or_404(dataset_id)
             
-            if dataset in user.accessible_datasets:
-                user.accessible_datasets.remove(dataset)
-                db.session.commit()
+            # Also drops the user's open review leases in the dataset
+            revoke_access([user_id], [dataset_id])
             
             return jsonify({
                 'success': True,
@@ -201,6 +283,25 @@ def register_routes(app):
         dataset = Dataset.query.get_or_404(dataset_id)
         
         if request.method == 'GET':
+            # available=true lists users without access instead (anti-join, paginated with limit/offset/q)
+            if request.args.get('available', 'false').lower() == 'true':
+                try:
+                    limit, offset = page_args(default_limit=100)
+                except ValueError as e:
+                    return jsonify({'success': False, 'message': str(e)})
+                users, total = available_users(dataset_id, limit, offset, request.args.get('q', '').strip())
+                return jsonify({
+                    'success': True,
+                    'users': [{
+                        'id': user.id,
+                        'username': user.username,
+                        'access_level': user.access_level
+                    } for user in users],
+                    'total': total,
+                    'limit': limit,
+                    'offset': offset
+                })
+            
             return jsonify({
                 'success': True,
                 'users': [{
@@ -217,21 +318,17 @@ def register_routes(app):
                 if not data or 'user_ids' not in data:
                     return jsonify({'success': False, 'message': 'User IDs required'})
                 
-                user_ids = data['user_ids']
-                if not isinstance(user_ids, list):
+                user_ids = parse_id_list(data['user_ids'])
+                if user_ids is None:
                     return jsonify({'success': False, 'message': 'User IDs must be an array'})
                 
-                # Add users to dataset
-                for user_id in user_ids:
-                    user = User.query.get(user_id)
-                    if user and user not in dataset.authorized_users:
-                        dataset.authorized_users.append(user)
-                
-                db.session.commit()
+                # Add users to dataset in one statement; existing grants are left alone
+                granted = grant_access(user_ids, [dataset_id])
                 
                 return jsonify({
                     'success': True,
-                    'message': 'Users added to dataset successfully'
+                    'message': 'Users added to dataset successfully',
+                    'granted': granted
                 })
             except Exception as e:
                 db.session.rollback()
@@ -243,12 +340,11 @@ def register_routes(app):
     def api_admin_dataset_user_delete(dataset_id, user_id):
         """Remove user access from a dataset (admin only)"""
         try:
-            dataset = Dataset.query.get_or_404(dataset_id)
-            user = User.query.get_or_404(user_id)
+            Dataset.query.get_or_404(dataset_id)
+            User.query.get_or_404(user_id)
             
-            if user in dataset.authorized_users:
-                dataset.authorized_users.remove(user)
-                db.session.commit()
+            # Also drops the user's open review leases in the dataset
+            revoke_access([user_id], [dataset_id])
             
             return jsonify({
                 'success': True,
@@ -258,9 +354,266 @@ def register_routes(app):
             db.session.rollback()
             return jsonify({'success': False, 'message': f'Error removing user: {str(e)}'})
     
+    @app.route('/api/admin/access/<action>', methods=['POST'])
+    @login_required
+    @admin_required
+    def api_admin_bulk_access(action):
+        """Grant or revoke dataset access in bulk (admin only)
+        
+        Accepts either {"user_ids": [...], "dataset_ids": [...]} (every user on
+        every dataset) or {"pairs": [[user_id, dataset_id], ...]}.
+        """
+        if action not in ('grant', 'revoke'):
+            abort(404)
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'message': 'No data provided'})
+        
+        try:
+            if 'pairs' in data:
+                pairs = data['pairs']
+                if not isinstance(pairs, list) or not all(parse_id_list(pair) is not None and len(pair) == 2 for pair in pairs):
+                    return jsonify({'success': False, 'message': 'Pairs must be an array of [user_id, dataset_id]'})
+                pairs = [tuple(pair) for pair in pairs]
+                if action == 'grant':
+                    changed, skipped = grant_pairs(pairs)
+                else:
+                    changed, skipped = revoke_pairs(pairs), 0
+            else:
+                user_ids = parse_id_list(data.get('user_ids'))
+                dataset_ids = parse_id_list(data.get('dataset_ids'))
+                if user_ids is None or dataset_ids is None:
+                    return jsonify({'success': False, 'message': 'User IDs and dataset IDs must be arrays'})
+                changed = (grant_access if action == 'grant' else revoke_access)(user_ids, dataset_ids)
+                skipped = None
+            
+            result = {
+                'success': True,
+                'message': f'{changed} access {"grants" if action == "grant" else "revocations"} applied',
+                'granted' if action == 'grant' else 'revoked': changed
+            }
+            if skipped:
+                result['skipped_unknown'] = skipped
+            return jsonify(result)
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Error updating access: {str(e)}'})
+    
+    @app.route('/api/admin/access/import', methods=['POST'])
+    @login_required
+    @admin_required
+    def api_admin_import_access():
+        """Grant or revoke dataset access from an uploaded CSV (admin only)"""
+        if 'file' not in request.files or not request.files['file'].filename:
+            return jsonify({'success': False, 'message': 'No file selected'})
+        
+        try:
+            text = request.files['file'].read().decode('utf-8-sig')
+            actions, errors = parse_access_csv(text)
+        except UnicodeDecodeError:
+            return jsonify({'success': False, 'message': 'File must be UTF-8 encoded'})
+        except AccessImportError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        
+        # dry_run=true only validates the file
+        if request.form.get('dry_run', 'false').lower() == 'true':
+            return jsonify({
+                'success': True,
+                'message': f'{len(actions["grant"])} grants and {len(actions["revoke"])} revocations would be applied',
+                'errors': errors[:100],
+                'error_count': len(errors)
+            })
+        
+        try:
+            granted, _ = grant_pairs(actions['grant'])
+            revoked = revoke_pairs(actions['revoke'])
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Error importing access: {str(e)}'})
+        
+        return jsonify({
+            'success': True,
+            'message': f'Granted {granted} and revoked {revoked} dataset accesses',
+            'granted': granted,
+            'revoked': revoked,
+            'errors': errors[:100],
+            'error_count': len(errors)
+        })
+    
+    @app.route('/api/admin/snapshots', methods=['GET', 'POST'])
+    @login_required
+    @admin_required
+    def api_admin_snapshots():
+        """List database snapshots, or start one in the background (admin only)"""
+        root = backup_root(app)
+        if request.method == 'GET':
+            return jsonify({'success': True, 'snapshots': list_snapshots(root)})
+        
+        incremental = bool((request.get_json(silent=True) or {}).get('incremental'))
+        lock = SnapshotLock(root)
+        try:
+            lock.acquire()
+        except BackupError as e:
+            return jsonify({'success': False, 'message': str(e)}), 409
+        engine = db.engine
+        
+        def run():
+            try:
+                with app.app_context():
+                    create_snapshot(root, engine, incremental, locked=True)
+            except Exception as e:
+                app.logger.exception('Snapshot failed: %s', e)
+            finally:
+                lock.release()
+        
+        threading.Thread(target=run, name='snapshot', daemon=True).start()
+        kind = 'Incremental' if incremental else 'Full'
+        return jsonify({'success': True, 'message': f'{kind} snapshot started'}), 202
+
+    @app.route('/api/admin/datasets/<action>', methods=['POST'])
+    @login_required
+    @admin_required
+    def api_admin_dataset_storage(action):
+        """Archive datasets to cold storage or rehydrate them (admin only)
+        
+        Accepts {"dataset_ids": [...]}; datasets are moved one at a time and
+        each one succeeds or fails on its own.
+        """
+        if action not in ('archive', 'rehydrate'):
+            abort(404)
+        dataset_ids = parse_id_list((request.get_json(silent=True) or {}).get('dataset_ids'))
+        if not dataset_ids:
+            return jsonify({'success': False, 'message': 'Dataset IDs must be a non-empty array'})
+        
+        move = archive_dataset if action == 'archive' else rehydrate_dataset
+        root = archive_root(app)
+        results, errors = [], []
+        for dataset_id in dataset_ids:
+            try:
+                results.append(move(root, dataset_id))
+            except ColdStorageError as e:
+                errors.append({'dataset_id': dataset_id, 'message': str(e)})
+            except Exception as e:
+                db.session.rollback()
+                errors.append({'dataset_id': dataset_id, 'message': f'{action.capitalize()} failed: {str(e)}'})
+        
+        message = f'{len(results)} datasets {"archived" if action == "archive" else "rehydrated"}'
+        if errors:
+            message += f', {len(errors)} failed: ' + '; '.join(error['message'] for error in errors[:3])
+        return jsonify({'success': not errors, 'message': message, 'results': results, 'errors': errors})
+
+    @app.route('/api/admin/archives')
+    @login_required
+    @admin_required
+    def api_admin_archives():
+        """List archived datasets with their summaries (admin only)"""
+        return jsonify(dict(list_archives(archive_root(app)), success=True))
+
+    @app.route('/api/admin/profiles')
+    @login_required
+    @admin_required
+    def api_admin_profiles():
+        """List saved request profiles, newest first (admin only)"""
+        return jsonify({'success': True, 'profiles': list_reports(profile_root(app))})
+
+    @app.route('/api/admin/profiles/<report_id>')
+    @login_required
+    @admin_required
+    def api_admin_profile(report_id):
+        """Show a saved request profile (admin only)"""
+        report = load_report(profile_root(app), report_id)
+        if report is None:
+            return jsonify({'success': False, 'message': 'Profile not found'}), 404
+        return jsonify({'success': True, 'profile': report})
+
+    @app.route('/api/admin/dataset/<int:dataset_id>/agreement')
+    @login_required
+    @admin_required
+    @read_replica
+    def api_admin_dataset_agreement(dataset_id):
+        """Get inter-annotator agreement statistics for a dataset (admin only)"""
+        # Imported here so numpy is only loaded once agreement is requested
+        from analytics import get_agreement
+
+        Dataset.query.get_or_404(dataset_id)
+        try:
+            return jsonify({
+                'success': True,
+                'agreement': get_agreement(dataset_id)
+            })
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'Error computing agreement: {str(e)}'})
+    
+    @app.route('/api/admin/dataset/<int:dataset_id>/scores')
+    @login_required
+    @admin_required
+    @read_replica
+    def api_admin_dataset_scores(dataset_id):
+        """Get score distributions and reviewer bias for a dataset (admin only)"""
+        # Imported here so numpy is only loaded once analytics are requested
+        from analytics import get_score_stats
+
+        Dataset.query.get_or_404(dataset_id)
+        try:
+            return jsonify({
+                'success': True,
+                'scores': get_score_stats(dataset_id)
+            })
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'Error computing score distributions: {str(e)}'})
+    
+    @app.route('/api/admin/dataset/<int:dataset_id>/text_metrics', methods=['GET', 'POST'])
+    @login_required
+    @admin_required
+    def api_admin_dataset_text_metrics(dataset_id):
+        """Get or recompute gold standard similarity metrics for a dataset (admin only)"""
+        Dataset.query.get_or_404(dataset_id)
+        
+        if request.method == 'GET':
+            return jsonify({
+                'success': True,
+                'metrics': dataset_metrics_summary(dataset_id)
+            })
+        else:  # POST
+            try:
+                run = refresh_dataset_metrics(dataset_id)
+                return jsonify({
+                    'success': True,
+                    'message': f'Recomputed metrics for {run["recomputed"]} of {run["scored"]} gold standards',
+                    'run': run,
+                    'metrics': dataset_metrics_summary(dataset_id)
+                })
+            except Exception as e:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': f'Error computing metrics: {str(e)}'})
+    
+    @app.route('/api/admin/dataset/<int:dataset_id>/overlap', methods=['PUT'])
+    @login_required
+    @admin_required
+    def api_admin_dataset_overlap(dataset_id):
+        """Set how many reviewers the scheduler assigns to each Q&A pair (admin only)"""
+        Dataset.query.get_or_404(dataset_id)
+        data = request.get_json()
+        if not data or 'target_overlap' not in data:
+            return jsonify({'success': False, 'message': 'target_overlap is required'})
+        
+        try:
+            set_target_overlap(dataset_id, data['target_overlap'])
+            return jsonify({
+                'success': True,
+                'message': f'Target overlap set to {data["target_overlap"]}',
+                'progress': dataset_progress(dataset_id)
+            })
+        except SchedulerError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Error updating dataset: {str(e)}'})
+    
     @app.route('/api/admin/users/search')
     @login_required
     @admin_required
+    @read_replica
     def api_admin_users_search():
         """Search for users (admin only)"""
         search_term = request.args.get('q', '').strip()
@@ -279,12 +632,12 @@ def register_routes(app):
         if dataset_id:
             dataset = Dataset.query.get(dataset_id)
             if dataset:
-                dataset_users = dataset.authorized_users
+                with_access = dataset_user_ids(dataset.id, [user.id for user in users])
                 result = [{
                     'id': user.id,
                     'username': user.username,
                     'access_level': user.access_level,
-                    'has_access': user in dataset_users
+                    'has_access': user.id in with_access
                 } for user in users]
             else:
                 result = [{
@@ -354,6 +707,8 @@ def register_routes(app):
             )
             
             db.session.add(user)
+            db.session.flush()
+            publish('user_created', user_id=user.id)
             db.session.commit()
             
             flash('Registration successful! Please log in.', 'success')
@@ -364,6 +719,7 @@ def register_routes(app):
     @app.route('/')
     @app.route('/dataset/<int:dataset_id>')
     @login_required
+    @read_replica
     def index(dataset_id=None):
         """Main page showing list of Q&A pairs"""
         # Get datasets user has access to
@@ -371,7 +727,7 @@ def register_routes(app):
         
         if not user_datasets:
             flash('You do not have access to any datasets. Please contact an administrator.', 'warning')
-            return render_template('index.html', qa_pairs=[], datasets=[], current_dataset=None)
+            return render_template('index.html', qa_index=None, datasets=[], current_dataset=None)
         
         if dataset_id is None:
             dataset_id = user_datasets[0].id
@@ -382,19 +738,17 @@ def register_routes(app):
                 return redirect(url_for('index'))
         
         current_dataset = Dataset.query.get_or_404(dataset_id)
-        qa_pairs = QuestionAnswerPair.query.filter_by(dataset_id=dataset_id).order_by(QuestionAnswerPair.created_at.desc()).all()
+        if current_dataset.is_archived():
+            flash('This dataset is archived. Its feedback can still be downloaded from the datasets page; '
+                  'an administrator can rehydrate it for review.', 'info')
         
-        # Add user-specific feedback information to each Q&A pair
-        qa_pairs_with_user_feedback = []
-        for qa in qa_pairs:
-            user_feedback = [f for f in qa.feedback if f.user_id == current_user.id]
-            qa.user_feedback_count = len(user_feedback)
-            qa.user_has_gold_standard = any(f.gold_standard_answer for f in user_feedback)
-            qa_pairs_with_user_feedback.append(qa)
+        # Compact status index; the list is rendered client-side, one visible window at a time
+        qa_index = qa_status_index(dataset_id, current_user.id)
         
-        return render_template('index.html', qa_pairs=qa_pairs_with_user_feedback, datasets=user_datasets, current_dataset=current_dataset)
+        return render_template('index.html', qa_index=qa_index, datasets=user_datasets, current_dataset=current_dataset)
 
     @app.route('/qa/<int:qa_id>')
+    @read_replica
     def view_qa(qa_id):
         """View a specific Q&A pair with feedback form"""
         qa_pair = QuestionAnswerPair.query.get_or_404(qa_id)
@@ -414,6 +768,7 @@ def register_routes(app):
         if form.validate_on_submit():
             feedback = Feedback(
                 qa_pair_id=qa_id,
+                answer_revision=qa_pair.revision,
                 text_feedback=form.text_feedback.data,
                 accuracy_score=form.accuracy_score.data,
                 completeness_score=form.completeness_score.data,
@@ -423,6 +778,8 @@ def register_routes(app):
             )
             
             db.session.add(feedback)
+            publish('feedback', dataset_id=qa_pair.dataset_id, qa_pair_id=qa_id, created=True,
+                    gold_added=bool(feedback.gold_standard_answer))
             db.session.commit()
             
             flash('Thank you! Your feedback has been submitted successfully.', 'success')
@@ -435,94 +792,113 @@ def register_routes(app):
     @app.route('/admin')
     @login_required
     @admin_required
+    @read_replica
     def admin():
         """Admin dashboard showing datasets and user management"""
+        # Read before the stats, so the page's stream replays anything committed in between
+        live_cursor = latest_event_id()
+        stats = admin_stats()
+        
         # Get all datasets with stats
-        datasets = Dataset.query.all()
-        dataset_stats = []
-        for dataset in datasets:
-            qa_count = len(dataset.qa_pairs)
-            feedback_count = sum(len(qa.feedback) for qa in dataset.qa_pairs)
-            user_count = len(dataset.authorized_users)
-            dataset_stats.append({
-                'dataset': dataset,
-                'qa_count': qa_count,
-                'feedback_count': feedback_count,
-                'user_count': user_count
-            })
+        dataset_stats = [
+            dict(stats['rows']['dataset'][dataset.id], dataset=dataset)
+            for dataset in Dataset.query.order_by(Dataset.id).all()
+            if dataset.id in stats['rows']['dataset']
+        ]
         
         # Get all users with stats
-        users = User.query.order_by(User.created_at.desc()).all()
-        user_stats = []
-        for user in users:
-            feedback_count = len(user.feedback)
-            dataset_count = len(user.accessible_datasets)
-            user_stats.append({
-                'user': user,
-                'feedback_count': feedback_count,
-                'dataset_count': dataset_count
-            })
-        
-        # Overall stats
-        total_users = User.query.count()
-        total_datasets = Dataset.query.count()
-        total_qa_pairs = QuestionAnswerPair.query.count()
-        total_feedback = Feedback.query.count()
+        user_stats = [
+            dict(stats['rows']['user'][user.id], user=user)
+            for user in User.query.order_by(User.created_at.desc()).all()
+            if user.id in stats['rows']['user']
+        ]
         
         return render_template('admin.html', 
                              dataset_stats=dataset_stats,
                              user_stats=user_stats,
-                             total_users=total_users,
-                             total_datasets=total_datasets,
-                             total_qa_pairs=total_qa_pairs,
-                             total_feedback=total_feedback)
+                             live_cursor=live_cursor,
+                             **stats['totals'])
 
     @app.route('/datasets')
     @login_required
+    @read_replica
     def datasets():
         """Datasets management page"""
+        live_cursor = latest_event_id()
         # Admins can see all datasets, regular users see only their accessible datasets
-        if current_user.is_admin():
-            user_datasets = Dataset.query.all()
-        else:
-            user_datasets = current_user.accessible_datasets
-        
-        # Calculate statistics for each dataset
-        datasets_info = []
-        total_qa_pairs = 0
-        user_feedback_count = 0
-        user_gold_standards = 0
-        
-        for dataset in user_datasets:
-            qa_count = len(dataset.qa_pairs)
-            total_qa_pairs += qa_count
-            
-            # Count user's feedback for this dataset
-            user_feedback_for_dataset = 0
-            user_gold_standards_for_dataset = 0
-            
-            for qa in dataset.qa_pairs:
-                user_feedback_list = [f for f in qa.feedback if f.user_id == current_user.id]
-                if user_feedback_list:
-                    user_feedback_for_dataset += len(user_feedback_list)
-                    if any(f.gold_standard_answer for f in user_feedback_list):
-                        user_gold_standards_for_dataset += 1
-            
-            user_feedback_count += user_feedback_for_dataset
-            user_gold_standards += user_gold_standards_for_dataset
-            
-            datasets_info.append({
-                'dataset': dataset,
-                'qa_count': qa_count,
-                'user_feedback_count': user_feedback_for_dataset,
-                'user_gold_standards': user_gold_standards_for_dataset
-            })
+        stats = reviewer_stats(current_user)
+        rows = stats['rows']['dataset']
+        datasets_info = [
+            dict(rows[dataset.id], dataset=dataset)
+            for dataset in Dataset.query.filter(Dataset.id.in_(rows)).order_by(Dataset.id).all()
+        ]
         
         return render_template('datasets.html', 
                              datasets=datasets_info,
-                             total_qa_pairs=total_qa_pairs,
-                             user_feedback_count=user_feedback_count,
-                             user_gold_standards=user_gold_standards)
+                             total_qa_pairs=stats['totals']['total_qa_pairs'],
+                             user_feedback_count=stats['totals']['user_feedback_count'],
+                             user_gold_standards=stats['totals']['user_gold_standards'],
+                             live_cursor=live_cursor)
+
+    @app.route('/api/events')
+    @login_required
+    def api_events():
+        """Server-Sent Events stream of changes for the admin and datasets pages (see live.py)"""
+        # Browsers resume with Last-Event-ID; pages start from the cursor they were rendered with
+        position = request.headers.get('Last-Event-ID') or request.args.get('after')
+        try:
+            after_id = int(position) if position else None
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid event id'}), 400
+        
+        if not acquire_stream_slot():
+            response = jsonify({'success': False, 'message': 'Too many live streams, try again later'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        
+        try:
+            stream = event_stream(current_user.id, current_user.is_admin(), after_id)
+            response = Response(stream_with_context(stream), mimetype='text/event-stream')
+        except Exception:
+            release_stream_slot()
+            raise
+        response.call_on_close(release_stream_slot)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer events
+        return response
+
+    @app.route('/api/live/<view>/stats')
+    @login_required
+    def api_live_stats(view):
+        """Current counters of the admin or datasets page, for pages that missed events"""
+        if view == 'admin':
+            if not current_user.is_admin():
+                return jsonify({'success': False, 'message': 'Access denied'}), 403
+            stats = admin_stats()
+        elif view == 'datasets':
+            stats = reviewer_stats(current_user)
+        else:
+            abort(404)
+        return jsonify(dict(stats, success=True, cursor=latest_event_id()))
+
+    @app.route('/api/live/<view>/rows/<kind>/<int:item_id>')
+    @login_required
+    def api_live_row(view, kind, item_id):
+        """One table row of the admin or datasets page, rendered for insertion by the live updates"""
+        if view == 'admin' and current_user.is_admin():
+            if kind == 'dataset':
+                row = admin_stats(dataset_ids=[item_id], user_ids=[])['rows']['dataset'].get(item_id)
+                if row is not None:
+                    return render_template('_admin_dataset_row.html', stat=dict(row, dataset=db.session.get(Dataset, item_id)))
+            elif kind == 'user':
+                row = admin_stats(dataset_ids=[], user_ids=[item_id])['rows']['user'].get(item_id)
+                if row is not None:
+                    return render_template('_admin_user_row.html', stat=dict(row, user=db.session.get(User, item_id)))
+        elif view == 'datasets' and kind == 'dataset':
+            row = reviewer_stats(current_user, dataset_ids=[item_id])['rows']['dataset'].get(item_id)
+            if row is not None:
+                return render_template('_dataset_row.html', dataset_info=dict(row, dataset=db.session.get(Dataset, item_id)))
+        abort(404)
 
     @app.route('/api/upload_dataset', methods=['POST'])
     @login_required
@@ -536,9 +912,28 @@ def register_routes(app):
             file = request.files['dataset_file']
             dataset_name = request.form.get('dataset_name', '').strip()
             dataset_description = request.form.get('dataset_description', '').strip()
+            duplicates = duplicates_mode(request.form.get('duplicates'))
+            # dry_run=true reports timestamps and duplicates without creating the dataset
+            dry_run = request.form.get('dry_run', 'false').lower() == 'true'
             
             if not file or file.filename == '':
                 return jsonify({'success': False, 'message': 'No file selected'})
+            if duplicates is None:
+                return jsonify({'success': False, 'message': f'duplicates must be one of: {", ".join(DUPLICATE_MODES)}'})
+            
+            # ZIP archives create one dataset per member file; the name is an optional prefix
+            if secure_filename(file.filename).lower().endswith(ARCHIVE_EXTENSIONS):
+                if dry_run:
+                    return jsonify({'success': False, 'message': 'Dry runs are not supported for ZIP archives'})
+                with tempfile.TemporaryDirectory() as staging:
+                    archive_path = os.path.join(staging, 'upload.zip')
+                    file.save(archive_path)
+                    try:
+                        report = ingest_archive(archive_path, current_user, dataset_name or None, dataset_description,
+                                                duplicates=duplicates)
+                    except IngestionError as e:
+                        return jsonify({'success': False, 'message': str(e)})
+                return archive_response(report)
             
             if not dataset_name:
                 return jsonify({'success': False, 'message': 'Dataset name is required'})
@@ -549,118 +944,236 @@ def register_routes(app):
             
             # Validate file type
             filename = secure_filename(file.filename)
-            if not filename.lower().endswith(('.json', '.csv')):
-                return jsonify({'success': False, 'message': 'Only JSON and CSV files are supported'})
+            if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                return jsonify({'success': False, 'message': 'Only JSON, CSV and ZIP files are supported'})
             
             # Read and parse file content
-            file_content = file.read().decode('utf-8')
-            qa_pairs_data = []
-            
-            if filename.lower().endswith('.json'):
-                try:
-                    data = json.loads(file_content)
-                    if not isinstance(data, list):
-                        return jsonify({'success': False, 'message': 'JSON must be an array of objects'})
-                    
-                    for item in data:
-                        if not isinstance(item, dict) or 'question' not in item or 'answer' not in item:
-                            return jsonify({'success': False, 'message': 'Each JSON object must have "question" and "answer" fields'})
-                        
-                        # Parse optional fields
-                        original_id = item.get('id', item.get('original_id'))
-                        timestamp_str = item.get('timestamp', item.get('created_at'))
-                        timestamp = None
-                        if timestamp_str:
-                            try:
-                                from dateutil import parser
-                                timestamp = parser.parse(timestamp_str)
-                            except:
-                                # If parsing fails, use current time
-                                timestamp = datetime.utcnow()
-                        
-                        qa_pairs_data.append({
-                            'question': str(item['question']).strip(),
-                            'answer': str(item['answer']).strip(),
-                            'original_id': str(original_id).strip() if original_id else None,
-                            'timestamp': timestamp
-                        })
-                except json.JSONDecodeError as e:
-                    return jsonify({'success': False, 'message': f'Invalid JSON format: {str(e)}'})
-            
-            elif filename.lower().endswith('.csv'):
-                try:
-                    csv_reader = csv.DictReader(io.StringIO(file_content))
-                    
-                    # Check if required columns exist
-                    if 'question' not in csv_reader.fieldnames or 'answer' not in csv_reader.fieldnames:
-                        return jsonify({'success': False, 'message': 'CSV must have "question" and "answer" columns'})
-                    
-                    for row in csv_reader:
-                        if not row['question'].strip() or not row['answer'].strip():
-                            continue  # Skip empty rows
-                        
-                        # Parse optional fields
-                        original_id = row.get('id', row.get('original_id', ''))
-                        timestamp_str = row.get('timestamp', row.get('created_at', ''))
-                        timestamp = None
-                        if timestamp_str.strip():
-                            try:
-                                from dateutil import parser
-                                timestamp = parser.parse(timestamp_str.strip())
-                            except:
-                                # If parsing fails, use current time
-                                timestamp = datetime.utcnow()
-                        
-                        qa_pairs_data.append({
-                            'question': row['question'].strip(),
-                            'answer': row['answer'].strip(),
-                            'original_id': original_id.strip() if original_id.strip() else None,
-                            'timestamp': timestamp
-                        })
-                except Exception as e:
-                    return jsonify({'success': False, 'message': f'Error reading CSV: {str(e)}'})
-            
-            if not qa_pairs_data:
-                return jsonify({'success': False, 'message': 'No valid Q&A pairs found in the file'})
-            
-            # Create new dataset
-            new_dataset = Dataset(
-                name=dataset_name,
-                description=dataset_description if dataset_description else None
-            )
-            db.session.add(new_dataset)
-            db.session.flush()  # Get the dataset ID
-            
-            # Add Q&A pairs to the dataset
-            for qa_data in qa_pairs_data:
-                qa_pair = QuestionAnswerPair(
-                    dataset_id=new_dataset.id,
-                    question_text=qa_data['question'],
-                    system_answer_text=qa_data['answer'],
-                    original_qa_id=qa_data.get('original_id'),
-                    created_at=qa_data.get('timestamp') or datetime.utcnow()
-                )
-                db.session.add(qa_pair)
-            
-            # Grant access to the current user (and admins get access to everything)
-            new_dataset.authorized_users.append(current_user)
-            
-            db.session.commit()
+            try:
+                qa_pairs_data, timestamp_report = parse_dataset_file(filename, file.stream)
+                if dry_run:
+                    return duplicate_preview_response(dataset_name, qa_pairs_data, timestamp_report)
+                new_dataset, duplicate_summary = create_dataset(
+                    dataset_name, dataset_description, qa_pairs_data, current_user, duplicates)
+            except IngestionError as e:
+                return jsonify({'success': False, 'message': str(e)})
             
+            row_count = len(qa_pairs_data) - duplicate_summary.get('skipped_rows', 0)
             return jsonify({
                 'success': True,
-                'message': f'Dataset "{dataset_name}" uploaded successfully with {len(qa_pairs_data)} Q&A pairs',
-                'dataset_id': new_dataset.id
+                'message': (f'Dataset "{dataset_name}" uploaded successfully with {row_count} Q&A pairs'
+                            + duplicate_message(duplicate_summary) + timestamp_warning(timestamp_report)),
+                'dataset_id': new_dataset.id,
+                'duplicates': duplicate_summary,
+                'timestamps': timestamp_report
             })
             
         except Exception as e:
             db.session.rollback()
             return jsonify({'success': False, 'message': f'Upload failed: {str(e)}'})
 
+    @app.route('/api/dataset/<int:dataset_id>/revision', methods=['POST'])
+    @login_required
+    def api_upload_revision(dataset_id):
+        """Upload a new revision of a dataset's answers, matched to existing pairs by id"""
+        if not current_user.has_dataset_access(dataset_id):
+            return jsonify({'success': False, 'message': 'Access denied'}), 403
+        dataset = Dataset.query.get_or_404(dataset_id)
+        
+        file = request.files.get('dataset_file')
+        if not file or file.filename == '':
+            return jsonify({'success': False, 'message': 'No file selected'})
+        filename = secure_filename(file.filename)
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            return jsonify({'success': False, 'message': 'Only JSON, JSONL and CSV files are supported'})
+        # dry_run=true reports the diff without changing the dataset
+        dry_run = request.form.get('dry_run', 'false').lower() == 'true'
+        
+        try:
+            qa_pairs_data, timestamp_report = parse_dataset_file(filename, file.stream)
+            return revision_response(dataset, qa_pairs_data, timestamp_report, dry_run)
+        except IngestionError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Revision failed: {str(e)}'})
+
+    @app.route('/api/qa/<int:qa_id>/history')
+    @login_required
+    @read_replica
+    def api_qa_history(qa_id):
+        """Current and previous answers of a Q&A pair with the feedback given on each"""
+        qa_pair = QuestionAnswerPair.query.get_or_404(qa_id)
+        if not current_user.has_dataset_access(qa_pair.dataset_id):
+            return jsonify({'error': 'Access denied'}), 403
+        return jsonify({'qa_id': qa_id, 'revisions': answer_history(qa_pair)})
+
+    @app.route('/api/uploads', methods=['POST'])
+    @login_required
+    def api_create_upload():
+        """Start a resumable chunked upload of a dataset file"""
+        data = request.get_json()
+        if not data or 'filename' not in data or 'size' not in data:
+            return jsonify({'success': False, 'message': 'filename and size are required'})
+        
+        filename = secure_filename(str(data['filename']))
+        is_archive = filename.lower().endswith(ARCHIVE_EXTENSIONS)
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS) and not is_archive:
+            return jsonify({'success': False, 'message': 'Only JSON, JSONL, CSV and ZIP files are supported'})
+        
+        # revision_of uploads a new revision of an existing dataset instead of creating one
+        revision_of = data.get('revision_of')
+        if revision_of is not None:
+            if not isinstance(revision_of, int) or is_archive:
+                return jsonify({'success': False, 'message': 'revision_of must be a dataset id and the file JSON, JSONL or CSV'})
+            revised = db.session.get(Dataset, revision_of)
+            if not current_user.has_dataset_access(revision_of) or not revised:
+                return jsonify({'success': False, 'message': 'Dataset not found'}), 404
+            if revised.is_archived():
+                return jsonify({'success': False, 'message': 'Dataset is archived; rehydrate it before uploading a revision'})
+        
+        # For ZIP archives the dataset name is an optional prefix
+        dataset_name = (data.get('dataset_name') or '').strip()
+        if revision_of is None and not dataset_name and not is_archive:
+            return jsonify({'success': False, 'message': 'Dataset name is required'})
+        if revision_of is None and not is_archive and Dataset.query.filter_by(name=dataset_name).first():
+            return jsonify({'success': False, 'message': 'Dataset name already exists'})
+        duplicates = duplicates_mode(data.get('duplicates'))
+        if duplicates is None:
+            return jsonify({'success': False, 'message': f'duplicates must be one of: {", ".join(DUPLICATE_MODES)}'})
+        
+        try:
+            meta = create_upload(
+                staging_root(app), current_user.id, filename, data['size'],
+                chunk_size=data.get('chunk_size'),
+                sha256=data.get('sha256'),
+                extra={
+                    'dataset_name': dataset_name,
+                    'dataset_description': (data.get('dataset_description') or '').strip(),
+                    'duplicates': duplicates,
+                    'revision_of': revision_of
+                }
+            )
+        except UploadError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        
+        return jsonify({'success': True, **upload_status(staging_root(app), meta)})
+
+    @app.route('/api/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+    @login_required
+    def api_upload_chunk(upload_id):
+        """Get upload status, store one chunk (PUT ?offset=N) or abort an upload"""
+        root = staging_root(app)
+        try:
+            meta = load_upload(root, upload_id, current_user.id)
+        except UploadNotFound as e:
+            return jsonify({'success': False, 'message': str(e)}), 404
+        
+        if request.method == 'GET':
+            return jsonify({'success': True, **upload_status(root, meta)})
+        elif request.method == 'DELETE':
+            remove_upload(root, meta)
+            return jsonify({'success': True, 'message': 'Upload cancelled'})
+        else:  # PUT
+            try:
+                offset = int(request.args.get('offset', ''))
+            except ValueError:
+                return jsonify({'success': False, 'message': 'offset query parameter is required'}), 400
+            
+            try:
+                index = write_chunk(root, meta, offset, request.stream, request.content_length,
+                                    checksum=request.headers.get('X-Chunk-SHA256'))
+            except UploadError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            
+            return jsonify({'success': True, 'chunk': index})
+
+    @app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+    @login_required
+    def api_finalize_upload(upload_id):
+        """Verify a completed chunked upload and create its dataset (or only report on it with dry_run)"""
+        root = staging_root(app)
+        try:
+            meta = load_upload(root, upload_id, current_user.id)
+            path, sha256 = assemble(root, meta)
+        except UploadNotFound as e:
+            return jsonify({'success': False, 'message': str(e)}), 404
+        except UploadError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        
+        # A dry run keeps the staged file so the upload can be finalised afterwards
+        options = request.get_json(silent=True) or {}
+        dry_run = bool(options.get('dry_run'))
+        duplicates = duplicates_mode(options.get('duplicates') or meta['extra'].get('duplicates'))
+        if duplicates is None:
+            return jsonify({'success': False, 'message': f'duplicates must be one of: {", ".join(DUPLICATE_MODES)}'})
+        
+        revision_of = meta['extra'].get('revision_of')
+        if revision_of is not None:
+            dataset = db.session.get(Dataset, revision_of)
+            if dataset is None or not current_user.has_dataset_access(revision_of):
+                remove_upload(root, meta)
+                return jsonify({'success': False, 'message': 'Dataset not found'}), 404
+            try:
+                with open(path, 'rb') as f:
+                    qa_pairs_data, timestamp_report = parse_dataset_file(meta['filename'], f)
+                response = revision_response(dataset, qa_pairs_data, timestamp_report, dry_run)
+            except IngestionError as e:
+                response = jsonify({'success': False, 'message': str(e)})
+            except Exception as e:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': f'Revision failed: {str(e)}'})
+            if not dry_run:
+                remove_upload(root, meta)
+            return response
+        
+        dataset_name = meta['extra']['dataset_name']
+        if meta['filename'].lower().endswith(ARCHIVE_EXTENSIONS):
+            if dry_run:
+                return jsonify({'success': False, 'message': 'Dry runs are not supported for ZIP archives'})
+            try:
+                report = ingest_archive(path, current_user, dataset_name or None, meta['extra']['dataset_description'],
+                                        duplicates=duplicates)
+            except IngestionError as e:
+                return jsonify({'success': False, 'message': str(e)})
+            finally:
+                remove_upload(root, meta)
+            return archive_response(report)
+        
+        if Dataset.query.filter_by(name=dataset_name).first():
+            return jsonify({'success': False, 'message': 'Dataset name already exists'})
+        
+        try:
+            with open(path, 'rb') as f:
+                qa_pairs_data, timestamp_report = parse_dataset_file(meta['filename'], f)
+            if dry_run:
+                return duplicate_preview_response(dataset_name, qa_pairs_data, timestamp_report)
+            new_dataset, duplicate_summary = create_dataset(
+                dataset_name, meta['extra']['dataset_description'], qa_pairs_data, current_user, duplicates)
+        except IngestionError as e:
+            if not dry_run:
+                remove_upload(root, meta)
+            return jsonify({'success': False, 'message': str(e)})
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Upload failed: {str(e)}'})
+        
+        remove_upload(root, meta)
+        row_count = len(qa_pairs_data) - duplicate_summary.get('skipped_rows', 0)
+        return jsonify({
+            'success': True,
+            'message': (f'Dataset "{dataset_name}" uploaded successfully with {row_count} Q&A pairs'
+                        + duplicate_message(duplicate_summary) + timestamp_warning(timestamp_report)),
+            'dataset_id': new_dataset.id,
+            'duplicates': duplicate_summary,
+            'timestamps': timestamp_report,
+            'sha256': sha256
+        })
+
     @app.route('/api/download_dataset/<int:dataset_id>')
     @login_required
+    @read_replica
     def api_download_dataset(dataset_id):
-        """Download dataset in JSON or CSV format with customizable options"""
+        """Download dataset in JSON, CSV, Parquet, Arrow or NDJSON format with customizable options"""
         try:
             # Check access permission
             if not current_user.has_dataset_access(dataset_id):
@@ -669,8 +1182,8 @@ def register_routes(app):
             dataset = Dataset.query.get_or_404(dataset_id)
             format_type = request.args.get('format', 'json').lower()
             
-            if format_type not in ['json', 'csv']:
-                return jsonify({'error': 'Invalid format. Use json or csv'}), 400
+            if format_type not in EXPORT_FORMATS:
+                return jsonify({'error': 'Invalid format. Use json, csv, parquet, arrow or ndjson'}), 400
             
             # Parse download options
             include_gold_standards = request.args.get('include_gold_standards', 'false').lower() == 'true'
@@ -686,206 +1199,41 @@ def register_routes(app):
                 except ValueError:
                     return jsonify({'error': 'Invalid user_ids format'}), 400
             
-            qa_pairs = QuestionAnswerPair.query.filter_by(dataset_id=dataset_id).all()
-            
-            if format_type == 'json':
-                # Generate JSON export
-                export_data = []
-                for qa in qa_pairs:
-                    qa_data = {
-                        'id': qa.id,
-                        'question': qa.question_text,
-                        'answer': qa.system_answer_text,
-                        'created_at': qa.created_at.isoformat()
-                    }
-                    
-                    # Add original_qa_id if it exists
-                    if qa.original_qa_id:
-                        qa_data['original_qa_id'] = qa.original_qa_id
-                    
-                    # Add feedback if any options are selected
-                    if include_gold_standards or include_scores or include_text_feedback:
-                        qa_data['feedback_entries'] = []
-                        
-                        # Filter feedback by user IDs if specified
-                        feedback_list = qa.feedback
-                        if selected_user_ids is not None:
-                            feedback_list = [f for f in feedback_list if f.user_id in selected_user_ids]
-                        
-                        for feedback in feedback_list:
-                            feedback_data = {
-                            'feedback_id': feedback.id,
-                            'user_id': feedback.user_id,
-                            'username': feedback.user.username if feedback.user else None,
-                            'submitted_at': feedback.submitted_at.isoformat() if feedback.submitted_at else None
-                            }
-                            
-                            if include_text_feedback and feedback.text_feedback:
-                                feedback_data['text_feedback'] = feedback.text_feedback
-                            
-                            if include_scores:
-                                if feedback.accuracy_score:
-                                    feedback_data['accuracy_score'] = feedback.accuracy_score
-                                if feedback.completeness_score:
-                                    feedback_data['completeness_score'] = feedback.completeness_score
-                                if feedback.clarity_score:
-                                    feedback_data['clarity_score'] = feedback.clarity_score
-                                if feedback.clinical_relevance_score:
-                                    feedback_data['clinical_relevance_score'] = feedback.clinical_relevance_score
-                            
-                            if include_gold_standards and feedback.gold_standard_answer:
-                                feedback_data['gold_standard_answer'] = feedback.gold_standard_answer
-                            
-                            qa_data['feedback_entries'].append(feedback_data)
-                    
-                    export_data.append(qa_data)
-                
-                # Create file-like object
-                output = io.StringIO()
-                json.dump(export_data, output, indent=2)
-                output.seek(0)
-                
-                # Convert to bytes
-                output_bytes = io.BytesIO(output.getvalue().encode('utf-8'))
-                output_bytes.seek(0)
+            if format_type in STREAMING_FORMATS:
+                # Columnar / NDJSON exports are encoded batch by batch and streamed
+                compression = request.args.get('compression', 'gzip').lower() if format_type == 'ndjson' else 'none'
+                try:
+                    chunks = stream_export(
+                        dataset_id, format_type, compression,
+                        selected_user_ids=selected_user_ids,
+                        include_gold_standards=include_gold_standards,
+                        include_scores=include_scores,
+                        include_text_feedback=include_text_feedback
+                    )
+                except ExportError as e:
+                    return jsonify({'error': str(e)}), 400
                 
-                return send_file(
-                    output_bytes,
-                    mimetype='application/json',
-                    as_attachment=True,
-                    download_name=f'{dataset.name}_feedback.json'
+                mimetype, extension = export_mimetype_and_extension(format_type, compression)
+                return Response(
+                    stream_with_context(defer_to_interactive(chunks)),
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{dataset.name}_feedback.{extension}"'}
                 )
             
-            else:  # CSV format
-                output = io.StringIO()
-                writer = csv.writer(output)
-                
-                # Determine if we're doing individual feedback rows or aggregated
-                has_feedback_options = include_gold_standards or include_scores or include_text_feedback
-                multiple_users = selected_user_ids is None or len(selected_user_ids) != 1
-                
-                if has_feedback_options and multiple_users:
-                    # Individual feedback rows (one row per QA-user pair)
-                    headers = ['qa_id', 'question', 'answer', 'created_at']
-                    has_original_ids = any(qa.original_qa_id for qa in qa_pairs)
-                    if has_original_ids:
-                        headers.append('original_qa_id')
-                    headers.extend(['user_id', 'username', 'submitted_at'])
-                    
-                    if include_text_feedback:
-                        headers.append('text_feedback')
-                    if include_scores:
-                        headers.extend(['accuracy_score', 'completeness_score', 'clarity_score', 'clinical_relevance_score'])
-                    if include_gold_standards:
-                        headers.append('gold_standard_answer')
-                    
-                    writer.writerow(headers)
-                    
-                    # Write data rows
-                    for qa in qa_pairs:
-                        # Filter feedback by user IDs if specified
-                        feedback_list = qa.feedback
-                        if selected_user_ids is not None:
-                            feedback_list = [f for f in feedback_list if f.user_id in selected_user_ids]
-                        
-                        for feedback in feedback_list:
-                            row = [
-                        qa.id,
-                        qa.question_text,
-                        qa.system_answer_text,
-                                qa.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                            ]
-                            
-                            if has_original_ids:
-                                row.append(qa.original_qa_id or '')
-                            
-                            row.extend([
-                                feedback.user_id,
-                                feedback.user.username if feedback.user else '',
-                                feedback.submitted_at.strftime('%Y-%m-%d %H:%M:%S') if feedback.submitted_at else ''
-                            ])
-                            
-                            if include_text_feedback:
-                                row.append(feedback.text_feedback or '')
-                            if include_scores:
-                                row.extend([
-                                    feedback.accuracy_score or '',
-                                    feedback.completeness_score or '',
-                                    feedback.clarity_score or '',
-                                    feedback.clinical_relevance_score or ''
-                                ])
-                            if include_gold_standards:
-                                row.append(feedback.gold_standard_answer or '')
-                            
-                            writer.writerow(row)
-                else:
-                    # Aggregated format (one row per QA pair)
-                    headers = ['id', 'question', 'answer', 'created_at']
-                    has_original_ids = any(qa.original_qa_id for qa in qa_pairs)
-                    if has_original_ids:
-                        headers.append('original_qa_id')
-                    
-                    if has_feedback_options:
-                        headers.append('feedback_count')
-                        if include_scores:
-                            headers.extend(['avg_accuracy', 'avg_completeness', 'avg_clarity', 'avg_clinical_relevance'])
-                        if include_text_feedback:
-                            headers.append('text_feedback_combined')
-                        if include_gold_standards:
-                            headers.append('gold_standards_combined')
-                    
-                    writer.writerow(headers)
-                    
-                    # Write data
-                    for qa in qa_pairs:
-                        row = [qa.id, qa.question_text, qa.system_answer_text, qa.created_at.strftime('%Y-%m-%d %H:%M:%S')]
-                        
-                        if has_original_ids:
-                            row.append(qa.original_qa_id or '')
-                        
-                        if has_feedback_options:
-                            # Filter feedback by user IDs if specified
-                            feedback_list = qa.feedback
-                            if selected_user_ids is not None:
-                                feedback_list = [f for f in feedback_list if f.user_id in selected_user_ids]
-                            
-                            row.append(len(feedback_list))
-                            
-                            if include_scores:
-                                feedback_scores = {
-                                    'accuracy': [f.accuracy_score for f in feedback_list if f.accuracy_score],
-                                    'completeness': [f.completeness_score for f in feedback_list if f.completeness_score],
-                                    'clarity': [f.clarity_score for f in feedback_list if f.clarity_score],
-                                    'clinical_relevance': [f.clinical_relevance_score for f in feedback_list if f.clinical_relevance_score]
-                                }
-                                
-                                for score_type in ['accuracy', 'completeness', 'clarity', 'clinical_relevance']:
-                                    scores = feedback_scores[score_type]
-                                    avg_score = round(sum(scores) / len(scores), 2) if scores else ''
-                                    row.append(avg_score)
-                            
-                            if include_text_feedback:
-                                text_feedback = [f.text_feedback for f in feedback_list if f.text_feedback]
-                                combined_text = ' | '.join(text_feedback) if text_feedback else ''
-                                row.append(combined_text)
-                            
-                            if include_gold_standards:
-                                gold_standards = [f.gold_standard_answer for f in feedback_list if f.gold_standard_answer]
-                                combined_gold = ' | '.join(gold_standards) if gold_standards else ''
-                                row.append(combined_gold)
-                        
-                        writer.writerow(row)
-                
-                output.seek(0)
-                output_bytes = io.BytesIO(output.getvalue().encode('utf-8'))
-                output_bytes.seek(0)
-                
-                return send_file(
-                    output_bytes,
-                    mimetype='text/csv',
-                    as_attachment=True,
-                    download_name=f'{dataset.name}_feedback.csv'
-                )
+            # JSON and CSV are encoded pair by pair from a single streamed query
+            # and sent as one buffered file
+            options = dict(selected_user_ids=selected_user_ids, include_gold_standards=include_gold_standards,
+                           include_scores=include_scores, include_text_feedback=include_text_feedback)
+            chunks = iter_json_export(dataset_id, **options) if format_type == 'json' else iter_csv_export(dataset_id, **options)
+            output_bytes = io.BytesIO(''.join(defer_to_interactive(chunks)).encode('utf-8'))
+            mimetype, extension = export_mimetype_and_extension(format_type)
+            
+            return send_file(
+                output_bytes,
+                mimetype=mimetype,
+                as_attachment=True,
+                download_name=f'{dataset.name}_feedback.{extension}'
+            )
         
         except Exception as e:
             return jsonify({'error': f'Download failed: {str(e)}'}), 500
@@ -898,16 +1246,14 @@ def register_routes(app):
         try:
             dataset = Dataset.query.get_or_404(dataset_id)
             
-            # Delete all associated Q&A pairs and feedback
-            qa_pairs = QuestionAnswerPair.query.filter_by(dataset_id=dataset_id).all()
-            for qa in qa_pairs:
-                # Delete all feedback for this Q&A pair
-                Feedback.query.filter_by(qa_pair_id=qa.id).delete()
-                db.session.delete(qa)
+            # Delete all associated Q&A pairs, feedback, assignments and answer history
+            delete_dataset_rows(dataset_id)
             
-            # Delete the dataset
+            # Delete the dataset, and its archive files once the delete is committed
             db.session.delete(dataset)
+            publish('dataset_deleted', dataset_id=dataset_id)
             db.session.commit()
+            remove_archive(archive_root(app), dataset)
             
             return jsonify({
                 'success': True,
@@ -919,12 +1265,14 @@ def register_routes(app):
             return jsonify({'success': False, 'message': f'Delete failed: {str(e)}'})
 
     @app.route('/export_data')
+    @read_replica
     def export_data():
         """Export feedback data as JSON for ML pipeline"""
-        qa_pairs = QuestionAnswerPair.query.all()
         data = []
         
-        for qa in qa_pairs:
+        # Live pairs first, then the pairs of archived datasets
+        qa_pairs = itertools.chain(iter_qa_with_feedback(), iter_archived_qa_with_feedback(archive_root(app)))
+        for qa, feedback_list in defer_to_interactive(qa_pairs):
             qa_data = {
                 'id': qa.id,
                 'question': qa.question_text,
@@ -932,7 +1280,7 @@ def register_routes(app):
                 'feedback': []
             }
             
-            for feedback in qa.feedback:
+            for feedback in feedback_list:
                 feedback_data = {
                     'text_feedback': feedback.text_feedback,
                     'accuracy_score': feedback.accuracy_score,
@@ -948,9 +1296,47 @@ def register_routes(app):
         
         return jsonify(data)
 
+    @app.route('/api/changes')
+    @login_required
+    def api_changes():
+        """Stream Q&A pairs and feedback created or modified since a cursor or watermark as NDJSON"""
+        try:
+            if request.args.get('cursor'):
+                positions = decode_cursor(request.args['cursor'])
+            elif request.args.get('since'):
+                positions = cursor_from_watermark(request.args['since'])
+            else:
+                positions = {'qa_pair': None, 'feedback': None}
+            
+            dataset_ids = None
+            if request.args.get('dataset_ids'):
+                dataset_ids = [int(d.strip()) for d in request.args['dataset_ids'].split(',') if d.strip()]
+            user_ids = None
+            if request.args.get('user_ids'):
+                user_ids = [int(u.strip()) for u in request.args['user_ids'].split(',') if u.strip()]
+            limit = min(int(request.args.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except CursorError as e:
+            return jsonify({'error': str(e)}), 400
+        except ValueError:
+            return jsonify({'error': 'Invalid dataset_ids, user_ids or limit'}), 400
+        
+        # Non-admins only see datasets they have access to
+        if not current_user.is_admin():
+            accessible_ids = [dataset.id for dataset in current_user.accessible_datasets]
+            if dataset_ids is None:
+                dataset_ids = accessible_ids
+            elif any(dataset_id not in accessible_ids for dataset_id in dataset_ids):
+                return jsonify({'error': 'Access denied'}), 403
+        
+        return Response(
+            stream_with_context(stream_changes(positions, dataset_ids=dataset_ids, user_ids=user_ids, limit=limit)),
+            mimetype='application/x-ndjson'
+        )
+
     # API endpoints for AJAX functionality
     @app.route('/api/datasets')
     @login_required
+    @read_replica
     def api_get_datasets():
         """Get datasets user has access to"""
         datasets = current_user.accessible_datasets
@@ -962,6 +1348,7 @@ def register_routes(app):
 
     @app.route('/api/dataset/<int:dataset_id>/users')
     @login_required
+    @read_replica
     def api_get_dataset_users(dataset_id):
         """Get users who have provided feedback for a specific dataset"""
         # Check if user has access to this dataset
@@ -969,12 +1356,15 @@ def register_routes(app):
             return jsonify({'error': 'Access denied'}), 403
         
         # Get all users who have provided feedback for this dataset
-        feedback_user_ids = db.session.query(Feedback.user_id).distinct().\
-            join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).\
-            filter(QuestionAnswerPair.dataset_id == dataset_id).\
-            filter(Feedback.user_id.isnot(None)).all()
-        
-        user_ids = [uid[0] for uid in feedback_user_ids]
+        dataset = Dataset.query.get_or_404(dataset_id)
+        if dataset.is_archived():
+            user_ids = [int(user_id) for user_id in archive_summary(dataset)['reviewers']]
+        else:
+            feedback_user_ids = db.session.query(Feedback.user_id).distinct().\
+                join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).\
+                filter(QuestionAnswerPair.dataset_id == dataset_id).\
+                filter(Feedback.user_id.isnot(None)).all()
+            user_ids = [uid[0] for uid in feedback_user_ids]
         users = User.query.filter(User.id.in_(user_ids)).all() if user_ids else []
         
         return jsonify([{
@@ -984,32 +1374,174 @@ def register_routes(app):
 
     @app.route('/api/dataset/<int:dataset_id>/qa')
     @login_required
+    @read_replica
     def api_get_dataset_qa(dataset_id):
-        """Get Q&A pairs for a specific dataset"""
+        """Get Q&A pairs for a specific dataset
+        
+        With status=pending|feedback|gold|completed (comma-separated), limit/offset
+        or facets=true the response is an object with the matching items, their
+        total and per-status counts for the current user; otherwise a plain list.
+        """
         # Check if user has access to this dataset
         if not current_user.has_dataset_access(dataset_id):
             return jsonify({'error': 'Access denied'}), 403
+        
+        try:
+            statuses = parse_statuses(request.args.get('status'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            limit = int(request.args['limit']) if request.args.get('limit') else None
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit or offset'}), 400
+        if (limit is not None and limit < 1) or offset < 0:
+            return jsonify({'error': 'Invalid limit or offset'}), 400
+        with_facets = (statuses is not None or limit is not None or
+                       request.args.get('facets', 'false').lower() == 'true')
             
-        qa_pairs = QuestionAnswerPair.query.filter_by(dataset_id=dataset_id).order_by(QuestionAnswerPair.created_at.desc()).all()
+        # Full texts are only sent when explicitly requested, and only for the rows on this page
+        include_text = request.args.get('include_text', 'false').lower() == 'true'
+        rows = qa_list_rows(dataset_id, current_user.id, statuses=statuses, limit=limit, offset=offset)
+        full_texts = qa_texts(dataset_id, [qa.id for qa in rows]) if include_text else {}
         
         data = []
-        for qa in qa_pairs:
-            # Get current user's feedback for this Q&A
-            user_feedback = [f for f in qa.feedback if f.user_id == current_user.id]
+        for qa in rows:
             qa_data = {
                 'id': qa.id,
-                'question_text': qa.question_text,
-                'system_answer_text': qa.system_answer_text,
-                'feedback_count': len(user_feedback),
-                'has_gold_standard': any(f.gold_standard_answer for f in user_feedback),
-                'created_at': qa.created_at.isoformat()
+                'question_preview': qa.question_preview + ('...' if qa.question_truncated else ''),
+                'feedback_count': qa.feedback_count,
+                'has_gold_standard': qa.has_gold_standard,
+                'created_at': qa.created_at.isoformat() if qa.created_at else None
             }
+            if include_text:
+                qa_data['question_text'], qa_data['system_answer_text'] = full_texts[qa.id]
             data.append(qa_data)
         
-        return jsonify(data)
+        if not with_facets:
+            return jsonify(data)
+        
+        facets = status_facets(dataset_id, current_user.id)
+        selected = REVIEW_STATUSES if statuses is None else [REVIEW_STATUSES[code] for code in statuses]
+        return jsonify({
+            'items': data,
+            'total': sum(facets[status] for status in selected),
+            'offset': offset,
+            'limit': limit,
+            'facets': facets
+        })
+
+    @app.route('/api/dataset/<int:dataset_id>/qa_index')
+    @login_required
+    @read_replica
+    def api_get_dataset_qa_index(dataset_id):
+        """Get a compact status index of the Q&A pairs in a dataset"""
+        if not current_user.has_dataset_access(dataset_id):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        try:
+            statuses = parse_statuses(request.args.get('status'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(qa_status_index(dataset_id, current_user.id, statuses))
+
+    @app.route('/api/dataset/<int:dataset_id>/qa_previews')
+    @login_required
+    @read_replica
+    def api_get_dataset_qa_previews(dataset_id):
+        """Get question previews for a window of Q&A pairs"""
+        if not current_user.has_dataset_access(dataset_id):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        try:
+            qa_ids = [int(qa_id) for qa_id in request.args.get('ids', '').split(',') if qa_id.strip()]
+        except ValueError:
+            return jsonify({'error': 'Invalid ids format'}), 400
+        if len(qa_ids) > 500:
+            return jsonify({'error': 'At most 500 ids per request'}), 400
+        
+        return jsonify(question_previews(dataset_id, qa_ids))
+
+    @app.route('/api/dataset/<int:dataset_id>/next', methods=['POST'])
+    @login_required
+    def api_claim_next_qa(dataset_id):
+        """Lease the next Q&A pair the current user should review"""
+        if not current_user.has_dataset_access(dataset_id):
+            return jsonify({'error': 'Access denied'}), 403
+        Dataset.query.get_or_404(dataset_id)
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            lease_seconds = int(data['lease_seconds']) if data.get('lease_seconds') is not None else None
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': 'Invalid lease_seconds'})
+        
+        try:
+            assignment = claim_next(dataset_id, current_user.id, lease_seconds)
+        except SchedulerError as e:
+            return jsonify({'success': False, 'message': str(e)})
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Error claiming next item: {str(e)}'})
+        
+        if assignment is None:
+            return jsonify({
+                'success': True,
+                'assignment': None,
+                'message': 'No Q&A pairs left for you to review in this dataset'
+            })
+        
+        qa_pair = db.session.get(QuestionAnswerPair, assignment.qa_pair_id)
+        return jsonify({
+            'success': True,
+            'assignment': assignment_to_dict(assignment),
+            'qa': {
+                'id': qa_pair.id,
+                'original_qa_id': qa_pair.original_qa_id,
+                'question_text': qa_pair.question_text,
+                'system_answer_text': qa_pair.system_answer_text
+            }
+        })
+
+    @app.route('/api/dataset/<int:dataset_id>/release', methods=['POST'])
+    @login_required
+    def api_release_qa(dataset_id):
+        """Give back the current user's lease on a Q&A pair"""
+        if not current_user.has_dataset_access(dataset_id):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        data = request.get_json()
+        if not data or 'qa_id' not in data:
+            return jsonify({'success': False, 'message': 'Missing Q&A ID'})
+        
+        try:
+            released = release(dataset_id, current_user.id, data['qa_id'])
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'message': f'Error releasing item: {str(e)}'})
+        
+        return jsonify({
+            'success': released,
+            'message': 'Item released' if released else 'No active lease on this item'
+        })
+
+    @app.route('/api/dataset/<int:dataset_id>/progress')
+    @login_required
+    @read_replica
+    def api_dataset_progress(dataset_id):
+        """Review coverage of a dataset against its target overlap"""
+        if not current_user.has_dataset_access(dataset_id):
+            return jsonify({'error': 'Access denied'}), 403
+        Dataset.query.get_or_404(dataset_id)
+        
+        # Reviewers only see their own contribution; admins see the whole team
+        user_id = None if current_user.is_admin() else current_user.id
+        return jsonify(dataset_progress(dataset_id, user_id))
 
     @app.route('/api/qa/<int:qa_id>')
     @login_required
+    @read_replica
     def api_get_qa(qa_id):
         """Get Q&A pair data as JSON with feedback"""
         qa_pair = QuestionAnswerPair.query.get_or_404(qa_id)
@@ -1040,6 +1572,7 @@ def register_routes(app):
 
     @app.route('/api/feedback/<int:qa_id>')
     @login_required
+    @read_replica
     def api_get_feedback(qa_id):
         """Get current user's feedback for a Q&A pair as JSON"""
         feedback_list = Feedback.query.filter_by(qa_pair_id=qa_id, user_id=current_user.id).order_by(Feedback.submitted_at.desc()).all()
@@ -1085,18 +1618,26 @@ def register_routes(app):
             # Check if user already has feedback for this Q&A pair
             existing_feedback = Feedback.query.filter_by(qa_pair_id=qa_id, user_id=current_user.id).first()
             
+            # Counted once per pair on the datasets page
+            gold_added = not (existing_feedback and existing_feedback.gold_standard_answer)
             if existing_feedback:
-                # Update existing feedback with gold standard
+                # Update existing feedback with gold standard (bump updated_at even if the text is unchanged)
                 existing_feedback.gold_standard_answer = gold_standard_text
+                existing_feedback.answer_revision = qa_pair.revision
+                existing_feedback.updated_at = datetime.utcnow()
             else:
                 # Create new feedback record with just the gold standard
                 feedback = Feedback(
                     qa_pair_id=qa_id,
                     user_id=current_user.id,
+                    answer_revision=qa_pair.revision,
                     gold_standard_answer=gold_standard_text
                 )
                 db.session.add(feedback)
             
+            complete_assignment(qa_id, current_user.id)
+            publish('feedback', dataset_id=qa_pair.dataset_id, user_id=current_user.id, qa_pair_id=qa_id,
+                    created=existing_feedback is None, gold_added=gold_added)
             db.session.commit()
             
             return jsonify({
@@ -1126,6 +1667,7 @@ def register_routes(app):
             
             # Find existing feedback record or create new one
             feedback = Feedback.query.filter_by(qa_pair_id=qa_id, user_id=current_user.id).first()
+            created = feedback is None
             
             if feedback:
                 # Update existing feedback (preserve gold standard)
@@ -1135,12 +1677,14 @@ def register_routes(app):
                 feedback.clarity_score = data.get('clarity_score')
                 feedback.clinical_relevance_score = data.get('clinical_relevance_score')
                 # Don't update gold_standard_answer - it's handled separately
+                feedback.answer_revision = qa_pair.revision
                 feedback.submitted_at = datetime.utcnow()
             else:
                 # Create new feedback record (without gold standard)
                 feedback = Feedback(
                     qa_pair_id=qa_id,
                     user_id=current_user.id,
+                    answer_revision=qa_pair.revision,
                     text_feedback=data.get('text_feedback'),
                     accuracy_score=data.get('accuracy_score'),
                     completeness_score=data.get('completeness_score'),
@@ -1149,6 +1693,9 @@ def register_routes(app):
                     # Don't set gold_standard_answer - it's handled separately
                 )
                 db.session.add(feedback)
+            complete_assignment(qa_id, current_user.id)
+            publish('feedback', dataset_id=qa_pair.dataset_id, user_id=current_user.id, qa_pair_id=qa_id,
+                    created=created, gold_added=False)
             db.session.commit()
             
             return jsonify({
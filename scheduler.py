@@ -0,0 +1,244 @@
+"""
+Work allocation for reviewer teams.
+
+Each dataset has a target overlap (reviewers per Q&A pair). A reviewer asking
+for the next item is given a time-limited lease on the least-covered pair they
+have not reviewed yet, where coverage counts both submitted feedback and
+other reviewers' active leases. Expired leases are simply ignored and cleaned
+up on the next claim, so abandoned items flow back into the queue.
+
+Claims are atomic: on PostgreSQL candidate rows are locked with
+SELECT ... FOR UPDATE SKIP LOCKED so concurrent reviewers never wait on each
+other, and on every backend the lease is written with a conditional
+INSERT ... SELECT that re-checks coverage in the same statement (on SQLite
+that statement runs under the database write lock).
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, delete, exists, func, insert, literal, select, update
+
+from models import db, Dataset, Feedback, QuestionAnswerPair, ReviewAssignment, User
+
+DEFAULT_LEASE_SECONDS = 15 * 60
+MAX_LEASE_SECONDS = 24 * 60 * 60
+
+# Candidates tried per claim before giving up under heavy contention
+MAX_CLAIM_ATTEMPTS = 5
+
+
+class SchedulerError(ValueError):
+    """Raised for invalid scheduler settings"""
+
+
+def _reviewed_count():
+    """Correlated count of distinct reviewers with feedback on a pair"""
+    return select(func.count(func.distinct(Feedback.user_id))).where(
+        Feedback.qa_pair_id == QuestionAnswerPair.id,
+        Feedback.user_id.isnot(None)
+    ).scalar_subquery()
+
+
+def _leased_count(now):
+    """Correlated count of active, uncompleted leases on a pair"""
+    return select(func.count(ReviewAssignment.id)).where(
+        ReviewAssignment.qa_pair_id == QuestionAnswerPair.id,
+        ReviewAssignment.completed_at.is_(None),
+        ReviewAssignment.expires_at > now
+    ).scalar_subquery()
+
+
+def _claimable(dataset_id, user_id, target, now):
+    """Conditions for a pair the user may claim"""
+    return and_(
+        QuestionAnswerPair.dataset_id == dataset_id,
+        _reviewed_count() + _leased_count(now) < target,
+        ~exists().where(Feedback.qa_pair_id == QuestionAnswerPair.id, Feedback.user_id == user_id),
+        ~exists().where(ReviewAssignment.qa_pair_id == QuestionAnswerPair.id, ReviewAssignment.user_id == user_id)
+    )
+
+
+def _expire_leases(dataset_id, now):
+    db.session.execute(delete(ReviewAssignment).where(
+        ReviewAssignment.dataset_id == dataset_id,
+        ReviewAssignment.completed_at.is_(None),
+        ReviewAssignment.expires_at <= now
+    ))
+
+
+def _active_lease(dataset_id, user_id, now):
+    return ReviewAssignment.query.filter(
+        ReviewAssignment.dataset_id == dataset_id,
+        ReviewAssignment.user_id == user_id,
+        ReviewAssignment.completed_at.is_(None),
+        ReviewAssignment.expires_at > now
+    ).order_by(ReviewAssignment.claimed_at).first()
+
+
+def _lease_seconds(lease_seconds):
+    if lease_seconds is None:
+        return DEFAULT_LEASE_SECONDS
+    if lease_seconds < 1 or lease_seconds > MAX_LEASE_SECONDS:
+        raise SchedulerError(f'Lease must be between 1 and {MAX_LEASE_SECONDS} seconds')
+    return lease_seconds
+
+
+def claim_next(dataset_id, user_id, lease_seconds=None):
+    """Lease the least-covered pair the user still has to review, or None when nothing is left
+
+    A reviewer who already holds an active lease in the dataset gets it back
+    with a renewed expiry, so repeated calls do not hoard items.
+    """
+    lease = timedelta(seconds=_lease_seconds(lease_seconds))
+    dataset = db.session.get(Dataset, dataset_id)
+    target = dataset.target_overlap or 1
+    postgres = db.engine.dialect.name == 'postgresql'
+
+    now = datetime.utcnow()
+    _expire_leases(dataset_id, now)
+    held = _active_lease(dataset_id, user_id, now)
+    if held:
+        held.expires_at = now + lease
+        db.session.commit()
+        return held
+
+    coverage = _reviewed_count() + _leased_count(now)
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        candidate = select(QuestionAnswerPair.id).\
+            where(_claimable(dataset_id, user_id, target, now)).\
+            order_by(coverage, QuestionAnswerPair.id).limit(1)
+        if postgres:
+            candidate = candidate.with_for_update(skip_locked=True, of=QuestionAnswerPair)
+        qa_id = db.session.execute(candidate).scalar()
+        if qa_id is None:
+            db.session.commit()
+            return None
+
+        # Coverage is re-checked in the insert itself, so a pair that filled up
+        # since it was selected is skipped rather than over-assigned
+        result = db.session.execute(insert(ReviewAssignment).from_select(
+            ['dataset_id', 'qa_pair_id', 'user_id', 'claimed_at', 'expires_at'],
+            select(
+                literal(dataset_id), QuestionAnswerPair.id, literal(user_id), literal(now), literal(now + lease)
+            ).where(QuestionAnswerPair.id == qa_id, _claimable(dataset_id, user_id, target, now))
+        ))
+        db.session.commit()
+        if result.rowcount:
+            return ReviewAssignment.query.filter_by(qa_pair_id=qa_id, user_id=user_id).one()
+        now = datetime.utcnow()
+    return None
+
+
+def release(dataset_id, user_id, qa_pair_id):
+    """Give back an uncompleted lease; returns whether one was released"""
+    result = db.session.execute(delete(ReviewAssignment).where(
+        ReviewAssignment.dataset_id == dataset_id,
+        ReviewAssignment.user_id == user_id,
+        ReviewAssignment.qa_pair_id == qa_pair_id,
+        ReviewAssignment.completed_at.is_(None)
+    ))
+    db.session.commit()
+    return result.rowcount > 0
+
+
+def complete_assignment(qa_pair_id, user_id):
+    """Mark the user's lease on a pair as completed (part of the caller's transaction)"""
+    db.session.execute(update(ReviewAssignment).where(
+        ReviewAssignment.qa_pair_id == qa_pair_id,
+        ReviewAssignment.user_id == user_id,
+        ReviewAssignment.completed_at.is_(None)
+    ).values(completed_at=datetime.utcnow()))
+
+
+def set_target_overlap(dataset_id, target_overlap):
+    """Change how many reviewers each pair in a dataset should get"""
+    if not isinstance(target_overlap, int) or isinstance(target_overlap, bool) or target_overlap < 1:
+        raise SchedulerError('Target overlap must be a positive integer')
+    dataset = db.session.get(Dataset, dataset_id)
+    dataset.target_overlap = target_overlap
+    db.session.commit()
+    return dataset
+
+
+def dataset_progress(dataset_id, user_id=None):
+    """Coverage accounting for a dataset against its target overlap"""
+    target = db.session.get(Dataset, dataset_id).target_overlap or 1
+    now = datetime.utcnow()
+
+    reviewers = select(
+        Feedback.qa_pair_id,
+        func.count(func.distinct(Feedback.user_id)).label('reviewers')
+    ).join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).\
+        where(QuestionAnswerPair.dataset_id == dataset_id, Feedback.user_id.isnot(None)).\
+        group_by(Feedback.qa_pair_id).subquery()
+    count = func.coalesce(reviewers.c.reviewers, 0)
+    pairs, reviews_done, covered, partial, over_covered = db.session.execute(select(
+        func.count(QuestionAnswerPair.id),
+        func.sum(case((count >= target, target), else_=count)),
+        func.sum(case((count >= target, 1), else_=0)),
+        func.sum(case((and_(count > 0, count < target), 1), else_=0)),
+        func.sum(case((count > target, 1), else_=0))
+    ).outerjoin(reviewers, reviewers.c.qa_pair_id == QuestionAnswerPair.id).
+        where(QuestionAnswerPair.dataset_id == dataset_id)).one()
+
+    active_leases = db.session.execute(select(func.count(ReviewAssignment.id)).where(
+        ReviewAssignment.dataset_id == dataset_id,
+        ReviewAssignment.completed_at.is_(None),
+        ReviewAssignment.expires_at > now
+    )).scalar()
+
+    reviews_required = pairs * target
+    reviews_done = reviews_done or 0
+    progress = {
+        'dataset_id': dataset_id,
+        'target_overlap': target,
+        'pairs': pairs,
+        'fully_covered_pairs': covered or 0,
+        'partially_covered_pairs': partial or 0,
+        'unreviewed_pairs': pairs - (covered or 0) - (partial or 0),
+        'over_covered_pairs': over_covered or 0,
+        'reviews_required': reviews_required,
+        'reviews_done': reviews_done,
+        'reviews_remaining': reviews_required - reviews_done,
+        'active_leases': active_leases,
+        'percent_complete': round(100.0 * reviews_done / reviews_required, 1) if reviews_required else 100.0
+    }
+
+    # Per-reviewer contribution: pairs reviewed, leases completed and currently held
+    reviewed = dict(db.session.execute(select(
+        Feedback.user_id, func.count(func.distinct(Feedback.qa_pair_id))
+    ).join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).
+        where(QuestionAnswerPair.dataset_id == dataset_id, Feedback.user_id.isnot(None)).
+        group_by(Feedback.user_id)).all())
+    leases = {
+        lease_user_id: (completed, held)
+        for lease_user_id, completed, held in db.session.execute(select(
+            ReviewAssignment.user_id,
+            func.sum(case((ReviewAssignment.completed_at.isnot(None), 1), else_=0)),
+            func.sum(case((and_(ReviewAssignment.completed_at.is_(None), ReviewAssignment.expires_at > now), 1), else_=0))
+        ).where(ReviewAssignment.dataset_id == dataset_id).group_by(ReviewAssignment.user_id))
+    }
+    user_ids = set(reviewed) | set(leases)
+    if user_id is not None:
+        user_ids &= {user_id}
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids)).all()) if user_ids else {}
+    progress['reviewers'] = [
+        {
+            'user_id': reviewer_id,
+            'username': usernames.get(reviewer_id),
+            'reviewed_pairs': reviewed.get(reviewer_id, 0),
+            'completed_assignments': int(leases.get(reviewer_id, (0, 0))[0] or 0),
+            'active_leases': int(leases.get(reviewer_id, (0, 0))[1] or 0)
+        }
+        for reviewer_id in sorted(user_ids)
+    ]
+    return progress
+
+
+def assignment_to_dict(assignment):
+    return {
+        'qa_id': assignment.qa_pair_id,
+        'dataset_id': assignment.dataset_id,
+        'claimed_at': assignment.claimed_at.isoformat() if assignment.claimed_at else None,
+        'expires_at': assignment.expires_at.isoformat()
+    }
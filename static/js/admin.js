@@ -74,8 +74,10 @@ function deleteUser() {
             showAlert('User deleted successfully', 'success');
             // Close modal
             bootstrap.Modal.getInstance(document.getElementById('editUserModal')).hide();
-            // Reload the page to show updated user list
-            setTimeout(() => window.location.reload(), 1000);
+            // The live stream updates the user list; reload only without it
+            if (!liveUpdates.connected) {
+                setTimeout(() => window.location.reload(), 1000);
+            }
         } else {
             showAlert(data.message || 'Error deleting user', 'error');
             // Reset button state
@@ -126,8 +128,10 @@ function saveUserChanges() {
             showAlert('User updated successfully', 'success');
             // Close modal
             bootstrap.Modal.getInstance(document.getElementById('editUserModal')).hide();
-            // Reload the page to show updated data
-            setTimeout(() => window.location.reload(), 1000);
+            // The live stream updates the row; reload only without it
+            if (!liveUpdates.connected) {
+                setTimeout(() => window.location.reload(), 1000);
+            }
         } else {
             showAlert(data.message || 'Error updating user', 'error');
         }
@@ -559,6 +563,514 @@ function removeDatasetFromUser(userId, datasetId) {
     });
 }
 
+// Bulk access import functionality
+function showBulkAccessImport() {
+    // Create modal if it doesn't exist
+    if (!document.getElementById('bulkAccessModal')) {
+        const modalHtml = `
+        <div class="modal fade" id="bulkAccessModal" tabindex="-1" aria-labelledby="bulkAccessModalLabel" aria-hidden="true">
+            <div class="modal-dialog modal-lg">
+                <div class="modal-content">
+                    <div class="modal-header">
+                        <h5 class="modal-title" id="bulkAccessModalLabel">Bulk Dataset Access</h5>
+                        <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
+                    </div>
+                    <div class="modal-body">
+                        <p class="text-muted small">
+                            Upload a CSV with <code>user</code> and <code>dataset</code> columns (usernames/dataset names or IDs)
+                            and an optional <code>action</code> column (<code>grant</code> or <code>revoke</code>, default grant).
+                        </p>
+                        <input type="file" class="form-control" id="bulkAccessFile" accept=".csv">
+                        <div id="bulkAccessResult" class="mt-3"></div>
+                    </div>
+                    <div class="modal-footer">
+                        <button type="button" class="btn btn-outline-secondary" onclick="importBulkAccess(true)">Validate</button>
+                        <button type="button" class="btn btn-primary" id="bulkAccessImportBtn" onclick="importBulkAccess(false)">
+                            <i class="fas fa-file-import me-2"></i>Import
+                        </button>
+                    </div>
+                </div>
+            </div>
+        </div>
+        `;
+        document.body.insertAdjacentHTML('beforeend', modalHtml);
+    }
+
+    document.getElementById('bulkAccessFile').value = '';
+    document.getElementById('bulkAccessResult').innerHTML = '';
+
+    // Show modal
+    const modal = new bootstrap.Modal(document.getElementById('bulkAccessModal'));
+    modal.show();
+}
+
+function importBulkAccess(dryRun) {
+    const fileInput = document.getElementById('bulkAccessFile');
+    const resultDiv = document.getElementById('bulkAccessResult');
+    if (!fileInput.files.length) {
+        showAlert('Please select a CSV file', 'error');
+        return;
+    }
+
+    const formData = new FormData();
+    formData.append('file', fileInput.files[0]);
+    formData.append('dry_run', dryRun ? 'true' : 'false');
+    resultDiv.innerHTML = '<div class="text-center"><i class="fas fa-spinner fa-spin me-2"></i>Processing...</div>';
+
+    fetch('/api/admin/access/import', {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            resultDiv.innerHTML = '';
+            showAlert(data.message || 'Error importing access', 'error');
+            return;
+        }
+
+        // Messages echo CSV contents, so escape them before rendering
+        const escapeHtml = text => {
+            const span = document.createElement('span');
+            span.textContent = text;
+            return span.innerHTML;
+        };
+        const errorRows = data.errors.map(error => `<li>Line ${error.line}: ${escapeHtml(error.message)}</li>`).join('');
+        resultDiv.innerHTML = `
+            <div class="alert alert-${data.error_count ? 'warning' : 'success'} mb-0">
+                ${data.message}
+                ${data.error_count ? `<br><strong>${data.error_count} rows skipped:</strong><ul class="mb-0">${errorRows}</ul>` : ''}
+            </div>
+        `;
+        if (!dryRun) {
+            showAlert(data.message, 'success');
+        }
+    })
+    .catch(error => {
+        console.error('Error importing access:', error);
+        resultDiv.innerHTML = '';
+        showAlert('Error importing access', 'error');
+    });
+}
+
+// Dataset reviewer agreement functionality
+function showDatasetAgreement(datasetId, datasetName) {
+    // Create modal if it doesn't exist
+    if (!document.getElementById('datasetAgreementModal')) {
+        const modalHtml = `
+        <div class="modal fade" id="datasetAgreementModal" tabindex="-1" aria-labelledby="datasetAgreementModalLabel" aria-hidden="true">
+            <div class="modal-dialog modal-xl">
+                <div class="modal-content">
+                    <div class="modal-header">
+                        <h5 class="modal-title" id="datasetAgreementModalLabel">Reviewer Agreement</h5>
+                        <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
+                    </div>
+                    <div class="modal-body">
+                        <div id="datasetAgreementBody">
+                            <div class="text-center">Loading agreement...</div>
+                        </div>
+                        <hr>
+                        <h6>System Answer vs Gold Standard Similarity</h6>
+                        <div id="datasetTextMetricsBody">
+                            <div class="text-center">Loading similarity metrics...</div>
+                        </div>
+                    </div>
+                    <div class="modal-footer">
+                        <button type="button" class="btn btn-outline-primary me-auto" id="recomputeTextMetricsBtn" onclick="recomputeTextMetrics()">
+                            <i class="fas fa-sync-alt me-2"></i>Recompute Similarity
+                        </button>
+                        <button type="button" class="btn btn-secondary" data-bs-dismiss="modal">Close</button>
+                    </div>
+                </div>
+            </div>
+        </div>
+        `;
+        document.body.insertAdjacentHTML('beforeend', modalHtml);
+    }
+
+    document.getElementById('datasetAgreementModalLabel').textContent = `Reviewer Agreement for Dataset: ${datasetName}`;
+    currentDatasetId = datasetId;
+    loadDatasetAgreement(datasetId);
+    loadDatasetTextMetrics(datasetId);
+
+    // Show modal
+    const modal = new bootstrap.Modal(document.getElementById('datasetAgreementModal'));
+    modal.show();
+}
+
+function formatAgreementValue(value) {
+    return value === null || value === undefined ? '<em class="text-muted">n/a</em>' : value.toFixed(3);
+}
+
+function loadDatasetAgreement(datasetId) {
+    const body = document.getElementById('datasetAgreementBody');
+    body.innerHTML = '<div class="text-center"><i class="fas fa-spinner fa-spin me-2"></i>Computing agreement...</div>';
+
+    fetch(`/api/admin/dataset/${datasetId}/agreement`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                body.innerHTML = '<div class="alert alert-danger">Error loading agreement</div>';
+                showAlert(data.message || 'Error loading agreement', 'error');
+                return;
+            }
+
+            const agreement = data.agreement;
+            if (agreement.raters.length < 2) {
+                body.innerHTML = '<div class="alert alert-info">At least two reviewers must score this dataset before agreement can be measured.</div>';
+                return;
+            }
+
+            const dimensionRows = Object.entries(agreement.dimensions).map(([dimension, stats]) => `
+                <tr>
+                    <td>${dimension.replace('_', ' ')}</td>
+                    <td class="text-center">${formatAgreementValue(stats.krippendorff_alpha)}</td>
+                    <td class="text-center">${stats.rated_items}</td>
+                    <td class="text-center">${stats.multiply_rated_items}</td>
+                </tr>
+            `).join('');
+
+            const kappaRows = agreement.pairwise_kappa.map(pair => `
+                <tr>
+                    <td>${pair.dimension.replace('_', ' ')}</td>
+                    <td>${pair.username_a || pair.rater_a} / ${pair.username_b || pair.rater_b}</td>
+                    <td class="text-center">${pair.shared_items}</td>
+                    <td class="text-center">${formatAgreementValue(pair.cohen_kappa)}</td>
+                </tr>
+            `).join('') || '<tr><td colspan="4" class="text-center">No reviewer pairs share enough items</td></tr>';
+
+            const itemRows = agreement.most_disagreed_items.map(item => `
+                <tr>
+                    <td><a href="/qa/${item.qa_id}">Q${item.qa_id}</a></td>
+                    <td class="text-center">${item.raters}</td>
+                    <td class="text-center">${formatAgreementValue(item.disagreement)}</td>
+                </tr>
+            `).join('') || '<tr><td colspan="3" class="text-center">No items have more than one reviewer</td></tr>';
+
+            body.innerHTML = `
+                <h6>Krippendorff's Alpha (ordinal)</h6>
+                <table class="table table-sm table-hover">
+                    <thead>
+                        <tr>
+                            <th>Dimension</th>
+                            <th class="text-center">Alpha</th>
+                            <th class="text-center">Rated Items</th>
+                            <th class="text-center">Multiply Rated</th>
+                        </tr>
+                    </thead>
+                    <tbody>${dimensionRows}</tbody>
+                </table>
+                <div class="row">
+                    <div class="col-lg-7">
+                        <h6>Pairwise Cohen's Kappa</h6>
+                        <div class="table-responsive" style="max-height: 300px; overflow-y: auto;">
+                            <table class="table table-sm table-hover">
+                                <thead>
+                                    <tr>
+                                        <th>Dimension</th>
+                                        <th>Reviewers</th>
+                                        <th class="text-center">Shared Items</th>
+                                        <th class="text-center">Kappa</th>
+                                    </tr>
+                                </thead>
+                                <tbody>${kappaRows}</tbody>
+                            </table>
+                        </div>
+                    </div>
+                    <div class="col-lg-5">
+                        <h6>Most Disagreed Items</h6>
+                        <div class="table-responsive" style="max-height: 300px; overflow-y: auto;">
+                            <table class="table table-sm table-hover">
+                                <thead>
+                                    <tr>
+                                        <th>Q&A</th>
+                                        <th class="text-center">Reviewers</th>
+                                        <th class="text-center">Mean Std</th>
+                                    </tr>
+                                </thead>
+                                <tbody>${itemRows}</tbody>
+                            </table>
+                        </div>
+                    </div>
+                </div>
+            `;
+        })
+        .catch(error => {
+            console.error('Error loading agreement:', error);
+            body.innerHTML = '<div class="alert alert-danger">Error loading agreement</div>';
+            showAlert('Error loading agreement', 'error');
+        });
+}
+
+function renderTextMetrics(metrics) {
+    const body = document.getElementById('datasetTextMetricsBody');
+    if (metrics.scored_feedback === 0) {
+        body.innerHTML = '<div class="alert alert-info mb-0">No similarity metrics computed yet. Click "Recompute Similarity" to score gold standards.</div>';
+        return;
+    }
+
+    const rows = metrics.lowest_similarity.map(item => `
+        <tr>
+            <td><a href="/qa/${item.qa_id}">Q${item.qa_id}</a></td>
+            <td class="text-center">${formatAgreementValue(item.token_f1)}</td>
+            <td class="text-center">${formatAgreementValue(item.rouge_l)}</td>
+            <td class="text-center">${formatAgreementValue(item.edit_distance)}</td>
+        </tr>
+    `).join('');
+
+    body.innerHTML = `
+        <p class="mb-2">
+            <span class="badge bg-secondary me-2">${metrics.scored_feedback} gold standards</span>
+            <span class="badge bg-primary me-2">Token F1 ${formatAgreementValue(metrics.avg_token_f1)}</span>
+            <span class="badge bg-info me-2">ROUGE-L ${formatAgreementValue(metrics.avg_rouge_l)}</span>
+            <span class="badge bg-warning">Edit Distance ${formatAgreementValue(metrics.avg_edit_distance)}</span>
+        </p>
+        <div class="table-responsive" style="max-height: 250px; overflow-y: auto;">
+            <table class="table table-sm table-hover">
+                <thead>
+                    <tr>
+                        <th>Q&A</th>
+                        <th class="text-center">Token F1</th>
+                        <th class="text-center">ROUGE-L</th>
+                        <th class="text-center">Edit Distance</th>
+                    </tr>
+                </thead>
+                <tbody>${rows}</tbody>
+            </table>
+        </div>
+    `;
+}
+
+function loadDatasetTextMetrics(datasetId) {
+    const body = document.getElementById('datasetTextMetricsBody');
+    body.innerHTML = '<div class="text-center"><i class="fas fa-spinner fa-spin me-2"></i>Loading similarity metrics...</div>';
+
+    fetch(`/api/admin/dataset/${datasetId}/text_metrics`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                renderTextMetrics(data.metrics);
+            } else {
+                body.innerHTML = '<div class="alert alert-danger">Error loading similarity metrics</div>';
+            }
+        })
+        .catch(error => {
+            console.error('Error loading similarity metrics:', error);
+            body.innerHTML = '<div class="alert alert-danger">Error loading similarity metrics</div>';
+        });
+}
+
+function recomputeTextMetrics() {
+    const btn = document.getElementById('recomputeTextMetricsBtn');
+    const originalBtnText = btn.innerHTML;
+    btn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Computing...';
+    btn.disabled = true;
+
+    fetch(`/api/admin/dataset/${currentDatasetId}/text_metrics`, {
+        method: 'POST'
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showAlert(data.message, 'success');
+            renderTextMetrics(data.metrics);
+        } else {
+            showAlert(data.message || 'Error computing similarity metrics', 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Error computing similarity metrics:', error);
+        showAlert('Error computing similarity metrics', 'error');
+    })
+    .finally(() => {
+        btn.innerHTML = originalBtnText;
+        btn.disabled = false;
+    });
+}
+
+// Dataset cold storage functionality
+function moveDatasetStorage(action, datasetId, button) {
+    const originalBtnText = button.innerHTML;
+    button.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
+    button.disabled = true;
+
+    fetch(`/api/admin/datasets/${action}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            dataset_ids: [datasetId]
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            showAlert(data.message, 'success');
+            // The live stream re-renders the row; reload only without it
+            if (!liveUpdates.connected) {
+                setTimeout(() => window.location.reload(), 1000);
+            }
+        } else {
+            showAlert(data.message || `Error during ${action}`, 'error');
+            button.innerHTML = originalBtnText;
+            button.disabled = false;
+        }
+    })
+    .catch(error => {
+        console.error(`Error during ${action}:`, error);
+        showAlert(`Error during ${action}`, 'error');
+        button.innerHTML = originalBtnText;
+        button.disabled = false;
+    });
+}
+
+function archiveDataset(datasetId, datasetName, button) {
+    if (confirm(`Move the pairs and feedback of "${datasetName}" to cold storage? Downloads keep working; reviewing needs a rehydration.`)) {
+        moveDatasetStorage('archive', datasetId, button);
+    }
+}
+
+function rehydrateDataset(datasetId, datasetName, button) {
+    if (confirm(`Move "${datasetName}" back into the live tables?`)) {
+        moveDatasetStorage('rehydrate', datasetId, button);
+    }
+}
+
+// Dataset score distribution functionality
+function showDatasetScores(datasetId, datasetName) {
+    // Create modal if it doesn't exist
+    if (!document.getElementById('datasetScoresModal')) {
+        const modalHtml = `
+        <div class="modal fade" id="datasetScoresModal" tabindex="-1" aria-labelledby="datasetScoresModalLabel" aria-hidden="true">
+            <div class="modal-dialog modal-xl">
+                <div class="modal-content">
+                    <div class="modal-header">
+                        <h5 class="modal-title" id="datasetScoresModalLabel">Score Distributions</h5>
+                        <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
+                    </div>
+                    <div class="modal-body">
+                        <div id="datasetScoresBody">
+                            <div class="text-center">Loading score distributions...</div>
+                        </div>
+                    </div>
+                    <div class="modal-footer">
+                        <small class="text-muted me-auto" id="datasetScoresTiming"></small>
+                        <button type="button" class="btn btn-secondary" data-bs-dismiss="modal">Close</button>
+                    </div>
+                </div>
+            </div>
+        </div>
+        `;
+        document.body.insertAdjacentHTML('beforeend', modalHtml);
+    }
+
+    document.getElementById('datasetScoresModalLabel').textContent = `Score Distributions for Dataset: ${datasetName}`;
+    loadDatasetScores(datasetId);
+
+    // Show modal
+    const modal = new bootstrap.Modal(document.getElementById('datasetScoresModal'));
+    modal.show();
+}
+
+function formatScoreHistogram(histogram, count) {
+    return Object.entries(histogram).map(([score, n]) => {
+        const width = count ? Math.round(n / count * 100) : 0;
+        return `
+            <div class="d-flex align-items-center small">
+                <span class="me-2" style="width: 1em;">${score}</span>
+                <div class="progress flex-grow-1" style="height: 0.8em;">
+                    <div class="progress-bar" role="progressbar" style="width: ${width}%"></div>
+                </div>
+                <span class="ms-2 text-muted" style="width: 4em;">${n}</span>
+            </div>
+        `;
+    }).join('');
+}
+
+function loadDatasetScores(datasetId) {
+    const body = document.getElementById('datasetScoresBody');
+    const timing = document.getElementById('datasetScoresTiming');
+    body.innerHTML = '<div class="text-center"><i class="fas fa-spinner fa-spin me-2"></i>Computing score distributions...</div>';
+    timing.textContent = '';
+
+    fetch(`/api/admin/dataset/${datasetId}/scores`)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                body.innerHTML = '<div class="alert alert-danger">Error loading score distributions</div>';
+                showAlert(data.message || 'Error loading score distributions', 'error');
+                return;
+            }
+
+            const scores = data.scores;
+            timing.textContent = `${scores.ratings} ratings on ${scores.items} items, ${scores.cache} in ${scores.compute_ms} ms`;
+            if (scores.ratings === 0) {
+                body.innerHTML = '<div class="alert alert-info">No feedback has been submitted for this dataset yet.</div>';
+                return;
+            }
+
+            const dimensions = Object.keys(scores.dimensions);
+            const dimensionRows = Object.entries(scores.dimensions).map(([dimension, stats]) => `
+                <tr>
+                    <td>${dimension.replace('_', ' ')}</td>
+                    <td style="min-width: 200px;">${formatScoreHistogram(stats.histogram, stats.count)}</td>
+                    <td class="text-center">${formatAgreementValue(stats.mean)}</td>
+                    <td class="text-center">${stats.ci95 ? `${stats.ci95[0].toFixed(3)} – ${stats.ci95[1].toFixed(3)}` : '<em class="text-muted">n/a</em>'}</td>
+                    <td class="text-center">${formatAgreementValue(stats.std)}</td>
+                    <td class="text-center">${stats.count}</td>
+                    <td class="text-center">${stats.missing}</td>
+                </tr>
+            `).join('');
+
+            const reviewerRows = scores.reviewers.map(reviewer => `
+                <tr>
+                    <td>${reviewer.username || reviewer.id}</td>
+                    <td class="text-center">${reviewer.ratings}</td>
+                    ${dimensions.map(dimension => {
+                        const stats = reviewer.dimensions[dimension];
+                        return `<td class="text-center">${formatAgreementValue(stats.mean)} / ${formatAgreementValue(stats.bias)}</td>`;
+                    }).join('')}
+                </tr>
+            `).join('') || `<tr><td colspan="${dimensions.length + 2}" class="text-center">No reviewers have scored this dataset</td></tr>`;
+
+            body.innerHTML = `
+                <table class="table table-sm table-hover">
+                    <thead>
+                        <tr>
+                            <th>Dimension</th>
+                            <th>Histogram</th>
+                            <th class="text-center">Mean</th>
+                            <th class="text-center">95% CI</th>
+                            <th class="text-center">Std</th>
+                            <th class="text-center">Scored</th>
+                            <th class="text-center">Missing</th>
+                        </tr>
+                    </thead>
+                    <tbody>${dimensionRows}</tbody>
+                </table>
+                <h6>Reviewers <small class="text-muted">mean / bias against other reviewers of the same items</small></h6>
+                <div class="table-responsive" style="max-height: 300px; overflow-y: auto;">
+                    <table class="table table-sm table-hover">
+                        <thead>
+                            <tr>
+                                <th>Reviewer</th>
+                                <th class="text-center">Ratings</th>
+                                ${dimensions.map(dimension => `<th class="text-center">${dimension.replace('_', ' ')}</th>`).join('')}
+                            </tr>
+                        </thead>
+                        <tbody>${reviewerRows}</tbody>
+                    </table>
+                </div>
+            `;
+        })
+        .catch(error => {
+            console.error('Error loading score distributions:', error);
+            body.innerHTML = '<div class="alert alert-danger">Error loading score distributions</div>';
+            showAlert('Error loading score distributions', 'error');
+        });
+}
+
 // Helper function for showing alerts (reuse from main scripts.js)
 function showAlert(message, type = 'info') {
     var toast = document.createElement('div');
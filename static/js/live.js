@@ -0,0 +1,230 @@
+// Live updates for the admin and datasets pages: counters and rows change in place
+// as events arrive from /api/events, instead of reloading the page after every change
+
+const liveUpdates = {
+    connected: false,
+    view: null,
+    lastEventId: null,
+    source: null,
+    refreshTimer: null,
+    retryDelay: 2000
+};
+
+function liveRoot() {
+    return document.querySelector('[data-live-view]');
+}
+
+function liveRows(kind) {
+    return liveRoot().querySelectorAll(`tr[data-live-row="${kind}"]`);
+}
+
+function liveRow(kind, id) {
+    return liveRoot().querySelector(`tr[data-live-row="${kind}"][data-id="${id}"]`);
+}
+
+function setLiveValue(elements, value) {
+    elements.forEach(element => {
+        element.textContent = value;
+    });
+}
+
+function bumpLiveValue(elements, delta) {
+    elements.forEach(element => {
+        element.textContent = (parseInt(element.textContent, 10) || 0) + delta;
+    });
+}
+
+function bumpLiveTotal(name, delta) {
+    bumpLiveValue(liveRoot().querySelectorAll(`[data-live-total="${name}"]`), delta);
+}
+
+function bumpLiveRow(kind, id, name, delta) {
+    const row = liveRow(kind, id);
+    if (row) {
+        bumpLiveValue(row.querySelectorAll(`[data-live="${name}"]`), delta);
+        updateLiveProgress(row);
+    }
+}
+
+// Progress bars on the datasets page follow the row's own counts
+function updateLiveProgress(row) {
+    const bar = row.querySelector('.progress-bar[data-progress]');
+    if (!bar) {
+        return;
+    }
+    const done = parseInt(row.querySelector('[data-live="user_feedback_count"]').textContent, 10) || 0;
+    const total = parseInt(row.querySelector('[data-live="qa_count"]').textContent, 10) || 0;
+    const progress = total > 0 ? Math.round(done / total * 10000) / 100 : 0;
+    bar.setAttribute('data-progress', progress);
+    bar.setAttribute('aria-valuenow', done);
+    bar.setAttribute('aria-valuemax', total);
+    bar.style.width = progress + '%';
+}
+
+// Fetch a row rendered by the server and insert it, or replace the current one
+function loadLiveRow(kind, id) {
+    const tbody = liveRoot().querySelector(`tbody[data-live-rows="${kind}"]`);
+    if (!tbody) {
+        // The page was rendered with an empty table placeholder
+        window.location.reload();
+        return;
+    }
+    fetch(`/api/live/${liveUpdates.view}/rows/${kind}/${id}`)
+    .then(response => response.ok ? response.text() : null)
+    .then(html => {
+        const existing = liveRow(kind, id);
+        if (html === null) {
+            if (existing) {
+                existing.remove();
+            }
+            return;
+        }
+        const template = document.createElement('template');
+        template.innerHTML = html.trim();
+        const row = template.content.firstElementChild;
+        if (existing) {
+            existing.replaceWith(row);
+        } else if (tbody.dataset.liveInsert === 'prepend') {
+            tbody.prepend(row);
+        } else {
+            tbody.append(row);
+        }
+        updateLiveProgress(row);
+    })
+    .catch(error => console.error('Error loading row:', error));
+}
+
+// Bring every counter and row in line with the server's aggregate stats
+function applyLiveStats(stats) {
+    const root = liveRoot();
+    Object.entries(stats.totals).forEach(([name, value]) => {
+        setLiveValue(root.querySelectorAll(`[data-live-total="${name}"]`), value);
+    });
+    Object.entries(stats.rows).forEach(([kind, rows]) => {
+        const present = new Set();
+        liveRows(kind).forEach(row => {
+            const values = rows[row.dataset.id];
+            if (!values) {
+                row.remove();
+                return;
+            }
+            present.add(row.dataset.id);
+            Object.entries(values).forEach(([name, value]) => {
+                setLiveValue(row.querySelectorAll(`[data-live="${name}"]`), value);
+            });
+            updateLiveProgress(row);
+        });
+        Object.keys(rows).filter(id => !present.has(id)).forEach(id => loadLiveRow(kind, id));
+    });
+}
+
+// Coarse changes (uploads, deletions, access) refetch the stats, at most twice a second
+function scheduleLiveRefresh() {
+    if (liveUpdates.refreshTimer) {
+        return;
+    }
+    liveUpdates.refreshTimer = setTimeout(() => {
+        liveUpdates.refreshTimer = null;
+        fetch(`/api/live/${liveUpdates.view}/stats`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                applyLiveStats(data);
+            }
+        })
+        .catch(error => console.error('Error refreshing stats:', error));
+    }, 500);
+}
+
+function handleFeedbackEvent(event) {
+    if (liveUpdates.view === 'admin') {
+        if (event.created) {
+            bumpLiveTotal('total_feedback', 1);
+            bumpLiveRow('dataset', event.dataset_id, 'feedback_count', 1);
+            if (event.user_id !== null) {
+                bumpLiveRow('user', event.user_id, 'feedback_count', 1);
+            }
+        }
+        return;
+    }
+    // The datasets page only counts the viewer's own feedback
+    const mine = event.mine !== undefined ? event.mine : event.user_id === currentLiveUserId();
+    if (!mine) {
+        return;
+    }
+    if (event.created) {
+        bumpLiveTotal('user_feedback_count', 1);
+        bumpLiveRow('dataset', event.dataset_id, 'user_feedback_count', 1);
+    }
+    if (event.gold_added) {
+        bumpLiveTotal('user_gold_standards', 1);
+    }
+}
+
+function currentLiveUserId() {
+    const id = liveRoot().dataset.liveUser;
+    return id ? parseInt(id, 10) : null;
+}
+
+function handleLiveEvent(event) {
+    switch (event.kind) {
+        case 'feedback':
+            handleFeedbackEvent(event);
+            break;
+        case 'user_updated':
+            loadLiveRow('user', event.user_id);
+            break;
+        case 'dataset_archived':
+        case 'dataset_rehydrated':
+            // The row's badge and buttons change, so it is rendered again
+            loadLiveRow('dataset', event.dataset_id);
+            scheduleLiveRefresh();
+            break;
+        case 'dataset_deleted': {
+            const row = liveRow('dataset', event.dataset_id);
+            if (row) {
+                row.remove();
+            }
+            scheduleLiveRefresh();
+            break;
+        }
+        default:
+            // dataset_created, dataset_revised, access, user_created, user_deleted and resync
+            scheduleLiveRefresh();
+    }
+}
+
+function connectLiveUpdates() {
+    const query = liveUpdates.lastEventId !== null ? `?after=${encodeURIComponent(liveUpdates.lastEventId)}` : '';
+    const source = new EventSource(`/api/events${query}`);
+    liveUpdates.source = source;
+
+    source.onopen = () => {
+        liveUpdates.connected = true;
+        liveUpdates.retryDelay = 2000;
+    };
+    source.onmessage = message => {
+        if (message.lastEventId) {
+            liveUpdates.lastEventId = message.lastEventId;
+        }
+        handleLiveEvent(JSON.parse(message.data));
+    };
+    source.onerror = () => {
+        liveUpdates.connected = false;
+        // The browser reconnects by itself unless the server refused the stream (e.g. 503)
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(connectLiveUpdates, liveUpdates.retryDelay);
+            liveUpdates.retryDelay = Math.min(liveUpdates.retryDelay * 2, 60000);
+        }
+    };
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const root = liveRoot();
+    if (!root || !window.EventSource) {
+        return;
+    }
+    liveUpdates.view = root.dataset.liveView;
+    liveUpdates.lastEventId = root.dataset.liveCursor || null;
+    connectLiveUpdates();
+});
@@ -6,6 +6,30 @@ let isEditMode = false;
 let currentDatasetId = null;
 let currentUserId = null;
 
+// Virtualized Q&A list state: compact per-pair arrays from the server,
+// with only the rows in the visible window kept in the DOM
+const QA_ROW_HEIGHT = 132;
+const QA_OVERSCAN = 6;
+const QA_STATUSES = ['pending', 'feedback', 'gold', 'completed'];
+const QA_STATUS_BADGES = [
+    '<span class="badge bg-danger">Pending</span>',
+    '<span class="badge bg-info">Feedback</span>',
+    '<span class="badge bg-warning">Gold Standard</span>',
+    '<span class="badge bg-success">Completed</span>'
+];
+let qaIndex = {
+    ids: [],
+    status: new Uint8Array(0),
+    feedbackCounts: new Uint32Array(0),
+    positions: new Map(),
+    previews: new Map(),
+    counts: [0, 0, 0, 0],
+    selectedId: null
+};
+let qaStatusFilter = null;
+let qaRenderScheduled = false;
+let qaPreviewTimer = null;
+
 document.addEventListener('DOMContentLoaded', function() {
     // Get current user ID
     const userIdInput = document.getElementById('current-user-id');
@@ -92,8 +116,12 @@ function loadDatasets() {
                 select.appendChild(option);
             });
             
-            // Auto-select first dataset if available
-            if (datasets.length > 0) {
+            // Select the dataset rendered by the server, otherwise the first one
+            const container = document.querySelector('.qa-list-container');
+            const renderedId = container ? container.dataset.datasetId : '';
+            if (renderedId && datasets.some(dataset => String(dataset.id) === renderedId)) {
+                select.value = renderedId;
+            } else if (datasets.length > 0) {
                 select.value = datasets[0].id;
                 switchDataset(datasets[0].id);
             }
@@ -110,16 +138,16 @@ function switchDataset(datasetId) {
     
     currentDatasetId = datasetId;
     
-    // Load Q&A pairs for this dataset
-    fetch(`/api/dataset/${datasetId}/qa`)
+    // Load the compact status index for this dataset, filtered server-side by status
+    const query = qaStatusFilter ? `?status=${qaStatusFilter}` : '';
+    fetch(`/api/dataset/${datasetId}/qa_index${query}`)
         .then(response => response.json())
-        .then(qaList => {
-            updateQAList(qaList);
-            updateStatusCounts(qaList);
+        .then(index => {
+            loadQAIndex(index);
             
             // Auto-select first Q&A if available
-            if (qaList.length > 0) {
-                selectQA(qaList[0].id);
+            if (index.ids.length > 0) {
+                selectQA(index.ids[0]);
             }
         })
         .catch(error => {
@@ -128,134 +156,211 @@ function switchDataset(datasetId) {
         });
 }
 
-// Update the Q&A list in the left panel
-function updateQAList(qaList) {
+// Replace the list state with a compact index from the server
+function loadQAIndex(index) {
     const container = document.querySelector('.qa-list-container');
     
-    if (qaList.length === 0) {
+    currentDatasetId = index.dataset_id;
+    qaIndex = {
+        ids: index.ids,
+        status: Uint8Array.from(index.status),
+        feedbackCounts: Uint32Array.from(index.feedback_counts),
+        positions: new Map(index.ids.map((id, position) => [id, position])),
+        previews: new Map(),
+        counts: QA_STATUSES.map(status => index.counts[status] || 0),
+        selectedId: qaIndex.selectedId
+    };
+    
+    updateStatusCounts();
+    
+    if (qaIndex.ids.length === 0) {
         container.innerHTML = `
             <div class="text-center p-4">
                 <i class="fas fa-inbox fa-2x text-muted mb-2"></i>
-                <p class="text-muted">No Q&A pairs in this dataset</p>
+                <p class="text-muted">${index.filter ? 'No Q&A pairs with this status' : 'No Q&A pairs in this dataset'}</p>
             </div>
         `;
         return;
     }
     
-    container.innerHTML = '';
-    
-    qaList.forEach((qa, index) => {
-        const qaItem = document.createElement('div');
-        qaItem.className = `qa-list-item ${index === 0 ? 'active' : ''}`;
-        qaItem.dataset.qaId = qa.id;
-        
-        let status, statusBadge;
-        
-        if (qa.feedback_count > 0 && qa.has_gold_standard) {
-            status = 'completed';
-            statusBadge = '<span class="badge bg-success">Completed</span>';
-        } else if (qa.has_gold_standard) {
-            status = 'gold';
-            statusBadge = '<span class="badge bg-warning">Gold Standard</span>';
-        } else if (qa.feedback_count > 0) {
-            status = 'feedback';
-            statusBadge = '<span class="badge bg-info">Feedback</span>';
-        } else {
-            status = 'pending';
-            statusBadge = '<span class="badge bg-danger">Pending</span>';
-        }
-        
-        qa.status = status; // Store for status counting
+    // A spacer sized for every row keeps the scrollbar honest; the window holds visible rows
+    container.innerHTML = '<div class="qa-list-spacer"><div class="qa-list-window"></div></div>';
+    container.querySelector('.qa-list-spacer').style.height = `${qaIndex.ids.length * QA_ROW_HEIGHT}px`;
+    container.scrollTop = 0;
+    renderQAWindow();
+}
+
+// Render only the rows that intersect the viewport (plus a small overscan)
+function renderQAWindow() {
+    qaRenderScheduled = false;
+    const container = document.querySelector('.qa-list-container');
+    const windowElem = container ? container.querySelector('.qa-list-window') : null;
+    if (!windowElem) return;
+    
+    const total = qaIndex.ids.length;
+    const first = Math.max(0, Math.floor(container.scrollTop / QA_ROW_HEIGHT) - QA_OVERSCAN);
+    const last = Math.min(total, Math.ceil((container.scrollTop + container.clientHeight) / QA_ROW_HEIGHT) + QA_OVERSCAN);
+    
+    const missingPreviews = [];
+    let html = '';
+    for (let position = first; position < last; position++) {
+        const qaId = qaIndex.ids[position];
+        const preview = qaIndex.previews.get(qaId);
+        if (preview === undefined) missingPreviews.push(qaId);
         
-        qaItem.innerHTML = `
-            <div class="qa-item-header">
-                <span class="qa-number">Q${qa.id}</span>
-                <span class="feedback-count">
-                    <i class="fas fa-comments"></i> ${qa.feedback_count}
-                </span>
-            </div>
-            <div class="qa-item-preview">
-                ${qa.question_text.substring(0, 100)}${qa.question_text.length > 100 ? '...' : ''}
-            </div>
-            <div class="qa-item-status">
-                ${statusBadge}
+        html += `
+            <div class="qa-list-item ${qaId === qaIndex.selectedId ? 'active' : ''}" data-qa-id="${qaId}">
+                <div class="qa-item-header">
+                    <span class="qa-number">Q${qaId}</span>
+                    <span class="feedback-count">
+                        <i class="fas fa-comments"></i> ${qaIndex.feedbackCounts[position]}
+                    </span>
+                </div>
+                <div class="qa-item-preview">
+                    ${preview === undefined ? '<span class="text-muted">Loading...</span>' : preview}
+                </div>
+                <div class="qa-item-status">
+                    ${QA_STATUS_BADGES[qaIndex.status[position]]}
+                </div>
             </div>
         `;
-        
-        container.appendChild(qaItem);
-    });
+    }
+    
+    windowElem.style.transform = `translateY(${first * QA_ROW_HEIGHT}px)`;
+    windowElem.innerHTML = html;
+    
+    if (missingPreviews.length > 0) {
+        scheduleQAPreviewLoad();
+    }
 }
 
-// Update status counts
-function updateStatusCounts(qaList) {
-    let pending = 0, goldStandard = 0, feedback = 0, completed = 0;
-    
-    qaList.forEach(qa => {
-        if (qa.feedback_count > 0 && qa.has_gold_standard) {
-            completed++;
-        } else if (qa.has_gold_standard) {
-            goldStandard++;
-        } else if (qa.feedback_count > 0) {
-            feedback++;
-        } else {
-            pending++;
-        }
-    });
+function scheduleQARender() {
+    if (!qaRenderScheduled) {
+        qaRenderScheduled = true;
+        requestAnimationFrame(renderQAWindow);
+    }
+}
+
+// Fetch question previews for the visible window once scrolling settles
+function scheduleQAPreviewLoad() {
+    clearTimeout(qaPreviewTimer);
+    qaPreviewTimer = setTimeout(loadVisibleQAPreviews, 80);
+}
+
+function loadVisibleQAPreviews() {
+    const container = document.querySelector('.qa-list-container');
+    if (!container || !currentDatasetId) return;
     
-    document.getElementById('pending-count').textContent = pending;
-    document.getElementById('gold-count').textContent = goldStandard;
-    document.getElementById('feedback-count').textContent = feedback;
-    document.getElementById('completed-count').textContent = completed;
+    const ids = Array.from(container.querySelectorAll('.qa-list-item'))
+        .map(item => parseInt(item.dataset.qaId))
+        .filter(qaId => !qaIndex.previews.has(qaId));
+    if (ids.length === 0) return;
+    
+    const datasetId = currentDatasetId;
+    fetch(`/api/dataset/${datasetId}/qa_previews?ids=${ids.join(',')}`)
+        .then(response => response.json())
+        .then(previews => {
+            if (String(datasetId) !== String(currentDatasetId)) return;
+            Object.entries(previews).forEach(([qaId, preview]) => {
+                const escaped = document.createElement('span');
+                escaped.textContent = preview;
+                qaIndex.previews.set(parseInt(qaId), escaped.innerHTML);
+            });
+            scheduleQARender();
+        })
+        .catch(error => {
+            console.error('Error loading question previews:', error);
+        });
+}
+
+// Update status counts from the running totals
+function updateStatusCounts() {
+    QA_STATUSES.forEach((status, code) => {
+        document.getElementById(`${status}-count`).textContent = qaIndex.counts[code];
+    });
 }
 
 // Initialize the three-panel interface
 function initializeInterface() {
-    // Calculate initial status counts from existing Q&A items
-    updateInitialStatusCounts();
-    
-    // Load first Q&A pair if available
-    const firstQAItem = document.querySelector('.qa-list-item');
-    if (firstQAItem) {
-        const qaId = firstQAItem.dataset.qaId;
-        selectQA(qaId);
+    const container = document.querySelector('.qa-list-container');
+    if (container) {
+        container.addEventListener('scroll', scheduleQARender, { passive: true });
+        window.addEventListener('resize', scheduleQARender);
+    }
+    
+    const nextButton = document.getElementById('next-assigned-btn');
+    if (nextButton) {
+        nextButton.addEventListener('click', claimNextQA);
+    }
+    
+    // Clicking a status count shows only pairs in that status; clicking again clears the filter
+    document.querySelectorAll('.status-count[data-status]').forEach(counter => {
+        counter.addEventListener('click', function() {
+            qaStatusFilter = qaStatusFilter === this.dataset.status ? null : this.dataset.status;
+            document.querySelectorAll('.status-count[data-status]').forEach(other => {
+                other.classList.toggle('filter-active', other.dataset.status === qaStatusFilter);
+            });
+            switchDataset(currentDatasetId);
+        });
+    });
+    
+    // Use the status index embedded in the page for the initial dataset
+    const indexData = document.getElementById('qa-index-data');
+    if (indexData) {
+        const index = JSON.parse(indexData.textContent);
+        loadQAIndex(index);
+        
+        // Load first Q&A pair if available
+        if (index.ids.length > 0) {
+            selectQA(index.ids[0]);
+        }
     }
 }
 
-// Calculate initial status counts from server-rendered Q&A items
-function updateInitialStatusCounts() {
-    const qaItems = document.querySelectorAll('.qa-list-item');
-    let pending = 0, goldStandard = 0, feedback = 0, completed = 0;
-    
-    qaItems.forEach(item => {
-        const badge = item.querySelector('.qa-item-status .badge');
-        if (badge) {
-            const status = badge.textContent.trim();
-            if (status === 'Pending') {
-                pending++;
-            } else if (status === 'Gold Standard') {
-                goldStandard++;
-            } else if (status === 'Feedback') {
-                feedback++;
-            } else if (status === 'Completed') {
-                completed++;
+// Ask the work scheduler for the next Q&A pair that needs this reviewer
+function claimNextQA() {
+    if (!currentDatasetId) return;
+    
+    fetch(`/api/dataset/${currentDatasetId}/next`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({})
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            showAlert(data.message || 'Could not claim the next item', 'error');
+        } else if (!data.assignment) {
+            showAlert(data.message, 'info');
+        } else {
+            selectQA(data.assignment.qa_id);
+            
+            // Bring the claimed row into view if it is in the current list
+            const position = qaIndex.positions.get(data.assignment.qa_id);
+            const container = document.querySelector('.qa-list-container');
+            if (position !== undefined && container) {
+                container.scrollTop = position * QA_ROW_HEIGHT;
+                scheduleQARender();
             }
         }
+    })
+    .catch(error => {
+        console.error('Error claiming next item:', error);
+        showAlert('Error claiming next item', 'error');
     });
-    
-    document.getElementById('pending-count').textContent = pending;
-    document.getElementById('gold-count').textContent = goldStandard;
-    document.getElementById('feedback-count').textContent = feedback;
-    document.getElementById('completed-count').textContent = completed;
 }
 
 // Function to select a Q&A pair
 function selectQA(qaId) {
     // Update active state in left panel
+    qaIndex.selectedId = parseInt(qaId);
     document.querySelectorAll('.qa-list-item').forEach(item => {
         item.classList.remove('active');
     });
     
-    const selectedItem = document.querySelector(`[data-qa-id="${qaId}"]`);
+    const selectedItem = document.querySelector(`.qa-list-item[data-qa-id="${qaId}"]`);
     if (selectedItem) {
         selectedItem.classList.add('active');
     }
@@ -374,10 +479,6 @@ function saveGoldStandard() {
         gold_standard_answer: goldStandardAnswer
     };
     
-    // Store the current status to determine the transition
-    const qaItem = document.querySelector(`[data-qa-id="${qaId}"]`);
-    const currentStatus = qaItem ? qaItem.querySelector('.qa-item-status .badge').textContent.trim() : null;
-    
     // Show loading state on button
     if (goldBtn) goldBtn.disabled = true;
     
@@ -402,7 +503,7 @@ function saveGoldStandard() {
             isEditMode = false;
             
             // Update the Q&A item status in the left panel
-            updateQAItemStatus(qaId, 'gold', currentStatus);
+            updateQAItemStatus(qaId, 'gold');
             
             // Reload the Q&A data to refresh the feedback array
             loadQAData(qaId);
@@ -470,14 +571,10 @@ function submitFeedback() {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            // Store the current status to determine the transition
-            const qaItem = document.querySelector(`[data-qa-id="${qaId}"]`);
-            const currentStatus = qaItem ? qaItem.querySelector('.qa-item-status .badge').textContent.trim() : null;
-            
             showAlert('Feedback submitted successfully!', 'success');
             clearFeedbackForm();
             loadPreviousFeedback(qaId);
-            updateQAItemStatus(qaId, 'feedback', currentStatus);
+            updateQAItemStatus(qaId, 'feedback');
             // Reload the Q&A data to refresh gold standard display
             loadQAData(qaId);
             cancelEdit();
@@ -630,95 +727,46 @@ function updateGoldStandardFromFeedback(feedbackList) {
     }
 }
 
-// Update Q&A item status in left panel
-function updateQAItemStatus(qaId, action = 'feedback', currentStatus = null) {
-    const qaItem = document.querySelector(`[data-qa-id="${qaId}"]`);
-    if (!qaItem) return;
-    
-    const statusBadge = qaItem.querySelector('.qa-item-status .badge');
-    const feedbackCount = qaItem.querySelector('.feedback-count');
+// Update Q&A item status in left panel (O(1): adjusts the running counts and the row, if visible)
+function updateQAItemStatus(qaId, action = 'feedback') {
+    const position = qaIndex.positions.get(parseInt(qaId));
+    if (position === undefined) return;
     
-    // Get current status from badge text if not provided
-    if (!currentStatus) {
-        currentStatus = statusBadge.textContent.trim();
-    }
+    const currentStatus = qaIndex.status[position];
+    let newStatus = currentStatus;
     
-    console.log(`Updating status for QA ${qaId}, action: ${action}, current status: ${currentStatus}`);
-    
-    // Update the status badge and counts based on the current status and action
     if (action === 'feedback') {
-        // User submitted feedback
-        if (currentStatus === 'Pending') {
-            // Change from Pending to Feedback
-            statusBadge.className = 'badge bg-info';
-            statusBadge.textContent = 'Feedback';
-            
-            // Update feedback count
-            updateFeedbackCount(feedbackCount);
-            
-            // Update status counts
-            incrementStatusCount('feedback');
-            decrementStatusCount('pending');
-        } else if (currentStatus === 'Gold Standard') {
-            // Change from Gold Standard to Completed
-            statusBadge.className = 'badge bg-success';
-            statusBadge.textContent = 'Completed';
-            
-            // Update feedback count
-            updateFeedbackCount(feedbackCount);
-            
-            // Update status counts
-            incrementStatusCount('completed');
-            decrementStatusCount('gold');
+        // User submitted feedback: Pending -> Feedback, Gold Standard -> Completed
+        if (currentStatus === 0) {
+            newStatus = 1;
+        } else if (currentStatus === 2) {
+            newStatus = 3;
+        }
+        if (newStatus !== currentStatus) {
+            qaIndex.feedbackCounts[position] += 1;
         }
-        // No action needed for Feedback -> Feedback or Completed -> Completed transitions
     } else if (action === 'gold') {
-        // User submitted gold standard
-        if (currentStatus === 'Pending') {
-            // Change from Pending to Gold Standard
-            statusBadge.className = 'badge bg-warning';
-            statusBadge.textContent = 'Gold Standard';
-            
-            // Update status counts
-            incrementStatusCount('gold');
-            decrementStatusCount('pending');
-        } else if (currentStatus === 'Feedback') {
-            // Change from Feedback to Completed
-            statusBadge.className = 'badge bg-success';
-            statusBadge.textContent = 'Completed';
-            
-            // Update status counts
-            incrementStatusCount('completed');
-            decrementStatusCount('feedback');
+        // User submitted gold standard: Pending -> Gold Standard, Feedback -> Completed
+        if (currentStatus === 0) {
+            newStatus = 2;
+        } else if (currentStatus === 1) {
+            newStatus = 3;
         }
-        // No action needed for Gold Standard -> Gold Standard or Completed -> Completed transitions
     }
-}
-
-// Helper function to update the feedback count
-function updateFeedbackCount(feedbackCountElement) {
-    if (!feedbackCountElement) return;
     
-    // Parse current count
-    const countMatch = feedbackCountElement.textContent.match(/\d+/);
-    if (!countMatch) return;
+    if (newStatus === currentStatus) return;
     
-    const currentCount = parseInt(countMatch[0]);
-    feedbackCountElement.innerHTML = `<i class="fas fa-comments"></i> ${currentCount + 1}`;
-}
-
-// Helper functions to update status counts
-function incrementStatusCount(status) {
-    const countElement = document.getElementById(`${status}-count`);
-    if (countElement) {
-        countElement.textContent = (parseInt(countElement.textContent) || 0) + 1;
-    }
-}
-
-function decrementStatusCount(status) {
-    const countElement = document.getElementById(`${status}-count`);
-    if (countElement && parseInt(countElement.textContent) > 0) {
-        countElement.textContent = parseInt(countElement.textContent) - 1;
+    qaIndex.status[position] = newStatus;
+    qaIndex.counts[currentStatus] -= 1;
+    qaIndex.counts[newStatus] += 1;
+    
+    document.getElementById(`${QA_STATUSES[currentStatus]}-count`).textContent = qaIndex.counts[currentStatus];
+    document.getElementById(`${QA_STATUSES[newStatus]}-count`).textContent = qaIndex.counts[newStatus];
+    
+    const qaItem = document.querySelector(`.qa-list-item[data-qa-id="${qaId}"]`);
+    if (qaItem) {
+        qaItem.querySelector('.qa-item-status').innerHTML = QA_STATUS_BADGES[newStatus];
+        qaItem.querySelector('.feedback-count').innerHTML = `<i class="fas fa-comments"></i> ${qaIndex.feedbackCounts[position]}`;
     }
 }
 
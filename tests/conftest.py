@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from dedup import content_hash  # noqa: E402
+from ingestion import create_dataset  # noqa: E402
+from models import db, Feedback, User, upgrade_schema  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a fresh SQLite database in tmp_path, with its context pushed"""
+    app = create_app({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "app.db"}',
+        'ARCHIVE_DIR': str(tmp_path / 'archives'),
+        'BACKUP_DIR': str(tmp_path / 'backups'),
+        'ADMISSION_DIR': str(tmp_path / 'admission'),
+        'LIVE_POLL_SECONDS': 0,
+    })
+    with app.app_context():
+        upgrade_schema()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def admin(app):
+    user = User(username='admin', password='admin', access_level='admin')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def make_dataset(name, owner, count, answer='answer'):
+    """A committed dataset with `count` pairs whose original ids are 0..count-1"""
+    rows = [{'question': f'{name} question {i}', 'answer': f'{answer} {i}', 'original_id': str(i),
+             'content_hash': content_hash(f'{name} question {i}', f'{answer} {i}')} for i in range(count)]
+    dataset, _ = create_dataset(name, None, rows, owner)
+    db.session.commit()
+    return dataset
+
+
+def add_feedback(qa_pair, user, **values):
+    feedback = Feedback(qa_pair_id=qa_pair.id, user_id=user.id, **values)
+    db.session.add(feedback)
+    db.session.commit()
+    return feedback
+
+
+@pytest.fixture
+def client(app, admin):
+    """A test client logged in as the admin"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,20 @@
+import pytest
+
+from conftest import make_dataset
+from models import db, ReviewAssignment, User
+from scheduler import claim_next
+
+
+@pytest.mark.parametrize('url', ['/api/admin/user/{user}/datasets/{dataset}', '/api/admin/dataset/{dataset}/users/{user}'])
+def test_single_revoke_releases_open_leases(client, admin, url):
+    dataset = make_dataset('shared', admin, 3)
+    reviewer = User(username='reviewer', password='reviewer')
+    reviewer.accessible_datasets.append(dataset)
+    db.session.add(reviewer)
+    db.session.commit()
+    assert claim_next(dataset.id, reviewer.id) is not None
+
+    response = client.delete(url.format(user=reviewer.id, dataset=dataset.id))
+    assert response.get_json()['success']
+    assert not reviewer.has_dataset_access(dataset.id)
+    assert ReviewAssignment.query.filter_by(user_id=reviewer.id).count() == 0
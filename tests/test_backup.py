@@ -0,0 +1,63 @@
+import os
+
+from sqlalchemy import create_engine, func, select
+
+from backup import FEEDBACK, FULL, backup_root, create_snapshot, list_snapshots, restore_snapshot, verify_snapshot
+from conftest import add_feedback, make_dataset
+from models import db, Feedback, QuestionAnswerPair
+
+
+def restored_counts(url):
+    engine = create_engine(url)
+    try:
+        with engine.connect() as connection:
+            return {model.__tablename__: connection.execute(select(func.count()).select_from(model)).scalar()
+                    for model in (QuestionAnswerPair, Feedback)}
+    finally:
+        engine.dispose()
+
+
+def test_full_and_incremental_snapshots_restore(app, admin, tmp_path):
+    app.config['CHANGEFEED_SETTLE_SECONDS'] = 0
+    root = backup_root(app)
+    dataset = make_dataset('backed up', admin, 4)
+    first, *others = QuestionAnswerPair.query.filter_by(dataset_id=dataset.id).order_by(QuestionAnswerPair.id)
+    feedback = add_feedback(first, admin, accuracy_score=2)
+
+    full = create_snapshot(root, db.engine)
+    assert full['kind'] == FULL
+    assert full['counts']['question_answer_pair'] == 4 and full['counts']['feedback'] == 1
+
+    feedback.accuracy_score = 5
+    db.session.commit()
+    for qa in others:
+        add_feedback(qa, admin, accuracy_score=3)
+    incremental = create_snapshot(root, db.engine, incremental=True)
+    assert incremental['kind'] == FEEDBACK and incremental['parent'] == full['id']
+    assert incremental['rows'] == 4
+
+    full_url = f'sqlite:///{tmp_path / "full.db"}'
+    restore_snapshot(root, full['id'], full_url)
+    assert restored_counts(full_url) == {'question_answer_pair': 4, 'feedback': 1}
+
+    chain_url = f'sqlite:///{tmp_path / "chain.db"}'
+    steps = restore_snapshot(root, incremental['id'], chain_url)
+    assert steps[1]['applied'] == 4 and steps[1]['skipped'] == 0
+    assert restored_counts(chain_url) == {'question_answer_pair': 4, 'feedback': 4}
+    engine = create_engine(chain_url)
+    try:
+        with engine.connect() as connection:
+            assert connection.execute(select(Feedback.accuracy_score).where(Feedback.id == feedback.id)).scalar() == 5
+    finally:
+        engine.dispose()
+
+    assert verify_snapshot(root, incremental['id'])['restored']
+
+
+def test_partial_files_of_interrupted_snapshots_are_removed(app, admin):
+    root = backup_root(app)
+    partial = os.path.join(root, '20260101T000000000000Z-full.sqlite3.tmp')
+    with open(partial, 'w') as f:
+        f.write('half a copy')
+    assert list_snapshots(root) == []
+    assert not os.path.exists(partial)
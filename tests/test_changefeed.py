@@ -0,0 +1,17 @@
+import json
+
+from changefeed import stream_changes
+from conftest import make_dataset
+
+
+def changes(app, settle_seconds):
+    app.config['CHANGEFEED_SETTLE_SECONDS'] = settle_seconds
+    lines = [json.loads(line) for chunk in stream_changes({'qa_pair': None, 'feedback': None})
+             for line in chunk.splitlines()]
+    return [line for line in lines if line['type'] == 'qa_pair']
+
+
+def test_rows_inside_the_settle_window_are_held_back(app, admin):
+    make_dataset('fresh', admin, 3)
+    assert changes(app, 60) == []
+    assert len(changes(app, 0)) == 3
@@ -0,0 +1,98 @@
+from sqlalchemy import select
+
+from backup import FULL, backup_root, create_snapshot, restore_snapshot
+from cold_storage import archive_root, archive_dataset, rehydrate_dataset
+from conftest import add_feedback, make_dataset
+from models import db, Dataset, Feedback, QuestionAnswerPair, User
+
+
+def pair_rows(dataset_id):
+    return sorted(db.session.execute(
+        select(QuestionAnswerPair.original_qa_id, QuestionAnswerPair.question_text, QuestionAnswerPair.system_answer_text).
+        where(QuestionAnswerPair.dataset_id == dataset_id)
+    ).all())
+
+
+def feedback_rows(dataset_id):
+    return sorted(db.session.execute(
+        select(QuestionAnswerPair.original_qa_id, Feedback.user_id, Feedback.accuracy_score, Feedback.gold_standard_answer).
+        join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).
+        where(QuestionAnswerPair.dataset_id == dataset_id)
+    ).all())
+
+
+def test_archive_and_rehydrate_restores_every_row(app, admin):
+    dataset = make_dataset('finished', admin, 5)
+    for score, qa in enumerate(QuestionAnswerPair.query.filter_by(dataset_id=dataset.id), start=1):
+        add_feedback(qa, admin, accuracy_score=score, gold_standard_answer=f'gold {score}')
+    pairs, feedback = pair_rows(dataset.id), feedback_rows(dataset.id)
+    archived_before = max(qa.updated_at for qa in QuestionAnswerPair.query.filter_by(dataset_id=dataset.id))
+
+    root = archive_root(app)
+    summary = archive_dataset(root, dataset.id)
+    assert summary['qa_count'] == 5 and summary['feedback_count'] == 5
+    assert QuestionAnswerPair.query.filter_by(dataset_id=dataset.id).count() == 0
+
+    report = rehydrate_dataset(root, dataset.id)
+    assert (report['pairs'], report['feedback'], report['new_pair_ids']) == (5, 5, 0)
+    assert pair_rows(dataset.id) == pairs
+    assert feedback_rows(dataset.id) == feedback
+    dataset = db.session.get(Dataset, dataset.id)
+    assert not dataset.is_archived() and dataset.rehydrated_at is not None
+    # Rehydrated rows are newer than anything the change feed or a snapshot has seen
+    assert all(qa.updated_at > archived_before for qa in QuestionAnswerPair.query.filter_by(dataset_id=dataset.id))
+
+
+def test_rehydrate_moves_rows_whose_ids_were_reused(app, admin):
+    dataset = make_dataset('finished', admin, 3)
+    for qa in QuestionAnswerPair.query.filter_by(dataset_id=dataset.id):
+        add_feedback(qa, admin, text_feedback=qa.question_text)
+    pairs, feedback = pair_rows(dataset.id), feedback_rows(dataset.id)
+    old_ids = {qa.id for qa in QuestionAnswerPair.query.filter_by(dataset_id=dataset.id)}
+
+    root = archive_root(app)
+    archive_dataset(root, dataset.id)
+    # SQLite hands the archived ids out again
+    newer = make_dataset('newer', admin, 3, answer='other')
+    reviewer = User(username='reviewer', password='reviewer')
+    db.session.add(reviewer)
+    db.session.commit()
+    for qa in QuestionAnswerPair.query.filter_by(dataset_id=newer.id):
+        add_feedback(qa, reviewer, text_feedback=qa.question_text)
+    assert {qa.id for qa in QuestionAnswerPair.query.filter_by(dataset_id=newer.id)} == old_ids
+    newer_pairs, newer_feedback = pair_rows(newer.id), feedback_rows(newer.id)
+
+    report = rehydrate_dataset(root, dataset.id)
+    assert report['new_pair_ids'] == 3 and report['new_feedback_ids'] == 3
+    assert pair_rows(dataset.id) == pairs
+    assert feedback_rows(dataset.id) == feedback
+    assert pair_rows(newer.id) == newer_pairs
+    assert feedback_rows(newer.id) == newer_feedback
+    # Feedback still belongs to the pair it was written for
+    for qa in QuestionAnswerPair.query.all():
+        assert [fb.text_feedback for fb in qa.feedback] == [qa.question_text]
+
+
+def test_incremental_snapshot_after_rehydrate_is_full(app, admin, tmp_path):
+    dataset = make_dataset('finished', admin, 3)
+    add_feedback(QuestionAnswerPair.query.filter_by(dataset_id=dataset.id).first(), admin, accuracy_score=4)
+    archive_dataset(archive_root(app), dataset.id)
+    root = backup_root(app)
+    create_snapshot(root, db.engine)
+
+    rehydrate_dataset(archive_root(app), dataset.id)
+    manifest = create_snapshot(root, db.engine, incremental=True)
+    assert manifest['kind'] == FULL and manifest['reason']
+
+    target = tmp_path / 'restored.db'
+    restore_snapshot(root, manifest['id'], f'sqlite:///{target}')
+    restored = db.create_engine(f'sqlite:///{target}')
+    try:
+        with restored.connect() as connection:
+            assert connection.execute(select(Dataset.archive_path).where(Dataset.id == dataset.id)).scalar() is None
+            assert connection.execute(
+                select(db.func.count()).select_from(QuestionAnswerPair).where(QuestionAnswerPair.dataset_id == dataset.id)
+            ).scalar() == 3
+            assert connection.execute(select(db.func.count()).select_from(Feedback)).scalar() == 1
+    finally:
+        restored.dispose()
@@ -0,0 +1,24 @@
+from conftest import add_feedback, make_dataset
+from dedup import content_hash
+from ingestion import create_dataset
+from models import Feedback, QuestionAnswerPair
+from revisions import apply_revision, plan_revision
+
+
+def rows(question, answer):
+    return [{'question': question, 'answer': answer, 'original_id': '0', 'content_hash': content_hash(question, answer)}]
+
+
+def test_carry_feedback_copies_only_feedback_on_the_current_answer(app, admin):
+    dataset = make_dataset('first', admin, 1)
+    qa = QuestionAnswerPair.query.filter_by(dataset_id=dataset.id).one()
+    add_feedback(qa, admin, text_feedback='judged the old answer', answer_revision=1)
+    apply_revision(dataset, plan_revision(dataset, rows(qa.question_text, 'rerun answer')))
+    assert qa.revision == 2
+    add_feedback(qa, admin, text_feedback='judged the rerun answer', answer_revision=2)
+
+    copy, summary = create_dataset('copy', None, rows(qa.question_text, 'rerun answer'), admin, duplicates='carry_feedback')
+    assert summary['existing_duplicates_with_feedback'] == 1
+    assert summary['carried_feedback'] == 1
+    copied = Feedback.query.join(QuestionAnswerPair).filter(QuestionAnswerPair.dataset_id == copy.id).all()
+    assert [(fb.text_feedback, fb.answer_revision) for fb in copied] == [('judged the rerun answer', 1)]
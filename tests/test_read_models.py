@@ -0,0 +1,12 @@
+from conftest import make_dataset
+from models import db, QuestionAnswerPair
+
+
+def test_include_text_returns_texts_for_the_requested_page(client, admin):
+    dataset = make_dataset('paged', admin, 5)
+    response = client.get(f'/api/dataset/{dataset.id}/qa?include_text=true&limit=2&offset=1')
+    data = response.get_json()
+    assert data['total'] == 5 and len(data['items']) == 2
+    for item in data['items']:
+        qa = db.session.get(QuestionAnswerPair, item['id'])
+        assert (item['question_text'], item['system_answer_text']) == (qa.question_text, qa.system_answer_text)
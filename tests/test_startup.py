@@ -0,0 +1,26 @@
+"""
+Startup budget: importing the app stays cheap and side-effect free, and a
+fresh interpreter serves its first request quickly (see benchmarks/bench_startup.py).
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(args, tmp_path):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{tmp_path / "startup.db"}')
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def test_import_does_not_create_database(tmp_path):
+    result = run_python(['-c', 'import app'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert not (tmp_path / 'startup.db').exists()
+
+
+def test_startup_within_budget(tmp_path):
+    result = run_python([os.path.join('benchmarks', 'bench_startup.py'), '--runs', '3'], tmp_path)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,31 @@
+from conftest import add_feedback, make_dataset
+from models import db, QuestionAnswerPair
+from text_metrics import dataset_metrics_summary, refresh_dataset_metrics
+
+
+def test_refresh_only_reads_changed_feedback_and_drops_cleared_gold_standards(app, admin):
+    app.config['CHANGEFEED_SETTLE_SECONDS'] = 0
+    dataset = make_dataset('scored', admin, 2)
+    first, second = QuestionAnswerPair.query.filter_by(dataset_id=dataset.id).order_by(QuestionAnswerPair.id)
+    feedback = add_feedback(first, admin, gold_standard_answer=first.system_answer_text)
+    add_feedback(second, admin, gold_standard_answer='something else entirely')
+
+    run = refresh_dataset_metrics(dataset.id, workers=1)
+    assert (run['checked'], run['inserted'], run['scored']) == (2, 2, 2)
+    assert refresh_dataset_metrics(dataset.id, workers=1)['checked'] == 0
+
+    feedback.accuracy_score = 5
+    db.session.commit()
+    run = refresh_dataset_metrics(dataset.id, workers=1)
+    assert (run['checked'], run['recomputed']) == (1, 0)
+
+    feedback.gold_standard_answer = 'a different gold standard'
+    db.session.commit()
+    run = refresh_dataset_metrics(dataset.id, workers=1)
+    assert (run['checked'], run['updated']) == (1, 1)
+
+    feedback.gold_standard_answer = None
+    db.session.commit()
+    run = refresh_dataset_metrics(dataset.id, workers=1)
+    assert (run['removed'], run['scored']) == (1, 1)
+    assert dataset_metrics_summary(dataset.id)['scored_feedback'] == 1
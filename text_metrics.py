@@ -0,0 +1,286 @@
+"""
+Text-similarity metrics between system answers and reviewer gold standards.
+
+The metric functions are pure and module level so they can be shipped to
+worker processes; ``refresh_dataset_metrics`` handles the database side and
+only reads feedback changed since its metric was computed, rescoring rows
+whose answer or gold standard text actually changed.
+"""
+
+import hashlib
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import and_, bindparam, func, insert, or_, select, update
+
+from changefeed import settled_horizon
+from models import db, AnswerRevision, Feedback, FeedbackMetric, QuestionAnswerPair
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Below this many stale rows a process pool costs more than it saves
+PARALLEL_THRESHOLD = 200
+CHUNK_SIZE = 100
+
+
+def tokenize(text):
+    """Lowercase word tokens"""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def token_f1(reference, candidate):
+    """Token-level F1 over bags of words"""
+    if not reference or not candidate:
+        return 1.0 if reference == candidate else 0.0
+    overlap = sum((Counter(reference) & Counter(candidate)).values())
+    if overlap == 0:
+        return 0.0
+    precision = overlap / len(candidate)
+    recall = overlap / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+def _token_bitmasks(tokens):
+    """Map each token to a bitmask of the positions it occupies"""
+    masks = {}
+    for position, token in enumerate(tokens):
+        masks[token] = masks.get(token, 0) | (1 << position)
+    return masks
+
+
+def lcs_length(a, b):
+    """Longest common subsequence length (bit-parallel, Allison-Dix)"""
+    if not a or not b:
+        return 0
+    masks = _token_bitmasks(a)
+    full = (1 << len(a)) - 1
+    row = full
+    for token in b:
+        matches = row & masks.get(token, 0)
+        row = ((row + matches) | (row - matches)) & full
+    return len(a) - bin(row).count('1')
+
+
+def rouge_l(reference, candidate):
+    """ROUGE-L F-measure from the token LCS"""
+    if not reference or not candidate:
+        return 1.0 if reference == candidate else 0.0
+    lcs = lcs_length(reference, candidate)
+    if lcs == 0:
+        return 0.0
+    precision = lcs / len(candidate)
+    recall = lcs / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+def edit_distance(a, b):
+    """Token-level Levenshtein distance (bit-parallel, Myers/Hyyro)"""
+    if not a:
+        return len(b)
+    if not b:
+        return len(a)
+    masks = _token_bitmasks(a)
+    full = (1 << len(a)) - 1
+    high = 1 << (len(a) - 1)
+    positive, negative, distance = full, 0, len(a)
+    for token in b:
+        eq = masks.get(token, 0)
+        xv = eq | negative
+        xh = (((eq & positive) + positive) ^ positive) | eq
+        ph = negative | (~(xh | positive) & full)
+        mh = positive & xh
+        if ph & high:
+            distance += 1
+        elif mh & high:
+            distance -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        positive = mh | (~(xv | ph) & full)
+        negative = ph & xv
+    return distance
+
+
+def normalized_edit_distance(a, b):
+    """Edit distance scaled to 0 (identical) .. 1 (nothing in common)"""
+    longest = max(len(a), len(b))
+    return edit_distance(a, b) / longest if longest else 0.0
+
+
+def score_pair(system_answer, gold_standard):
+    """All similarity metrics for one answer / gold standard pair"""
+    candidate = tokenize(system_answer)
+    reference = tokenize(gold_standard)
+    return {
+        'token_f1': token_f1(reference, candidate),
+        'rouge_l': rouge_l(reference, candidate),
+        'edit_distance': normalized_edit_distance(reference, candidate)
+    }
+
+
+def _score_chunk(chunk):
+    """Worker entry point: score a list of (feedback_id, answer, gold) tuples"""
+    return [(feedback_id, score_pair(answer, gold)) for feedback_id, answer, gold in chunk]
+
+
+def input_hash(system_answer, gold_standard):
+    """Fingerprint of the texts a metric row was computed from"""
+    digest = hashlib.sha1()
+    digest.update((system_answer or '').encode('utf-8'))
+    digest.update(b'\x00')
+    digest.update((gold_standard or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def score_rows(rows, workers=None):
+    """Score (feedback_id, answer, gold) tuples, in a process pool for large batches"""
+    if len(rows) < PARALLEL_THRESHOLD or workers == 1:
+        return _score_chunk(rows)
+
+    chunks = [rows[i:i + CHUNK_SIZE] for i in range(0, len(rows), CHUNK_SIZE)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for scored in pool.map(_score_chunk, chunks):
+            results.extend(scored)
+    return results
+
+
+def refresh_dataset_metrics(dataset_id, workers=None):
+    """Recompute similarity metrics for feedback rows changed since the last run
+
+    Only gold standards without a metric row, or whose feedback or pair was
+    updated after their metric was computed, are read; of those, rows whose
+    texts hash the same as before are not rescored. Metrics of feedback whose
+    gold standard was cleared are deleted.
+
+    Gold standards are compared with the answer revision the feedback judged,
+    which is the superseded answer in AnswerRevision if the pair was revised since.
+    """
+    # Stamped at the settled horizon so changes committed late are checked again next run
+    checked_at = settled_horizon(db.engine)
+    in_dataset = Feedback.qa_pair_id.in_(select(QuestionAnswerPair.id).where(QuestionAnswerPair.dataset_id == dataset_id))
+    blank_gold = or_(Feedback.gold_standard_answer.is_(None), func.trim(Feedback.gold_standard_answer) == '')
+    removed = db.session.query(FeedbackMetric).filter(FeedbackMetric.feedback_id.in_(
+        select(Feedback.id).where(in_dataset, blank_gold)
+    )).delete(synchronize_session=False)
+
+    rows = db.session.query(
+        Feedback.id,
+        Feedback.qa_pair_id,
+        func.coalesce(AnswerRevision.system_answer_text, QuestionAnswerPair.system_answer_text),
+        Feedback.gold_standard_answer,
+        FeedbackMetric.input_hash
+    ).join(QuestionAnswerPair, Feedback.qa_pair_id == QuestionAnswerPair.id).\
+        outerjoin(AnswerRevision, and_(
+            AnswerRevision.qa_pair_id == Feedback.qa_pair_id,
+            AnswerRevision.revision == Feedback.answer_revision
+        )).\
+        outerjoin(FeedbackMetric, FeedbackMetric.feedback_id == Feedback.id).\
+        filter(QuestionAnswerPair.dataset_id == dataset_id).\
+        filter(Feedback.gold_standard_answer.isnot(None)).\
+        filter(or_(
+            FeedbackMetric.id.is_(None),
+            Feedback.updated_at > FeedbackMetric.computed_at,
+            QuestionAnswerPair.updated_at > FeedbackMetric.computed_at
+        )).all()
+
+    stale = []
+    hashes = {}
+    qa_ids = {}
+    existing = set()
+    unchanged = []
+    blank = []
+    for feedback_id, qa_pair_id, answer, gold, previous_hash in rows:
+        if previous_hash is not None:
+            existing.add(feedback_id)
+        if not gold.strip():
+            if previous_hash is not None:
+                blank.append(feedback_id)
+            continue
+        fingerprint = input_hash(answer, gold)
+        if previous_hash != fingerprint:
+            stale.append((feedback_id, answer, gold))
+            hashes[feedback_id] = fingerprint
+            qa_ids[feedback_id] = qa_pair_id
+        else:
+            unchanged.append(feedback_id)
+
+    inserts, updates = [], []
+    for feedback_id, metrics in score_rows(stale, workers=workers):
+        values = dict(metrics, input_hash=hashes[feedback_id], computed_at=checked_at)
+        if feedback_id in existing:
+            updates.append(dict(values, b_feedback_id=feedback_id))
+        else:
+            inserts.append(dict(values, feedback_id=feedback_id, qa_pair_id=qa_ids[feedback_id]))
+
+    metrics_table = FeedbackMetric.__table__
+    if blank:
+        removed += db.session.query(FeedbackMetric).filter(FeedbackMetric.feedback_id.in_(blank)).\
+            delete(synchronize_session=False)
+    if inserts:
+        db.session.execute(insert(FeedbackMetric), inserts)
+    if updates:
+        db.session.execute(
+            update(metrics_table).
+            where(metrics_table.c.feedback_id == bindparam('b_feedback_id')),
+            updates
+        )
+    if unchanged:
+        # Touched but not changed (e.g. only the scores were edited): skip them next run
+        db.session.execute(
+            update(metrics_table).where(metrics_table.c.feedback_id == bindparam('b_feedback_id')).
+            values(computed_at=checked_at),
+            [{'b_feedback_id': feedback_id} for feedback_id in unchanged]
+        )
+    db.session.commit()
+
+    scored = db.session.query(func.count(FeedbackMetric.id)).\
+        join(QuestionAnswerPair, FeedbackMetric.qa_pair_id == QuestionAnswerPair.id).\
+        filter(QuestionAnswerPair.dataset_id == dataset_id).scalar()
+    return {
+        'scored': scored,
+        'checked': len(rows),
+        'recomputed': len(stale),
+        'unchanged': scored - len(stale),
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'removed': removed
+    }
+
+
+def dataset_metrics_summary(dataset_id, worst_items=20):
+    """Averages and lowest-similarity items from the stored metrics"""
+    averages = db.session.query(
+        func.count(FeedbackMetric.id),
+        func.avg(FeedbackMetric.token_f1),
+        func.avg(FeedbackMetric.rouge_l),
+        func.avg(FeedbackMetric.edit_distance),
+        func.max(FeedbackMetric.computed_at)
+    ).join(QuestionAnswerPair, FeedbackMetric.qa_pair_id == QuestionAnswerPair.id).\
+        filter(QuestionAnswerPair.dataset_id == dataset_id).one()
+
+    worst = db.session.query(
+        FeedbackMetric.qa_pair_id,
+        FeedbackMetric.feedback_id,
+        FeedbackMetric.token_f1,
+        FeedbackMetric.rouge_l,
+        FeedbackMetric.edit_distance
+    ).join(QuestionAnswerPair, FeedbackMetric.qa_pair_id == QuestionAnswerPair.id).\
+        filter(QuestionAnswerPair.dataset_id == dataset_id).\
+        order_by(FeedbackMetric.rouge_l.asc()).limit(worst_items).all()
+
+    count, avg_f1, avg_rouge, avg_edit, last_run = averages
+    return {
+        'scored_feedback': count,
+        'avg_token_f1': round(avg_f1, 3) if avg_f1 is not None else None,
+        'avg_rouge_l': round(avg_rouge, 3) if avg_rouge is not None else None,
+        'avg_edit_distance': round(avg_edit, 3) if avg_edit is not None else None,
+        'last_computed_at': last_run.isoformat() if last_run else None,
+        'lowest_similarity': [{
+            'qa_id': qa_id,
+            'feedback_id': feedback_id,
+            'token_f1': round(f1, 3),
+            'rouge_l': round(rouge, 3),
+            'edit_distance': round(edit, 3)
+        } for qa_id, feedback_id, f1, rouge, edit in worst]
+    }
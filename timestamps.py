@@ -0,0 +1,145 @@
+"""
+Timestamp parsing for dataset ingestion.
+
+Files almost always use one timestamp format throughout, so the format is
+inferred once from a sample of values and every value is then parsed with a
+fast path (datetime.fromisoformat or a fixed strptime format). Only values
+that do not match the inferred format fall back to python-dateutil's generic
+parser, and values nothing can parse are reported rather than replaced.
+"""
+
+from datetime import datetime, timezone
+
+SAMPLE_SIZE = 200
+CHUNK_SIZE = 10000
+MAX_REPORTED_ERRORS = 20
+
+# Tried in order after ISO 8601; month-first before day-first, like dateutil
+STRPTIME_FORMATS = [
+    '%Y/%m/%d %H:%M:%S',
+    '%Y/%m/%d',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y',
+    '%d.%m.%Y %H:%M:%S',
+    '%d.%m.%Y',
+    '%d %b %Y %H:%M:%S',
+    '%d %b %Y',
+    '%b %d, %Y %H:%M:%S',
+    '%b %d, %Y',
+    '%a, %d %b %Y %H:%M:%S %z',
+]
+
+ISO_FORMAT = 'iso8601'
+
+
+def _naive_utc(value):
+    # Timestamps are stored as naive UTC throughout the app
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _iso_parser(value):
+    return _naive_utc(datetime.fromisoformat(value))
+
+
+def _strptime_parser(fmt):
+    strptime = datetime.strptime
+    if '%z' in fmt:
+        return lambda value: _naive_utc(strptime(value, fmt))
+    return lambda value: strptime(value, fmt)
+
+
+def _parser_for(fmt):
+    return _iso_parser if fmt == ISO_FORMAT else _strptime_parser(fmt)
+
+
+def _count_parsed(parser, samples):
+    parsed = 0
+    for value in samples:
+        try:
+            parser(value)
+            parsed += 1
+        except (ValueError, OverflowError):
+            pass
+    return parsed
+
+
+def infer_format(values, sample_size=SAMPLE_SIZE):
+    """The known format that parses most sampled values (at least half), or None
+
+    A few malformed values in the sample do not prevent inference; they are
+    handled by the fallback path like any other mismatch.
+    """
+    samples = [value for value in values[:sample_size] if value]
+    if not samples:
+        return None
+    best, best_count = None, 0
+    for fmt in [ISO_FORMAT] + STRPTIME_FORMATS:
+        count = _count_parsed(_parser_for(fmt), samples)
+        if count == len(samples):
+            return fmt
+        if count > best_count:
+            best, best_count = fmt, count
+    return best if best_count * 2 >= len(samples) else None
+
+
+def _generic_parse(value):
+    from dateutil import parser
+    return _naive_utc(parser.parse(value))
+
+
+def parse_timestamps(values, labels=None):
+    """Parse timestamp strings (None/empty allowed) into naive UTC datetimes
+
+    Returns (parsed, report) where parsed has None for empty and unparsable
+    values and the report holds the inferred format, how many values needed
+    the generic parser, and the unparsable values with their row labels.
+    """
+    fmt = infer_format(values)
+    fast = _parser_for(fmt) if fmt else None
+    parsed = []
+    fallbacks = 0
+    errors = []
+
+    for start in range(0, len(values), CHUNK_SIZE):
+        chunk = values[start:start + CHUNK_SIZE]
+        try:
+            # Whole chunk through the fast path; nearly always succeeds
+            if fast is None:
+                raise ValueError
+            parsed.extend([fast(value) if value else None for value in chunk])
+            continue
+        except (ValueError, OverflowError):
+            pass
+
+        for offset, value in enumerate(chunk):
+            if not value:
+                parsed.append(None)
+                continue
+            if fast is not None:
+                try:
+                    parsed.append(fast(value))
+                    continue
+                except (ValueError, OverflowError):
+                    pass
+            try:
+                parsed.append(_generic_parse(value))
+                fallbacks += 1
+            except (ValueError, OverflowError):
+                parsed.append(None)
+                errors.append({
+                    'row': labels[start + offset] if labels else start + offset + 1,
+                    'value': value[:100]
+                })
+
+    return parsed, {
+        'timestamp_format': fmt,
+        'generic_fallbacks': fallbacks,
+        'unparsable_timestamps': len(errors),
+        'unparsable_examples': errors[:MAX_REPORTED_ERRORS]
+    }
@@ -0,0 +1,203 @@
+"""
+Resumable chunked uploads.
+
+A client initialises an upload with the file name and size, then PUTs
+fixed-size chunks at chunk-aligned offsets in any order (and in parallel),
+and finally asks for the file to be finalised. Chunks are written straight
+into a preallocated staging file; a marker file per chunk records what has
+arrived, so an interrupted client can ask which chunks are missing and
+resume. Each chunk may carry a SHA-256 that is verified on receipt, and the
+whole file is verified against the checksum given at init (if any) before it
+is handed to ingestion.
+"""
+
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import time
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_UPLOAD_SIZE = 4 * 1024 * 1024 * 1024
+
+# Unfinished uploads older than this are removed
+UPLOAD_TTL_SECONDS = 24 * 60 * 60
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(ValueError):
+    """Raised for invalid upload requests"""
+
+
+class UploadNotFound(UploadError):
+    """Raised when an upload does not exist or belongs to another user"""
+
+
+def staging_root(app):
+    """Directory holding in-progress uploads"""
+    root = app.config.get('UPLOAD_STAGING_DIR') or os.path.join(tempfile.gettempdir(), 'qa_feedback_uploads')
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _upload_dir(root, upload_id):
+    if not _UPLOAD_ID.match(upload_id or ''):
+        raise UploadNotFound('Upload not found')
+    return os.path.join(root, upload_id)
+
+
+def _chunk_count(meta):
+    return max(1, -(-meta['size'] // meta['chunk_size']))
+
+
+def _write_meta(directory, meta):
+    # Write-then-rename so concurrent readers never see a partial file
+    path = os.path.join(directory, 'meta.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_upload(root, upload_id, user_id):
+    """Metadata of an upload owned by the user"""
+    directory = _upload_dir(root, upload_id)
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise UploadNotFound('Upload not found')
+    if meta['user_id'] != user_id:
+        raise UploadNotFound('Upload not found')
+    return meta
+
+
+def cleanup_expired(root, now=None):
+    """Remove staging directories of uploads that were abandoned"""
+    now = now or time.time()
+    for name in os.listdir(root):
+        directory = os.path.join(root, name)
+        if _UPLOAD_ID.match(name) and now - os.path.getmtime(directory) > UPLOAD_TTL_SECONDS:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def create_upload(root, user_id, filename, size, chunk_size=None, sha256=None, extra=None):
+    """Start an upload and preallocate its staging file"""
+    if not isinstance(size, int) or size <= 0 or size > MAX_UPLOAD_SIZE:
+        raise UploadError(f'File size must be between 1 byte and {MAX_UPLOAD_SIZE // (1024 * 1024)} MB')
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if not isinstance(chunk_size, int) or not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        raise UploadError(f'Chunk size must be between 1 byte and {MAX_CHUNK_SIZE // (1024 * 1024)} MB')
+    if sha256 is not None and not re.match(r'^[0-9a-fA-F]{64}$', sha256):
+        raise UploadError('sha256 must be a hex SHA-256 digest')
+
+    cleanup_expired(root)
+    upload_id = secrets.token_hex(16)
+    directory = os.path.join(root, upload_id)
+    os.makedirs(os.path.join(directory, 'chunks'))
+    with open(os.path.join(directory, 'data'), 'wb') as f:
+        f.truncate(size)
+
+    meta = {
+        'upload_id': upload_id,
+        'user_id': user_id,
+        'filename': filename,
+        'size': size,
+        'chunk_size': chunk_size,
+        'sha256': sha256.lower() if sha256 else None,
+        'created_at': time.time(),
+        'extra': extra or {}
+    }
+    _write_meta(directory, meta)
+    return meta
+
+
+def received_chunks(root, meta):
+    """Indexes of the chunks that have been stored and verified"""
+    chunk_dir = os.path.join(root, meta['upload_id'], 'chunks')
+    return sorted(int(name) for name in os.listdir(chunk_dir) if name.isdigit())
+
+
+def upload_status(root, meta):
+    received = received_chunks(root, meta)
+    total = _chunk_count(meta)
+    missing = sorted(set(range(total)) - set(received))
+    return {
+        'upload_id': meta['upload_id'],
+        'filename': meta['filename'],
+        'size': meta['size'],
+        'chunk_size': meta['chunk_size'],
+        'total_chunks': total,
+        'received_chunks': len(received),
+        'missing_chunks': missing,
+        'complete': not missing
+    }
+
+
+def write_chunk(root, meta, offset, stream, content_length, checksum=None):
+    """Store one chunk read from a request stream at its offset"""
+    chunk_size = meta['chunk_size']
+    if offset < 0 or offset >= meta['size'] or offset % chunk_size:
+        raise UploadError('Offset must be a multiple of the chunk size within the file')
+    expected = min(chunk_size, meta['size'] - offset)
+    if content_length is not None and content_length != expected:
+        raise UploadError(f'Chunk at offset {offset} must be {expected} bytes')
+
+    directory = os.path.join(root, meta['upload_id'])
+    index = offset // chunk_size
+    marker = os.path.join(directory, 'chunks', str(index))
+    digest = hashlib.sha256()
+    written = 0
+
+    # A chunk being re-sent is unverified until it has been fully received again
+    if os.path.exists(marker):
+        os.remove(marker)
+
+    # Each request writes its own byte range, so parallel chunks never overlap
+    with open(os.path.join(directory, 'data'), 'r+b') as f:
+        f.seek(offset)
+        while written < expected:
+            block = stream.read(min(READ_BLOCK_SIZE, expected - written))
+            if not block:
+                break
+            f.write(block)
+            digest.update(block)
+            written += len(block)
+
+    if written != expected or stream.read(1):
+        raise UploadError(f'Chunk at offset {offset} must be {expected} bytes')
+    if checksum and digest.hexdigest() != checksum.lower():
+        # Leave the chunk unmarked so the client sends it again
+        raise UploadError(f'Checksum mismatch for chunk at offset {offset}')
+
+    with open(marker, 'w') as f:
+        f.write(digest.hexdigest())
+    os.utime(directory)
+    return index
+
+
+def assemble(root, meta):
+    """Verify an upload is complete and return the path of the assembled file and its SHA-256"""
+    status = upload_status(root, meta)
+    if not status['complete']:
+        raise UploadError(f'{len(status["missing_chunks"])} chunks are still missing')
+
+    path = os.path.join(root, meta['upload_id'], 'data')
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+    if meta['sha256'] and sha256 != meta['sha256']:
+        raise UploadError('Checksum mismatch for the assembled file; the upload must be restarted')
+    return path, sha256
+
+
+def remove_upload(root, meta):
+    shutil.rmtree(os.path.join(root, meta['upload_id']), ignore_errors=True)